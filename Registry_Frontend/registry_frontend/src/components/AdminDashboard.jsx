@@ -218,7 +218,7 @@ function AdminDashboard() {
   useEffect(() => {
     // Add a small delay to ensure token is set
     setTimeout(() => {
-      api.get("/applications/")
+      api.get("/applications/", { params: { expand: "attachments" } })
         .then((res) => {
           // Handle paginated response
           const apps = Array.isArray(res.data) ? res.data : res.data.results || [];
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import {
   Form,
   Button,
@@ -16,12 +16,19 @@ function ApplicationForm() {
   const [branches, setBranches] = useState([]);
   const [docTypeId, setDocTypeId] = useState("");
   const [branchId, setBranchId] = useState("");
-  const [file, setFile] = useState(null);
+  const [files, setFiles] = useState([]);
   const [fileDescription, setFileDescription] = useState("");
   const [submitting, setSubmitting] = useState(false);
   const [success, setSuccess] = useState(false);
   const [error, setError] = useState("");
   const [selectedDocType, setSelectedDocType] = useState(null);
+  // Reused when the same submission is retried so the server never creates it twice
+  const idempotencyKey = useRef(null);
+
+  // Changed fields or files make a different submission, which needs its own key
+  useEffect(() => {
+    idempotencyKey.current = null;
+  }, [docTypeId, branchId, files, fileDescription]);
 
   useEffect(() => {
     const token = localStorage.getItem("access");
@@ -112,7 +119,7 @@ function ApplicationForm() {
     setError("");
     setSuccess(false);
 
-    if (!docTypeId || !branchId || !file) {
+    if (!docTypeId || !branchId || files.length === 0) {
       setError("Please complete all fields and upload the required document.");
       return;
     }
@@ -120,7 +127,7 @@ function ApplicationForm() {
     // Additional validation for specific document types
     if (selectedDocType) {
       const requirements = getUploadRequirements();
-      if (requirements.required && !file) {
+      if (requirements.required && files.length === 0) {
         setError(`Please upload ${requirements.title.toLowerCase()}.`);
         return;
       }
@@ -129,43 +136,54 @@ function ApplicationForm() {
     setSubmitting(true);
     try {
       const token = localStorage.getItem("access");
+      if (!idempotencyKey.current) {
+        idempotencyKey.current = crypto.randomUUID();
+      }
 
-      // Step 1: Create application
-      const appRes = await api.post(
-        "/applications/",
-        {
-          document_type: docTypeId,
-          branch: branchId,
-        },
-        {
-          headers: { Authorization: `Bearer ${token}` },
-        }
-      );
-
-      // Step 2: Upload attachment
+      // One request creates the application and all of its attachments
       const formData = new FormData();
-      formData.append("application", appRes.data.id);
-      formData.append("file", file);
-      if (fileDescription) {
-        formData.append("description", fileDescription);
-      }
+      formData.append("document_type", docTypeId);
+      formData.append("branch", branchId);
+      files.forEach((selected) => {
+        formData.append("files", selected);
+        formData.append("descriptions", fileDescription);
+      });
 
-      await api.post("/attachments/", formData, {
+      await api.post("/applications/submit/", formData, {
         headers: {
           Authorization: `Bearer ${token}`,
           "Content-Type": "multipart/form-data",
+          "Idempotency-Key": idempotencyKey.current,
         },
       });
 
+      idempotencyKey.current = null;
       setSuccess(true);
       setDocTypeId("");
       setBranchId("");
-      setFile(null);
+      setFiles([]);
       setFileDescription("");
       setSelectedDocType(null);
     } catch (err) {
       console.error("Submission error:", err);
-      setError("Submission failed. Please try again.");
+      const responseStatus = err.response?.status;
+      if (responseStatus >= 400 && responseStatus < 500) {
+        // Rejected without being created: the corrected submission is a new request
+        idempotencyKey.current = null;
+      }
+      const fileErrors = err.response?.data?.files;
+      if (fileErrors) {
+        const messages = Array.isArray(fileErrors)
+          ? fileErrors
+          : Object.entries(fileErrors).map(
+              ([index, errors]) => `${files[index]?.name || "File"}: ${errors.join(" ")}`
+            );
+        setError(messages.join(" "));
+      } else if (err.response?.data?.detail) {
+        setError(err.response.data.detail);
+      } else {
+        setError("Submission failed. Please try again.");
+      }
     } finally {
       setSubmitting(false);
     }
@@ -222,7 +240,7 @@ function ApplicationForm() {
                   </h6>
                   <p className="mb-2">{getUploadRequirements().description}</p>
                   <small className="text-muted">
-                    Accepted formats: JPG, PNG, PDF (Max 10MB)
+                    Accepted formats: JPG, PNG, PDF (Max 5MB each, up to 10 files)
                   </small>
                 </div>
                 
@@ -232,7 +250,8 @@ function ApplicationForm() {
                 >
                   <Form.Control
                     type="file"
-                    onChange={(e) => setFile(e.target.files[0])}
+                    multiple
+                    onChange={(e) => setFiles(Array.from(e.target.files))}
                     accept={getUploadRequirements().accept}
                     placeholder={getUploadRequirements().placeholder}
                     required={getUploadRequirements().required}
@@ -251,11 +270,15 @@ function ApplicationForm() {
                   />
                 </FloatingLabel>
                 
-                {file && (
+                {files.length > 0 && (
                   <div className="alert alert-success">
-                    <small>
-                      ✅ Selected file: {file.name} ({(file.size / 1024 / 1024).toFixed(2)} MB)
-                    </small>
+                    {files.map((selected) => (
+                      <div key={selected.name}>
+                        <small>
+                          ✅ Selected file: {selected.name} ({(selected.size / 1024 / 1024).toFixed(2)} MB)
+                        </small>
+                      </div>
+                    ))}
                   </div>
                 )}
               </div>
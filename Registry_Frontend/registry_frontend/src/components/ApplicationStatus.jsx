@@ -205,6 +205,18 @@ const ApplicationStatus = () => {
                         ? new Date(application.updated_at).toLocaleString()
                         : "N/A"}
                     </p>
+                    {application.queue_position && (
+                      <p>
+                        <strong>Queue Position:</strong>{" "}
+                        #{application.queue_position}
+                      </p>
+                    )}
+                    {application.estimated_ready_date && (
+                      <p>
+                        <strong>Estimated Ready:</strong>{" "}
+                        {new Date(application.estimated_ready_date).toLocaleDateString()}
+                      </p>
+                    )}
                   </div>
                 </div>
 
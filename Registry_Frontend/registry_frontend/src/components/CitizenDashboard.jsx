@@ -35,7 +35,7 @@ function CitizenDashboard() {
         setCurrentUser(userData);
         
         // Get user's applications
-        const appsRes = await api.get("/applications/");
+        const appsRes = await api.get("/applications/", { params: { mine: 1 } });
         // Handle paginated response
         const apps = Array.isArray(appsRes.data) ? appsRes.data : appsRes.data.results || [];
         const userApplications = apps.filter(app => app.user.id === userData.id);
@@ -743,6 +743,14 @@ function CitizenDashboard() {
                         <FaClock className="me-1" />
                         <strong>Submitted:</strong> {new Date(app.created_at).toLocaleDateString()}
                       </div>
+                      {app.queue_position && (
+                        <p className="text-muted small mb-2">
+                          <strong>Queue Position:</strong> #{app.queue_position}
+                          {app.estimated_ready_date && (
+                            <> · <strong>Estimated Ready:</strong> {new Date(app.estimated_ready_date).toLocaleDateString()}</>
+                          )}
+                        </p>
+                      )}
                       {app.qr_code && (
                         <div className="text-center mt-2">
                           <Button 
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'civil_backend.settings')
+# Served by an ASGI server, so the async views in registry/async_views.py pay off
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
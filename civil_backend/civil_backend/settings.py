@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
+from corsheaders.defaults import default_headers
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'registry.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'registry.middleware.PrimaryPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'civil_backend.urls'
@@ -80,11 +83,45 @@ WSGI_APPLICATION = 'civil_backend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # Django's SQLite backend with the opt-in concurrency profile below
+        'ENGINE': 'registry.sqlite_backend',
+        'NAME': os.getenv('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# Optional read replica. Point DATABASE_REPLICA_NAME at a copy of the primary
+# (refresh it with `manage.py sync_replica`) to move reads off the write database.
+if os.getenv('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DATABASE_REPLICA_NAME'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['registry.db_routers.ReadReplicaRouter']
+
+# Seconds a client keeps reading from the primary after it has written
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DATABASE_REPLICA_PIN_SECONDS', '5'))
+
+# Default cache. Django's in-process cache is only seen by the process that
+# wrote to it, so with more than one worker process set CACHE_REDIS_URL: the
+# cached users of CachedJWTAuthentication and, with a replica, the pins kept by
+# PrimaryPinningMiddleware must be shared (`manage.py check` warns about pins).
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_REDIS_URL'),
+        }
+    }
+
+# Opt-in SQLite concurrency profile: WAL, synchronous=NORMAL, busy timeout, mmap
+# and cache size on every new connection, plus BEGIN IMMEDIATE transactions.
+# See registry/sqlite.py and `manage.py bench_sqlite_contention`.
+SQLITE_CONCURRENCY_PROFILE = os.getenv('SQLITE_CONCURRENCY_PROFILE', '').lower() in ('1', 'true', 'yes')
+SQLITE_CONCURRENCY_ALIASES = ['default']
+SQLITE_PRAGMAS = {}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -133,20 +170,65 @@ AUTH_USER_MODEL = 'registry.User'
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'registry.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON when installed, DRF's stdlib implementation otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'registry.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'registry.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Response compression (registry.middleware.CompressionMiddleware). Brotli is
+# offered when the brotli package is installed, gzip otherwise.
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+RESPONSE_COMPRESSION_BROTLI_QUALITY = 4
+RESPONSE_COMPRESSION_GZIP_LEVEL = 6
+# Never compressed: these responses carry tokens or CSRF secrets next to
+# request input, which compression could leak (BREACH)
+RESPONSE_COMPRESSION_EXCLUDED_PATHS = ['/api/login/', '/api/register/', '/api/token/', '/admin/']
+
+# SimpleJWT settings - tokens carry role claims for clients; permission checks read the user
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'registry.serializers.CustomTokenObtainPairSerializer',
+}
+
+# Seconds an authenticated user stays in the principal cache (the default cache)
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+
+# Finished applications older than this move to the archive tables (archive_applications)
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_STATUSES = ['collected', 'rejected']
+
+# prune_notifications: read notifications older than this are removed, and
+# each user keeps at most this many unread ones
+NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', '90'))
+NOTIFICATION_MAX_UNREAD_PER_USER = int(os.getenv('NOTIFICATION_MAX_UNREAD_PER_USER', '200'))
+
+# Idempotency-Key replay (registry.idempotency): stored responses are kept
+# this long, and a key whose request never finished is freed after the lock
+# timeout so the client can retry
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '60'))
+
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
 
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -160,6 +242,68 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
+# Override to point SMS at a proxy or a local test gateway
+TWILIO_API_BASE_URL = os.getenv('TWILIO_API_BASE_URL')
+
+# SMS templates (registry.sms_templates): 'gsm7' plain-text variants or
+# 'unicode' ones with emoji headings, which bill at 70 characters a segment.
+# The price per segment is used for the per-message cost metrics.
+SMS_TEMPLATE_VARIANT = os.getenv('SMS_TEMPLATE_VARIANT', 'gsm7')
+SMS_COST_PER_SEGMENT = os.getenv('SMS_COST_PER_SEGMENT', '0.0500')
+
+# SMS provider resilience (registry.sms_service): each call times out after
+# SMS_TIMEOUT_SECONDS, and after SMS_CIRCUIT_FAILURE_THRESHOLD consecutive
+# failures sends fail fast for SMS_CIRCUIT_RESET_SECONDS. Sends made while
+# handling a request get a single attempt; background senders
+# (send_status_sms) retry transient failures up to SMS_MAX_RETRIES times with
+# jittered exponential backoff.
+SMS_TIMEOUT_SECONDS = float(os.getenv('SMS_TIMEOUT_SECONDS', '5'))
+SMS_MAX_RETRIES = int(os.getenv('SMS_MAX_RETRIES', '2'))
+SMS_RETRY_BACKOFF_SECONDS = float(os.getenv('SMS_RETRY_BACKOFF_SECONDS', '0.5'))
+SMS_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv('SMS_RETRY_BACKOFF_MAX_SECONDS', '4'))
+SMS_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('SMS_CIRCUIT_FAILURE_THRESHOLD', '5'))
+SMS_CIRCUIT_RESET_SECONDS = float(os.getenv('SMS_CIRCUIT_RESET_SECONDS', '30'))
+
+# Status SMS for one user and application are held this many seconds and
+# merged into one message with the latest status (registry.status_sms).
+# Opt-in: held messages are only sent by `manage.py send_status_sms --loop`
+# (or a cron job running it), so only set this where that worker runs; see
+# SMS_SETUP_GUIDE.md. Messages overdue by STATUS_SMS_OVERDUE_SECONDS are
+# logged as errors and flagged by `manage.py perf_check`. 0 sends every
+# change immediately.
+STATUS_SMS_COALESCE_SECONDS = int(os.getenv('STATUS_SMS_COALESCE_SECONDS', '0'))
+STATUS_SMS_OVERDUE_SECONDS = int(os.getenv('STATUS_SMS_OVERDUE_SECONDS', '300'))
+# A queued SMS the provider refuses is tried again STATUS_SMS_RETRY_SECONDS
+# later, doubling each time, and dropped with an error after
+# STATUS_SMS_MAX_ATTEMPTS failed sends.
+STATUS_SMS_RETRY_SECONDS = int(os.getenv('STATUS_SMS_RETRY_SECONDS', '300'))
+STATUS_SMS_MAX_ATTEMPTS = int(os.getenv('STATUS_SMS_MAX_ATTEMPTS', '5'))
+
+# Most labels one QR label sheet may hold (registry.labels)
+QR_LABEL_MAX_BATCH = int(os.getenv('QR_LABEL_MAX_BATCH', '2000'))
+
+# Shared process pool for CPU-bound work in requests (registry.offload): QR
+# rendering and password hashing. At most OFFLOAD_MAX_PENDING tasks are
+# queued or running; callers wait up to OFFLOAD_QUEUE_TIMEOUT_SECONDS for a
+# slot and OFFLOAD_TASK_TIMEOUT_SECONDS for a result, else get a 503.
+# OFFLOAD_WORKERS = 0 runs the work inline in the request thread.
+OFFLOAD_WORKERS = int(os.getenv('OFFLOAD_WORKERS', str(os.cpu_count() or 1)))
+OFFLOAD_MAX_PENDING = int(os.getenv('OFFLOAD_MAX_PENDING', '32'))
+OFFLOAD_QUEUE_TIMEOUT_SECONDS = float(os.getenv('OFFLOAD_QUEUE_TIMEOUT_SECONDS', '2'))
+OFFLOAD_TASK_TIMEOUT_SECONDS = float(os.getenv('OFFLOAD_TASK_TIMEOUT_SECONDS', '10'))
+
+# Queries taking at least SLOW_QUERY_MS are written to SLOW_QUERY_LOG as JSON
+# lines (registry.slow_queries) and listed by `manage.py perf_check`. 0 turns
+# the log off.
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'slow_queries.log'))
+
+# Serve tracking, notifications and application submission from the async
+# views in registry/async_views.py. Off by default: under runserver or a WSGI
+# server they would run through async_to_sync and gain nothing.
+# civil_backend/asgi.py turns them on for ASGI servers such as uvicorn; set
+# ASYNC_VIEWS=0 there to keep the synchronous DRF views.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '0').lower() in ('1', 'true', 'yes')
 
 # Logging configuration
 LOGGING = {
@@ -174,6 +318,10 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'message': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'file': {
@@ -187,6 +335,15 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'slow_queries': {
+            'level': 'WARNING',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 1,
+            'delay': True,
+            'formatter': 'message',
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -198,5 +355,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'registry.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
@@ -10,6 +10,9 @@ from registry.views import RegisterView
 from registry.views import LoginView
 from registry.views import RegistryBranchList
 from registry.views import track_by_reference
+from registry.views import ChangeFeedView
+from registry.views import StatusDurationAnalyticsView
+from registry.views import SMSStatusView
 
 
 router = DefaultRouter()
@@ -19,8 +22,22 @@ router.register(r'branches', RegistryBranchViewSet)
 router.register(r'applications', ApplicationViewSet)
 router.register(r'attachments', AttachmentViewSet)
 router.register(r'notifications', NotificationViewSet)
+router.register(r'archive/applications', ArchivedApplicationViewSet)
 
-urlpatterns = [
+if settings.ASYNC_VIEWS:
+    from registry import async_views
+
+    # Matched before the router so these paths are served by the async views
+    async_urlpatterns = [
+        path('api/applications/', async_views.applications, name='application-list'),
+        path('api/notifications/', async_views.notifications, name='notification-list'),
+        path('api/notifications/<uuid:pk>/', async_views.notification_detail, name='notification-detail'),
+        path('api/track-by-reference/', async_views.track_by_reference, name='track-by-reference'),
+    ]
+else:
+    async_urlpatterns = []
+
+urlpatterns = async_urlpatterns + [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
     path('api/register/', RegisterView.as_view(), name='register'),
@@ -30,4 +47,7 @@ urlpatterns = [
     path('api/registry-branches/', RegistryBranchList.as_view(), name='registry-branch-list'),
 
     path('api/track-by-reference/', track_by_reference, name='track-by-reference'),
+    path('api/changes/', ChangeFeedView.as_view(), name='changes'),
+    path('api/analytics/status-durations/', StatusDurationAnalyticsView.as_view(), name='status-durations'),
+    path('api/sms/status/', SMSStatusView.as_view(), name='sms-status'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,8 +1,171 @@
 from django.contrib import admin
-from .models import User, DocumentType, RegistryBranch, Application, Attachment
-# Register your models here.
-admin.site.register(User)
-admin.site.register(DocumentType)
-admin.site.register(RegistryBranch)
-admin.site.register(Application)
-admin.site.register(Attachment)
\ No newline at end of file
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from .models import User, DocumentType, RegistryBranch, Application, Attachment, Notification
+from .phone import e164_prefix, to_e164
+from .search import search_application_ids
+
+# Matches a search can return; the changelist pages through at most this many
+SEARCH_RESULT_LIMIT = 1000
+
+
+def estimated_row_count(model, using):
+    """Table size from the database's own bookkeeping instead of a COUNT(*) scan"""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # Rowids only grow, so deleted (archived) rows make this an overestimate
+            cursor.execute(f'SELECT MAX(_rowid_) FROM {table}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [model._meta.db_table])
+        else:
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+        row = cursor.fetchone()
+    return int(row[0] or 0) if row else 0
+
+
+def prefix_match(field, prefix):
+    """
+    Rows whose `field` starts with `prefix`, as a range the column's index can seek.
+
+    startswith/istartswith compile to LIKE (UPPER() too for istartswith),
+    which a plain index cannot serve on PostgreSQL, nor on SQLite because of
+    the ESCAPE clause.
+    """
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'})
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts a large table exactly.
+
+    Up to `exact_count_limit` rows are counted with a LIMITed subquery. Past
+    that an unfiltered changelist reports the estimated table size and a
+    filtered one stops at the limit, so narrow the filters to page further.
+
+    Pages are fetched as a deferred join: the filtered rows are sorted and
+    sliced on the primary key alone, then only that page's rows are loaded,
+    so a filter matching 100k+ rows does not sort 100k full rows.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        counted = queryset.order_by()[:self.exact_count_limit + 1].count()
+        if counted <= self.exact_count_limit or queryset.query.where:
+            return counted
+        return max(estimated_row_count(queryset.model, queryset.db), counted)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        queryset = self.object_list
+        ids = list(queryset.values_list('pk', flat=True)[bottom:bottom + self.per_page])
+        # Load by primary key alone; repeating the filters could steer the planner back to a scan
+        rows = queryset.model._base_manager.using(queryset.db).filter(pk__in=ids)
+        rows.query.select_related = queryset.query.select_related
+        rows = {row.pk: row for row in rows}
+        return self._get_page([rows[pk] for pk in ids if pk in rows], number, self)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big to count or scan on every page load"""
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) behind "N results (M total)"
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(User)
+class UserAdmin(ScalableAdmin):
+    list_display = ('email', 'full_name', 'phone_e164', 'registry_branch', 'is_admin', 'is_active')
+    list_select_related = ('registry_branch',)
+    list_filter = ('is_admin', 'is_active')
+    ordering = ('email',)
+    search_fields = ('email', 'national_id_number', 'phone_e164')
+    search_help_text = 'Start of an email, username or phone number, or an exact national ID.'
+    autocomplete_fields = ('registry_branch',)
+    readonly_fields = ('phone_e164',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact or prefix matches on the unique/indexed columns; icontains would scan every user
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        query = Q(national_id_number=term)
+        for prefix in {term, term.lower()}:
+            query |= prefix_match('email', prefix) | prefix_match('username', prefix)
+        phone = to_e164(term)
+        if phone:
+            query |= Q(phone_e164=phone)
+        else:
+            phone = e164_prefix(term)
+            if phone:
+                query |= prefix_match('phone_e164', phone)
+        return queryset.filter(query), False
+
+
+@admin.register(DocumentType)
+class DocumentTypeAdmin(admin.ModelAdmin):
+    list_display = ('name', 'is_active')
+    search_fields = ('name',)
+
+
+@admin.register(RegistryBranch)
+class RegistryBranchAdmin(admin.ModelAdmin):
+    list_display = ('name', 'phone', 'is_active')
+    search_fields = ('name',)
+
+
+@admin.register(Application)
+class ApplicationAdmin(ScalableAdmin):
+    list_display = ('reference_number', 'applicant', 'document_type', 'branch', 'status', 'created_at')
+    list_select_related = ('user', 'document_type', 'branch')
+    # status, branch and document_type are the leading columns of indexes
+    list_filter = ('status', 'branch', 'document_type')
+    # Searched through the full-text index (registry.search), not LIKE on these columns
+    search_fields = ('reference_number', 'user__full_name', 'user__national_id_number', 'user__phone_number')
+    search_help_text = 'Reference number, applicant name, national ID or phone number.'
+    autocomplete_fields = ('user', 'document_type', 'branch')
+    readonly_fields = ('reference_number', 'created_at', 'updated_at')
+
+    @admin.display(description='Applicant', ordering='user__full_name')
+    def applicant(self, obj):
+        return obj.user.full_name
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        ids, _ = search_application_ids(search_term, SEARCH_RESULT_LIMIT)
+        return queryset.filter(pk__in=ids), False
+
+
+@admin.register(Attachment)
+class AttachmentAdmin(ScalableAdmin):
+    list_display = ('application', 'file', 'description')
+    list_select_related = ('application__user',)
+    autocomplete_fields = ('application',)
+
+
+@admin.register(Notification)
+class NotificationAdmin(ScalableAdmin):
+    list_display = ('title', 'user', 'type', 'is_read', 'created_at')
+    list_select_related = ('user',)
+    list_filter = ('is_read', 'type')
+    search_fields = ('application__reference_number', 'user__email')
+    search_help_text = 'Application reference number or exact user email.'
+    autocomplete_fields = ('user', 'application')
+    readonly_fields = ('created_at', 'updated_at')
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        users = User.objects.filter(email__in={term, term.lower()}).values('pk')
+        applications = Application.objects.filter(reference_number=term.upper()).values('pk')
+        return queryset.filter(Q(user__in=users) | Q(application__in=applications)), False
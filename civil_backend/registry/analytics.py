@@ -0,0 +1,119 @@
+import uuid
+
+from django.db import connections
+from rest_framework import exceptions, status
+
+from .db_routers import read_db
+from .models import Application, ApplicationStatusEvent
+
+PERCENTILES = (50, 90, 95)
+
+GROUP_COLUMNS = {
+    'branch': ('e.branch_id', 'registry_registrybranch'),
+    'document_type': ('e.document_type_id', 'registry_documenttype'),
+}
+
+# Seconds between entering a status and the application's next transition.
+# Only for databases whose status history is recorded: migration 0013 installs
+# its triggers on SQLite alone, so elsewhere the history stays empty and the
+# endpoint answers 501 rather than all-zero figures.
+DWELL_SECONDS = {
+    'sqlite': '(julianday(e.left_at) - julianday(e.timestamp)) * 86400.0',
+}
+
+
+class AnalyticsUnavailable(exceptions.APIException):
+    """The database has no dwell-time expression in DWELL_SECONDS; renders as a 501 response"""
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'Status analytics are not available on this database.'
+    default_code = 'not_implemented'
+
+
+def status_dwell_times(since, until, branch_id=None, document_type_id=None, group_by=None):
+    """
+    Per-status dwell-time statistics for transitions entered in [since, until).
+
+    One SQL statement: the (status, timestamp) index selects the events, an
+    (application_id, id) lookup finds when each one was left, and window
+    functions rank the durations for nearest-rank percentiles. Statuses an
+    application is still in are not counted.
+    """
+    connection = connections[read_db()]
+    if connection.vendor not in DWELL_SECONDS:
+        raise AnalyticsUnavailable(f'Status analytics are not available on {connection.vendor}.')
+
+    statuses = [value for value, _ in Application.STATUS_CHOICES]
+    params = [*statuses, _db_datetime(connection, since), _db_datetime(connection, until)]
+    filters = ''
+    if branch_id:
+        filters += ' AND ev.branch_id = %s'
+        params.append(_db_fk(connection, 'branch', branch_id))
+    if document_type_id:
+        filters += ' AND ev.document_type_id = %s'
+        params.append(_db_fk(connection, 'document_type', document_type_id))
+
+    group_column, group_table = GROUP_COLUMNS.get(group_by, ('NULL', None))
+    group_join = f'LEFT JOIN {group_table} g ON g.id = r.grp' if group_table else ''
+    group_name = 'g.name' if group_table else 'NULL'
+    percentile_columns = ', '.join(
+        f'MAX(CASE WHEN r.rn = ({p} * r.n + 99) / 100 THEN r.seconds END)' for p in PERCENTILES
+    )
+
+    sql = f"""
+        WITH spans AS (
+            SELECT e.status, {group_column} AS grp, {DWELL_SECONDS[connection.vendor]} AS seconds
+            FROM (
+                SELECT ev.*, (
+                    SELECT nx.timestamp FROM registry_applicationstatusevent nx
+                    WHERE nx.application_id = ev.application_id AND nx.id > ev.id
+                    ORDER BY nx.id LIMIT 1
+                ) AS left_at
+                FROM registry_applicationstatusevent ev
+                WHERE ev.status IN ({', '.join(['%s'] * len(statuses))})
+                  AND ev.timestamp >= %s AND ev.timestamp < %s{filters}
+            ) e
+            WHERE e.left_at IS NOT NULL
+        ),
+        ranked AS (
+            SELECT status, grp, seconds,
+                   ROW_NUMBER() OVER (PARTITION BY status, grp ORDER BY seconds) AS rn,
+                   COUNT(*) OVER (PARTITION BY status, grp) AS n
+            FROM spans
+        )
+        SELECT r.status, r.grp, {group_name}, MAX(r.n), AVG(r.seconds), {percentile_columns}, MAX(r.seconds)
+        FROM ranked r
+        {group_join}
+        GROUP BY r.status, r.grp, {group_name}
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    order = {status: index for index, status in enumerate(statuses)}
+    results = []
+    for status, group, group_label, count, mean, *percentiles, longest in rows:
+        result = {
+            'status': status,
+            'count': count,
+            'mean_seconds': round(mean, 1),
+            **{f'p{p}_seconds': round(value, 1) for p, value in zip(PERCENTILES, percentiles)},
+            'max_seconds': round(longest, 1),
+        }
+        if group_by:
+            result[group_by] = {'id': _uuid_text(group), 'name': group_label}
+        results.append(result)
+    results.sort(key=lambda result: (result.get(group_by, {}).get('name') or '', order[result['status']]))
+    return results
+
+
+def _db_datetime(connection, value):
+    return ApplicationStatusEvent._meta.get_field('timestamp').get_db_prep_value(value, connection)
+
+
+def _db_fk(connection, field_name, value):
+    return ApplicationStatusEvent._meta.get_field(field_name).get_db_prep_value(value, connection)
+
+
+def _uuid_text(value):
+    return str(uuid.UUID(str(value))) if value is not None else None
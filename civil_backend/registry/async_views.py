@@ -0,0 +1,286 @@
+"""
+Async views for the I/O-bound endpoints: tracking, notifications and
+application submission.
+
+Under an ASGI server these use Django's async ORM API and send SMS with
+aiohttp on the event loop instead of blocking a worker thread on the
+gateway. They are wired up in civil_backend/urls.py when settings.ASYNC_VIEWS
+is on (the default under civil_backend/asgi.py) and keep the
+request/response shapes of the synchronous DRF views they replace.
+Authentication is JWT only, so they are exempt from CSRF checks.
+"""
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+
+from .authentication import CachedJWTAuthentication
+from . import idempotency
+from .conditional import (
+    collection_etag, evaluate_preconditions, representation_variant, resource_etag, set_validators,
+)
+from .models import Application, ArchivedApplication, Notification
+from .parsers import FastJSONParser
+from .queue import queue_details, queue_positions
+from .renderers import FastJSONRenderer
+from .serializers import (
+    ApplicationSerializer, ApplicationStatusSerializer, ArchivedApplicationStatusSerializer, NotificationSerializer,
+)
+from .sms_service import sms_service
+from .views import ApplicationViewSet, fallback_applicant
+
+
+def _json(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status_code)
+
+
+def _finalize(response):
+    # evaluate_preconditions builds DRF responses for 412s; render them without the DRF view machinery
+    if isinstance(response, Response):
+        rendered = _json(response.data, response.status_code)
+        for header, value in response.items():
+            if header.lower() != 'content-type':
+                rendered[header] = value
+        return rendered
+    return response
+
+
+def _csrf_exempt(view):
+    # django.views.decorators.csrf.csrf_exempt wraps async views in a sync function on Django 4.2
+    view.csrf_exempt = True
+    return view
+
+
+async def _authenticate(request):
+    """Return (user, None) or (None, error response); user is None for anonymous requests"""
+    try:
+        result = await CachedJWTAuthentication().aauthenticate(request)
+    except exceptions.APIException as e:
+        return None, _json({'detail': e.detail}, e.status_code)
+    return (result[0] if result else None), None
+
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        return FastJSONParser().parse(BytesIO(request.body)) if request.body else {}
+    return request.POST
+
+
+def _sparse_context(request, compact=False):
+    params = request.GET
+    return {
+        'fields': [name for name in params.get('fields', '').split(',') if name],
+        'expand': [name for name in params.get('expand', '').split(',') if name],
+        'compact': compact,
+    }
+
+
+async def track_by_reference(request):
+    if request.method != 'GET':
+        return _json({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    ref = request.GET.get('ref')
+    if not ref:
+        return _json({'detail': 'Reference number is required.'}, status.HTTP_400_BAD_REQUEST)
+
+    row = await Application.objects.filter(reference_number=ref).only(
+        'id', 'status', 'created_at', 'updated_at'
+    ).afirst()
+    if row is None:
+        return await _track_archived(request, ref)
+
+    positions = await sync_to_async(queue_positions)([row])
+    queue = queue_details(row, positions)
+    version = (
+        resource_etag(row.pk, row.updated_at, queue['queue_position'], queue['estimated_ready_date']),
+        row.updated_at if queue['queue_position'] is None else None,
+    )
+    precondition = evaluate_preconditions(request, *version)
+    if precondition is not None:
+        return _finalize(precondition)
+
+    application = await Application.objects.select_related(
+        'user', 'document_type', 'branch'
+    ).prefetch_related('attachments').aget(pk=row.pk)
+    data = ApplicationStatusSerializer(application, context={'queue_positions': positions}).data
+    return set_validators(_json(data), *version)
+
+
+async def _track_archived(request, ref):
+    row = await ArchivedApplication.objects.filter(reference_number=ref).order_by('-archived_at').values_list(
+        'pk', 'updated_at'
+    ).afirst()
+    if row is None:
+        return _json({'detail': 'Application not found.'}, status.HTTP_404_NOT_FOUND)
+
+    pk, updated_at = row
+    version = (resource_etag(pk, updated_at), updated_at)
+    precondition = evaluate_preconditions(request, *version)
+    if precondition is not None:
+        return _finalize(precondition)
+
+    application = await ArchivedApplication.objects.select_related(
+        'user', 'document_type', 'branch'
+    ).prefetch_related('attachments').aget(pk=pk)
+    return set_validators(_json(ArchivedApplicationStatusSerializer(application).data), *version)
+
+
+@_csrf_exempt
+async def notifications(request):
+    """GET the signed-in user's notifications, POST to create one"""
+    user, error = await _authenticate(request)
+    if error:
+        return error
+
+    if request.method == 'GET':
+        if user is None:
+            return _json([])
+        items = [notification async for notification in
+                 Notification.objects.filter(user=user).select_related('application')]
+        last_updated = max((item.updated_at for item in items), default=None)
+        version = (
+            collection_etag([(item.pk, item.updated_at) for item in items], representation_variant(request.GET)),
+            last_updated,
+        )
+        precondition = evaluate_preconditions(request, *version)
+        if precondition is not None:
+            return _finalize(precondition)
+
+        try:
+            data = NotificationSerializer(items, many=True, context=_sparse_context(request)).data
+        except exceptions.ValidationError as e:
+            return _json(e.detail, status.HTTP_400_BAD_REQUEST)
+        return set_validators(_json(data), *version)
+
+    if request.method == 'POST':
+        if user is None:
+            return _json({'detail': 'Authentication credentials were not provided.'}, status.HTTP_401_UNAUTHORIZED)
+        serializer = NotificationSerializer(data=_request_data(request))
+        if not serializer.is_valid():
+            return _json(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        notification = await Notification.objects.acreate(user=user, **serializer.validated_data)
+        return _json(NotificationSerializer(notification).data, status.HTTP_201_CREATED)
+
+    return _json({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@_csrf_exempt
+async def notification_detail(request, pk):
+    """GET, PATCH/PUT or DELETE one of the signed-in user's notifications"""
+    user, error = await _authenticate(request)
+    if error:
+        return error
+    if user is None:
+        return _json({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+
+    notification = await Notification.objects.select_related('application').filter(pk=pk, user=user).afirst()
+    if notification is None:
+        return _json({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+
+    version = (
+        resource_etag(notification.pk, notification.updated_at, representation_variant(request.GET)),
+        notification.updated_at,
+    )
+    precondition = evaluate_preconditions(request, *version)
+    if precondition is not None:
+        return _finalize(precondition)
+
+    if request.method == 'GET':
+        try:
+            data = NotificationSerializer(notification, context=_sparse_context(request)).data
+        except exceptions.ValidationError as e:
+            return _json(e.detail, status.HTTP_400_BAD_REQUEST)
+        return set_validators(_json(data), *version)
+
+    if request.method in ('PATCH', 'PUT'):
+        serializer = NotificationSerializer(
+            notification, data=_request_data(request), partial=request.method == 'PATCH'
+        )
+        if not serializer.is_valid():
+            return _json(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        for field, value in serializer.validated_data.items():
+            setattr(notification, field, value)
+        await notification.asave()
+        version = (resource_etag(notification.pk, notification.updated_at), notification.updated_at)
+        return set_validators(_json(NotificationSerializer(notification).data), *version)
+
+    if request.method == 'DELETE':
+        await notification.adelete()
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+    return _json({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@_csrf_exempt
+async def applications(request):
+    """POST submits an application asynchronously; other methods go to ApplicationViewSet"""
+    if request.method != 'POST':
+        return await sync_to_async(_application_list_view)(request)
+    return await submit_application(request)
+
+
+async def submit_application(request):
+    user, error = await _authenticate(request)
+    if error:
+        return error
+
+    try:
+        key = idempotency.request_key(request)
+        record, stored = (None, None) if key is None else await sync_to_async(idempotency.claim)(
+            idempotency.key_scope(user), key, idempotency.request_fingerprint(request)
+        )
+    except idempotency.IdempotencyError as e:
+        return _json({'detail': e.detail}, e.status_code)
+    if stored is not None:
+        return idempotency.replay(stored)
+    if record is None:
+        return await _create_application(request, user)
+
+    try:
+        response = await _create_application(request, user)
+    except Exception:
+        await sync_to_async(idempotency.release)(record)
+        raise
+    await sync_to_async(idempotency.store)(record, response, response.content, response['Content-Type'])
+    return response
+
+
+async def _create_application(request, user):
+    if user is None:
+        # Same fallback as ApplicationViewSet.create until submissions require sign-in
+        user = await sync_to_async(fallback_applicant)()
+
+    serializer = ApplicationSerializer(data=_request_data(request), context={'request': request})
+    # Document type and branch may be given by name, which needs a lookup
+    if not await sync_to_async(serializer.is_valid)():
+        return _json(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    document_type = serializer.validated_data['document_type']
+    branch = serializer.validated_data['branch']
+    try:
+        application = await Application.objects.acreate(user=user, document_type=document_type, branch=branch)
+    except exceptions.APIException as e:
+        # The QR code render was refused or timed out in the offload pool (503)
+        return _json({'detail': e.detail}, e.status_code)
+    data = await sync_to_async(lambda: ApplicationSerializer(application, context={'request': request}).data)()
+
+    # Sent before responding: a task left running after the response is cancelled when the
+    # view runs under async_to_sync (WSGI). One bounded attempt, so the wait is at most SMS_TIMEOUT_SECONDS
+    await _send_submission_sms(user, application)
+    return _json(data, status.HTTP_201_CREATED)
+
+
+async def _send_submission_sms(user, application):
+    try:
+        sms_result = await sms_service.asend_application_submission_sms(user, application)
+        if sms_result['success']:
+            print(f"Submission SMS sent successfully to {user.phone_number}")
+        else:
+            print(f"Submission SMS failed: {sms_result['message']}")
+    except Exception as e:
+        print(f"Error sending submission SMS: {str(e)}")
+
+
+_application_list_view = ApplicationViewSet.as_view({'get': 'list', 'post': 'create'})
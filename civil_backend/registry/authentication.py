@@ -0,0 +1,116 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import db_routers
+
+
+class UserCache:
+    """
+    TTL cache of authenticated User objects keyed by primary key.
+
+    Entries live in the default Django cache, so an invalidation reaches every
+    worker process once CACHE_REDIS_URL is set. Each get() unpickles a fresh
+    instance, so per-request attribute changes never leak between requests.
+    """
+
+    key_prefix = 'auth-user:'
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+
+    def _key(self, user_id):
+        return f'{self.key_prefix}{user_id}'
+
+    def get(self, user_id):
+        if self.ttl <= 0:
+            return None
+        return cache.get(self._key(user_id))
+
+    def set(self, user):
+        if self.ttl <= 0:
+            return
+        cache.set(self._key(user.pk), user, self.ttl)
+
+    def invalidate(self, user_id):
+        cache.delete(self._key(user_id))
+
+    def invalidate_many(self, user_ids):
+        cache.delete_many([self._key(user_id) for user_id in user_ids])
+
+
+user_cache = UserCache()
+
+
+class RegistryRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user's role for clients to display.
+
+    The claims are copied unchanged into refreshed access tokens, so they can
+    be stale; permission checks read the user's flags instead (IsRegistryAdmin).
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['is_admin'] = user.is_admin
+        token['is_staff'] = user.is_staff
+        token['registry_branch'] = str(user.registry_branch_id) if user.registry_branch_id else None
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the user from the shared user cache.
+
+    Only a cache miss touches the database, so steady-state authenticated
+    requests perform no auth-related queries. Entries are invalidated by the
+    User post_save/post_delete signals and by User.objects...update(), and
+    expire after AUTH_USER_CACHE_TTL.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = super().get_user(validated_token)
+            except AuthenticationFailed as e:
+                if e.detail.get('code') != 'user_not_found' or not db_routers.replica_configured():
+                    raise
+                # Signed up moments ago, and the replica has not caught up yet
+                with db_routers.use_primary():
+                    user = super().get_user(validated_token)
+            user_cache.set(user)
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
+
+    async def aauthenticate(self, request):
+        """Async counterpart of authenticate(); the user lookup runs off the event loop"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        # One call for the cache read and any database fallback, so an entry
+        # expiring in between can never run the ORM on the event loop
+        user = await sync_to_async(self.get_user)(validated_token)
+        return user, validated_token
@@ -0,0 +1,112 @@
+import base64
+import binascii
+
+from django.db import connections
+from django.db.models import Max, Min, Q
+from rest_framework import exceptions, status
+
+from .db_routers import read_db
+from .models import Application, ChangeLogEntry, Notification
+
+CURSOR_VERSION = 'v1'
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+# Databases the change log is recorded on: migration 0010 installs its
+# triggers on SQLite alone, and elsewhere the feed would silently stay empty
+CHANGE_LOG_VENDORS = ('sqlite',)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class ChangeFeedUnavailable(exceptions.APIException):
+    """The database has no change log triggers; renders as a 501 response"""
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'The change feed is not available on this database.'
+    default_code = 'not_implemented'
+
+
+def ensure_change_log():
+    """Raise ChangeFeedUnavailable unless the read database records the change log"""
+    vendor = connections[read_db()].vendor
+    if vendor not in CHANGE_LOG_VENDORS:
+        raise ChangeFeedUnavailable(f'The change feed is not available on {vendor}.')
+
+
+def encode_cursor(seq):
+    token = f'{CURSOR_VERSION}:{seq}'.encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the change log position encoded in an opaque cursor"""
+    try:
+        token = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        version, seq = token.split(':', 1)
+        seq = int(seq)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('Malformed cursor.')
+    if version != CURSOR_VERSION or seq < 0:
+        raise InvalidCursor('Unsupported cursor.')
+    return seq
+
+
+def changes_since(user, seq, limit=DEFAULT_PAGE_SIZE, all_applications=False):
+    """
+    Return the changes visible to `user` after change log position `seq`.
+
+    Citizens see their own applications and notifications; registry staff
+    (`all_applications`) see every application plus their own notifications.
+    Several writes to one row collapse into its current state: rows that
+    still exist in scope are upserts, everything else is a tombstone.
+
+    SQLite serialises writers, so seq values commit in order and a cursor
+    never skips a change that was still in flight.
+    """
+    alias = read_db()
+    scope = Q(user_id=user.pk)
+    if all_applications:
+        scope |= Q(model='application')
+
+    entries = list(
+        ChangeLogEntry.objects.using(alias)
+        .filter(scope, seq__gt=seq)
+        .order_by('seq')
+        .values_list('seq', 'model', 'object_id')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changed = {'application': [], 'notification': []}
+    seen = set()
+    for _, model, object_id in entries:
+        if (model, object_id) not in seen:
+            seen.add((model, object_id))
+            changed[model].append(object_id)
+
+    applications = Application.objects.using(alias).filter(pk__in=changed['application'])
+    if not all_applications:
+        applications = applications.filter(user_id=user.pk)
+    notifications = Notification.objects.using(alias).filter(pk__in=changed['notification'], user_id=user.pk)
+
+    return {
+        'seq': entries[-1][0] if entries else seq,
+        'has_more': has_more,
+        'applications': applications,
+        'application_ids': changed['application'],
+        'notifications': notifications,
+        'notification_ids': changed['notification'],
+    }
+
+
+def latest_seq():
+    return ChangeLogEntry.objects.using(read_db()).aggregate(seq=Max('seq'))['seq'] or 0
+
+
+def cursor_expired(seq):
+    """True when entries after `seq` have been pruned and the client must resync"""
+    oldest = ChangeLogEntry.objects.using(read_db()).aggregate(seq=Min('seq'))['seq']
+    return oldest is not None and oldest > seq + 1
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from . import db_routers
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    """Replica pins must be visible to every worker process, so they need a shared cache"""
+    if not db_routers.replica_configured() or settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        'A read replica is configured but the default cache is local to each process, so a write pins its '
+        'user to the primary only in the worker that handled it.',
+        hint='Set CACHE_REDIS_URL (or another shared CACHES backend) when running more than one worker process.',
+        id='registry.W001',
+    )]
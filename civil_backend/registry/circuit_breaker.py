@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a dependency is down.
+
+    closed: calls go through; `failure_threshold` consecutive failures open
+    the circuit. open: calls are refused until `reset_timeout` seconds have
+    passed. half_open: one trial call is let through; success closes the
+    circuit again, failure re-opens it. State is per process and safe to
+    share between threads and event loops.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started_at = None
+        self._last_error = None
+        self._rejected = 0
+
+    def allow(self):
+        """True if a call may be attempted now"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    self._rejected += 1
+                    return False
+                self._transition(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN:
+                # One trial at a time; a trial that never reported back is given up after reset_timeout
+                if self._trial_started_at is not None and self._clock() - self._trial_started_at < self.reset_timeout:
+                    self._rejected += 1
+                    return False
+                self._trial_started_at = self._clock()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_started_at = None
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error) if error is not None else None
+            self._trial_started_at = None
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                if self._state != self.OPEN:
+                    self._transition(self.OPEN)
+
+    def retry_after(self):
+        """Seconds until an open circuit lets a trial call through, else 0"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0
+            return max(self.reset_timeout - (self._clock() - self._opened_at), 0)
+
+    def snapshot(self):
+        retry_after = self.retry_after()
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'retry_after': round(retry_after, 1),
+                'rejected_calls': self._rejected,
+                'last_error': self._last_error,
+            }
+
+    def _transition(self, state):
+        logger.warning(f'Circuit {self.name}: {self._state} -> {state}'
+                       + (f' after {self._failures} failures ({self._last_error})' if state == self.OPEN else ''))
+        self._state = state
+        if state == self.CLOSED:
+            self._opened_at = None
@@ -0,0 +1,94 @@
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+import hashlib
+import re
+
+
+def version_digest(values):
+    """Short stable digest of version values, for validators built from many of them"""
+    return hashlib.sha1(repr(values).encode()).hexdigest()[:16]
+
+
+# How representation_variant() tags end
+VARIANT_SUFFIX = re.compile(r'-v[0-9a-f]{8}"$')
+
+
+def representation_variant(params):
+    """Tag for the ?fields= / ?expand= variant a response renders; '' for the default representation"""
+    fields, expand = params.get('fields', ''), params.get('expand', '')
+    if not fields and not expand:
+        return ''
+    return 'v' + version_digest((fields, expand))[:8]
+
+
+def resource_etag(pk, updated_at, *extra):
+    """Version validator for a single row: its key plus its last write time, and any derived values"""
+    key = pk.hex if hasattr(pk, 'hex') else str(pk)
+    stamp = int(updated_at.timestamp() * 1_000_000) if updated_at else 0
+    suffix = ''.join(f'-{value}' for value in extra if value != '')
+    return quote_etag(f'{key}-{stamp:x}{suffix}')
+
+
+def collection_etag(row_versions, *extra):
+    """Version validator for a collection: a digest of the (pk, version, ...) tuple of every row it renders"""
+    suffix = ''.join(f'-{value}' for value in extra if value != '')
+    return quote_etag(f'c{len(row_versions)}-{version_digest(row_versions)}{suffix}')
+
+
+def _opaque(etag):
+    # Weak comparison: compression turns our strong tags into W/"..." on the wire
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def _any_variant(etag):
+    # Every representation of a row is the same version of it, which is what If-Match asks about
+    return VARIANT_SUFFIX.sub('"', etag)
+
+
+def _matches(etag, header, normalize=_opaque):
+    tags = {normalize(_opaque(tag)) for tag in parse_etags(header)}
+    return '*' in tags or normalize(_opaque(etag)) in tags
+
+
+def evaluate_preconditions(request, etag, last_modified=None):
+    """
+    Return a 304 or 412 response when the request's validators say so, else None.
+
+    GET/HEAD honour If-None-Match, then If-Modified-Since; writes honour
+    If-Match so a client editing a stale copy is refused.
+    """
+    if request.method in ('GET', 'HEAD'):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return _not_modified(etag, last_modified) if _matches(etag, if_none_match) else None
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_modified_since and last_modified and int(last_modified.timestamp()) <= if_modified_since:
+            return _not_modified(etag, last_modified)
+        return None
+
+    if_match = request.META.get('HTTP_IF_MATCH')
+    if if_match and not _matches(etag, if_match, _any_variant):
+        response = Response(
+            {'detail': 'The resource has changed since you last fetched it. Reload and try again.'},
+            status=status.HTTP_412_PRECONDITION_FAILED,
+        )
+        set_validators(response, etag, last_modified)
+        return response
+    return None
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Let clients keep a copy but revalidate it on every use
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _not_modified(etag, last_modified):
+    return set_validators(HttpResponseNotModified(), etag, last_modified)
@@ -0,0 +1,71 @@
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY_DB = 'default'
+REPLICA_DB = 'replica'
+
+# True while the current request (or block) must read from the primary
+_pinned_to_primary = contextvars.ContextVar('registry_pinned_to_primary', default=False)
+# Set when the current request has written, so follow-up requests can stick to the primary
+_wrote_to_primary = contextvars.ContextVar('registry_wrote_to_primary', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB in settings.DATABASES
+
+
+def read_db():
+    """Alias reporting queries should read from"""
+    if _pinned_to_primary.get() or not replica_configured():
+        return PRIMARY_DB
+    return REPLICA_DB
+
+
+def pin_user(request, user):
+    """Pin `user` to the primary after this request, for writes made before the caller has a token"""
+    # Set on the Django request, which PrimaryPinningMiddleware sees, not on DRF's wrapper
+    getattr(request, '_request', request).primary_pin_user_id = user.pk
+
+
+@contextmanager
+def use_primary():
+    """Force every read inside the block to hit the primary database"""
+    token = _pinned_to_primary.set(True)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Send reads to the `replica` alias and writes to `default`.
+
+    Once anything is written in the current context, reads are pinned to the
+    primary so the caller always sees its own changes. Without a `replica`
+    entry in DATABASES every query goes to `default`.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == PRIMARY_DB:
+            # Related lookups follow the object they were loaded from
+            return PRIMARY_DB
+        return read_db()
+
+    def db_for_write(self, model, **hints):
+        _pinned_to_primary.set(True)
+        _wrote_to_primary.set(True)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so objects from either may relate
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB:
+            # The replica is refreshed from the primary, never migrated directly
+            return False
+        return None
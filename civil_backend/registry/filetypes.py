@@ -0,0 +1,172 @@
+"""
+File type detection for uploads.
+
+Every allowed type starts with a fixed signature, so most files are
+identified from their leading bytes in pure Python (`sniff`). libmagic is
+asked only when that is inconclusive, through `MagicDetector`, which keeps
+one loaded libmagic handle per thread: python-magic's module-level handle
+serializes every lookup behind a single lock.
+
+A signature only vouches for the first few bytes, so `StructureCheck`
+follows the rest of the file as it arrives and checks what the format
+requires at both ends or deeper in: the PNG signature and end chunk, the
+PDF end-of-file marker, a DOCX central directory listing word/document.xml
+and the WordDocument stream of a legacy Word file, wherever its directory
+sector is.
+"""
+import struct
+import threading
+
+JPEG = 'image/jpeg'
+PNG = 'image/png'
+GIF = 'image/gif'
+PDF = 'application/pdf'
+DOC = 'application/msword'
+DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Leading bytes needed to tell the allowed types apart (DOCX names its parts near the start)
+HEAD_SIZE = 2048
+# Trailing bytes kept for the end-of-file checks; PDF readers look for %%EOF in the last 1024
+TAIL_SIZE = 1024
+# Trailing bytes kept for a ZIP file, enough for the central directory of any real DOCX
+ZIP_TAIL_SIZE = 64 * 1024
+
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_SIGNATURE = b'PK\x03\x04'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+SIGNATURES = (
+    (b'\xff\xd8\xff', JPEG),
+    (PNG_SIGNATURE, PNG),
+    (b'GIF87a', GIF),
+    (b'GIF89a', GIF),
+    (b'%PDF-', PDF),
+    # Any OLE2 compound file; StructureCheck confirms it holds a Word document
+    (OLE_SIGNATURE, DOC),
+)
+
+# First part of an Office Open XML package, as libmagic's msooxml rule expects
+OOXML_FIRST_PARTS = (b'[Content_Types].xml', b'_rels/.rels')
+# The main part every Word package has
+DOCX_DOCUMENT_PART = b'word/document.xml'
+
+# Directory sectors of an OLE2 file scanned for the WordDocument stream
+OLE_DIRECTORY_SECTORS = 4
+WORD_DOCUMENT_ENTRY = 'WordDocument'.encode('utf-16-le')
+
+
+def sniff(head):
+    """MIME type of an allowed file from its leading bytes, or None when they are not conclusive"""
+    for signature, mime_type in SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head.startswith(ZIP_SIGNATURE) and len(head) >= 30:
+        name_length = struct.unpack_from('<H', head, 26)[0]
+        if head[30:30 + name_length] in OOXML_FIRST_PARTS and b'word/' in head:
+            return DOCX
+    return None
+
+
+class MagicDetector:
+    """libmagic MIME lookups, with a handle per thread so threads never wait on each other"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _handle(self):
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            # libmagic loads its database on import; only upload requests need it
+            import magic
+            handle = self._local.handle = magic.Magic(mime=True)
+        return handle
+
+    def from_buffer(self, data):
+        return self._handle().from_buffer(data)
+
+
+detector = MagicDetector()
+
+
+def detect_mime_type(head):
+    """MIME type of a file from its leading bytes: the signature fast path, else libmagic"""
+    return sniff(head) or detector.from_buffer(head)
+
+
+class StructureCheck:
+    """
+    Follows one file's bytes, fed in order, and keeps what the format checks need.
+
+    Only the first 512 bytes, the last TAIL_SIZE bytes (ZIP_TAIL_SIZE for ZIP
+    files) and, for OLE2 files, the first directory sectors are kept, so a
+    file of any size is checked in constant memory.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.head = b''
+        self.tail = b''
+        self.directory = b''
+        self._directory_range = None
+
+    def feed(self, data):
+        start = self.size
+        self.size += len(data)
+        if len(self.head) < 512:
+            self.head += data[:512 - len(self.head)]
+            if len(self.head) == 512 and self.head.startswith(OLE_SIGNATURE):
+                self._directory_range = self._ole_directory_range()
+        if self._directory_range:
+            low, high = self._directory_range
+            if start < high and self.size > low:
+                self.directory += data[max(low - start, 0):high - start]
+        keep = ZIP_TAIL_SIZE if self.head.startswith(ZIP_SIGNATURE) else TAIL_SIZE
+        self.tail = (self.tail + data[-keep:])[-keep:]
+
+    def _ole_directory_range(self):
+        sector_shift, = struct.unpack_from('<H', self.head, 30)
+        first_sector, = struct.unpack_from('<I', self.head, 48)
+        if sector_shift not in (9, 12) or first_sector >= 0xFFFFFFFA:
+            return None
+        # Sector n starts after the header, which takes up one sector
+        low = (first_sector + 1) << sector_shift
+        return low, low + (OLE_DIRECTORY_SECTORS << sector_shift)
+
+    def problem(self, mime_type):
+        """Why the file is not a well-formed `mime_type` file, or None"""
+        if mime_type == PNG and not self.head.startswith(PNG_SIGNATURE):
+            return 'The file is not a PNG image.'
+        if mime_type == PNG and b'IEND\xaeB`\x82' not in self.tail:
+            return 'The PNG image is incomplete.'
+        if mime_type == PDF and b'%%EOF' not in self.tail:
+            return 'The PDF document is incomplete.'
+        if mime_type == DOCX and not self.head.startswith(ZIP_SIGNATURE):
+            return 'The file is not a Word document.'
+        if mime_type == DOCX:
+            parts = self._zip_part_names()
+            if parts is None:
+                return 'The Word document is incomplete.'
+            if DOCX_DOCUMENT_PART not in parts:
+                return 'The file is not a Word document.'
+        if mime_type == DOC and WORD_DOCUMENT_ENTRY not in self.directory:
+            return 'The file is not a Word document.'
+        # JPEG and GIF are not checked past the header: phones append their
+        # own data (motion photo video, maker notes) after the end marker
+        return None
+
+    def _zip_part_names(self):
+        """Names in the ZIP central directory, or None when it is missing or not in the kept tail"""
+        end = self.tail.rfind(b'PK\x05\x06')
+        if end < 0 or len(self.tail) - end < 22:
+            return None
+        directory_size, directory_offset = struct.unpack_from('<II', self.tail, end + 12)
+        start = len(self.tail) - (self.size - directory_offset)
+        # The directory must sit right before the end record, inside what was kept
+        if start < 0 or start + directory_size != end:
+            return None
+        names, position = set(), start
+        while position + 46 <= end and self.tail.startswith(b'PK\x01\x02', position):
+            name_length, extra_length, comment_length = struct.unpack_from('<HHH', self.tail, position + 28)
+            names.add(self.tail[position + 46:position + 46 + name_length])
+            position += 46 + name_length + extra_length + comment_length
+        return names
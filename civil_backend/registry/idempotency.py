@@ -0,0 +1,176 @@
+"""
+Idempotency-Key support for writes that clients retry on timeout.
+
+The first request with a key claims an IdempotencyKey row before doing any
+work and stores its rendered response afterwards; a retry with the same key
+gets that response replayed (marked `Idempotent-Replayed: true`) instead of
+creating a second application or sending a second SMS. Error responses are
+not stored, so a corrected request can reuse the key. Keys are scoped to
+the signed-in user, looked up through the (scope, key) unique index and
+expire after IDEMPOTENCY_KEY_TTL_HOURS.
+"""
+from datetime import timedelta
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+from .renderers import FastJSONRenderer
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+# Response headers worth replaying along with the body
+STORED_HEADERS = ('ETag', 'Last-Modified', 'Location', 'Cache-Control')
+
+
+class IdempotencyError(Exception):
+    def __init__(self, detail, status_code):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def request_key(request):
+    """The request's Idempotency-Key, None when absent"""
+    key = request.META.get(HEADER)
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(
+            f'Idempotency-Key must be between 1 and {MAX_KEY_LENGTH} characters.', status.HTTP_400_BAD_REQUEST
+        )
+    return key
+
+
+def key_scope(user):
+    return user.pk.hex if user is not None and user.is_authenticated else 'anonymous'
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    if request.META.get('CONTENT_TYPE', '').startswith('multipart/'):
+        # The boundary changes on every send, so hash the parsed form instead: every
+        # field value, and each upload's name and size (uploads are not re-read to hash them)
+        fields = {name: request.POST.getlist(name) for name in request.POST}
+        files = {name: [(upload.name, upload.size) for upload in request.FILES.getlist(name)]
+                 for name in request.FILES}
+        digest.update(json.dumps([fields, files], sort_keys=True).encode())
+    else:
+        digest.update(request.body)
+    return digest.hexdigest()
+
+
+def claim(scope, key, fingerprint):
+    """
+    Reserve `key` for a new request, or find the response stored for it.
+
+    Returns (claimed record, None) when the caller should do the work and
+    (None, stored record) when it should replay. Raises IdempotencyError
+    when the key belongs to a different request or one still in progress.
+    """
+    now = timezone.now()
+    lock_expiry = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                scope=scope, key=key, fingerprint=fingerprint, expires_at=lock_expiry
+            ), None
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+    if existing is None or existing.expires_at <= now:
+        # Expired, or released by a failed attempt: take the key over unless another retry just did
+        taken = IdempotencyKey.objects.filter(
+            scope=scope, key=key, expires_at__lte=now
+        ).update(
+            fingerprint=fingerprint, status_code=None, content_type='', headers={}, body=b'',
+            created_at=now, expires_at=lock_expiry,
+        )
+        if taken:
+            return IdempotencyKey.objects.get(scope=scope, key=key), None
+        if existing is None:
+            return claim(scope, key, fingerprint)
+        existing = IdempotencyKey.objects.get(scope=scope, key=key)
+
+    if existing.fingerprint != fingerprint:
+        raise IdempotencyError(
+            'This Idempotency-Key was already used for a different request.',
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if existing.status_code is None:
+        raise IdempotencyError(
+            'A request with this Idempotency-Key is still being processed. Retry shortly.',
+            status.HTTP_409_CONFLICT,
+        )
+    return None, existing
+
+
+def store(record, response, body, content_type):
+    """
+    Save the outcome of a claimed request for replay.
+
+    Only successes are kept. A 4xx wrote nothing, and the client is expected
+    to correct the request and send it again under the same key; a 5xx may
+    succeed on retry. Either way the key is freed instead.
+    """
+    if response.status_code >= 400:
+        release(record)
+        return
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        status_code=response.status_code,
+        content_type=content_type,
+        headers={header: response[header] for header in STORED_HEADERS if response.has_header(header)},
+        body=body,
+        expires_at=timezone.now() + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+    )
+
+
+def release(record):
+    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+
+
+def replay(record):
+    response = HttpResponse(bytes(record.body), content_type=record.content_type, status=record.status_code)
+    for header, value in record.headers.items():
+        response[header] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """Honour Idempotency-Key on a DRF view method; requests without the header run as before"""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        try:
+            key = request_key(request)
+            record, stored = (None, None) if key is None else claim(
+                key_scope(request.user), key, request_fingerprint(request)
+            )
+        except IdempotencyError as e:
+            return Response({'detail': e.detail}, status=e.status_code)
+        if key is None:
+            return view_method(self, request, *args, **kwargs)
+        if stored is not None:
+            return replay(stored)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            # Validation and permission errors are raised before anything is written; let the retry re-run
+            release(record)
+            raise
+        if isinstance(response, Response):
+            store(record, response, FastJSONRenderer().render(response.data), 'application/json')
+        else:
+            store(record, response, response.content, response['Content-Type'])
+        return response
+    return wrapper
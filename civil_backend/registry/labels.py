@@ -0,0 +1,187 @@
+"""
+Printable QR label sheets.
+
+QR codes are rendered as bare module matrices in the shared offload
+pool (registry.offload) and written straight into a PDF as 1-bit images,
+one image pixel per QR module scaled up by the page transform, so labels
+print sharp at any size and a page of 14 labels is a few kilobytes. The PDF is produced a
+page at a time (`stream_label_sheet`), so the first bytes reach the
+client while later pages are still rendering.
+"""
+import zlib
+
+from .offload import offload_service
+
+# A4 portrait in points, 2 x 7 labels
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 28
+COLUMNS, ROWS = 2, 7
+LABELS_PER_PAGE = COLUMNS * ROWS
+CELL_WIDTH = (PAGE_WIDTH - 2 * MARGIN) / COLUMNS
+CELL_HEIGHT = (PAGE_HEIGHT - 2 * MARGIN) / ROWS
+QR_SIZE = CELL_HEIGHT - 12
+TEXT_SIZE = 9
+TEXT_CHARS = 30
+
+# Below this many labels the round trips to the pool cost more than they save
+POOL_THRESHOLD = 50
+
+
+def render_qr_matrix(data):
+    """
+    (size, FlateDecode'd 1-bit rows) for `data`, dark modules 0.
+
+    Encodes the same text as utils.generate_qr_code.
+    """
+    import qrcode
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=4)
+    qr.add_data(str(data))
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    rows = bytearray()
+    for row in matrix:
+        bits = 0
+        for dark in row:
+            bits = (bits << 1) | (not dark)
+        padding = -len(row) % 8
+        rows += (bits << padding).to_bytes((len(row) + padding) // 8, 'big')
+    return len(matrix), zlib.compress(bytes(rows))
+
+
+def render_qr_matrices(values):
+    """Yield render_qr_matrix(value) for each value, in order, spread over the offload pool"""
+    values = list(values)
+    if len(values) < POOL_THRESHOLD:
+        yield from map(render_qr_matrix, values)
+        return
+    chunk_size = max(len(values) // (max(offload_service.workers, 1) * 4), 1)
+    yield from offload_service.imap(render_qr_matrix, values, chunk_size=min(chunk_size, 100))
+
+
+def _pdf_text(value):
+    # Helvetica with WinAnsiEncoding covers Latin-1; anything else prints as '?'
+    text = ' '.join(str(value or '').split())
+    if len(text) > TEXT_CHARS:
+        text = text[:TEXT_CHARS - 3].rstrip() + '...'
+    text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return text.encode('latin-1', 'replace')
+
+
+class _PDFWriter:
+    """Numbers objects and remembers their offsets for the cross-reference table"""
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.next_number = 1
+
+    def reserve(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def chunk(self, data):
+        self.offset += len(data)
+        return data
+
+    def obj(self, number, body, stream=None):
+        self.offsets[number] = self.offset
+        data = b'%d 0 obj\n' % number + body
+        if stream is not None:
+            data += b'\nstream\n' + stream + b'\nendstream'
+        return self.chunk(data + b'\nendobj\n')
+
+    def trailer(self, root):
+        xref = self.offset
+        entries = b''.join(b'%010d 00000 n \n' % self.offsets[number] for number in range(1, self.next_number))
+        return self.chunk(
+            b'xref\n0 %d\n0000000000 65535 f \n' % self.next_number + entries
+            + b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self.next_number, root, xref)
+        )
+
+
+def stream_label_sheet(labels):
+    """
+    Yield a PDF label sheet as byte chunks, one page per chunk.
+
+    `labels` is an iterable of (lines, (size, matrix)) where `lines` are
+    up to four lines of text printed next to the QR code, the first in bold.
+    """
+    pdf = _PDFWriter()
+    catalog, pages, font, bold = (pdf.reserve() for _ in range(4))
+    yield pdf.chunk(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    yield (
+        pdf.obj(font, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+        + pdf.obj(bold, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+    )
+
+    kids = []
+    page_labels = []
+    for label in labels:
+        page_labels.append(label)
+        if len(page_labels) == LABELS_PER_PAGE:
+            yield _page(pdf, pages, font, bold, page_labels, kids)
+            page_labels = []
+    if page_labels or not kids:
+        yield _page(pdf, pages, font, bold, page_labels, kids)
+
+    yield (
+        pdf.obj(pages, b'<< /Type /Pages /Kids [%s] /Count %d >>'
+                % (b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)))
+        + pdf.obj(catalog, b'<< /Type /Catalog /Pages %d 0 R >>' % pages)
+        + pdf.trailer(catalog)
+    )
+
+
+def _page(pdf, pages, font, bold, labels, kids):
+    chunks = []
+    images = []
+    content = []
+    for index, (lines, (size, matrix)) in enumerate(labels):
+        image = pdf.reserve()
+        images.append(b'/Q%d %d 0 R' % (index, image))
+        chunks.append(pdf.obj(
+            image,
+            b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray '
+            b'/BitsPerComponent 1 /Filter /FlateDecode /Length %d >>' % (size, size, len(matrix)),
+            matrix,
+        ))
+
+        column, row = index % COLUMNS, index // COLUMNS
+        x = MARGIN + column * CELL_WIDTH
+        top = PAGE_HEIGHT - MARGIN - row * CELL_HEIGHT
+        qr_y = top - (CELL_HEIGHT + QR_SIZE) / 2
+        content.append(b'q %.2f 0 0 %.2f %.2f %.2f cm /Q%d Do Q' % (QR_SIZE, QR_SIZE, x + 6, qr_y, index))
+        text_y = qr_y + QR_SIZE / 2 + TEXT_SIZE * 2
+        for number, line in enumerate(lines[:4]):
+            content.append(b'BT /F%d %d Tf %.2f %.2f Td (%s) Tj ET' % (
+                2 if number == 0 else 1, TEXT_SIZE + (2 if number == 0 else 0),
+                x + QR_SIZE + 14, text_y - number * (TEXT_SIZE + 5), _pdf_text(line),
+            ))
+
+    stream = zlib.compress(b'\n'.join(content))
+    contents, page = pdf.reserve(), pdf.reserve()
+    chunks.append(pdf.obj(contents, b'<< /Length %d /Filter /FlateDecode >>' % len(stream), stream))
+    chunks.append(pdf.obj(
+        page,
+        b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+        b'/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> /XObject << %s >> >> >>'
+        % (pages, PAGE_WIDTH, PAGE_HEIGHT, contents, font, bold, b' '.join(images)),
+    ))
+    kids.append(page)
+    return b''.join(chunks)
+
+
+def application_labels(applications):
+    """(lines, matrix) for each application: reference, applicant, document type and branch"""
+    applications = list(applications)
+    matrices = render_qr_matrices(application.reference_number for application in applications)
+    for application, matrix in zip(applications, matrices):
+        lines = (
+            application.reference_number,
+            application.user.full_name or application.user.email,
+            application.document_type.name,
+            application.branch.name,
+        )
+        yield lines, matrix
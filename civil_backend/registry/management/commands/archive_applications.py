@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from registry.models import (
+    Application, ArchivedApplication, ArchivedAttachment, ArchivedNotification, Attachment, Notification,
+)
+from datetime import timedelta
+
+
+class Command(BaseCommand):
+    help = 'Move finished applications, their attachments and notifications into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Archive applications finished more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500, help='Applications moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        candidates = Application.objects.filter(status__in=settings.ARCHIVE_STATUSES, updated_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'{candidates.count()} applications would be archived')
+            return
+
+        totals = {'applications': 0, 'attachments': 0, 'notifications': 0}
+        while True:
+            ids = list(candidates.order_by('updated_at').values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            moved = self._archive_batch(candidates, ids)
+            for key, count in moved.items():
+                totals[key] += count
+            self.stdout.write(f'  archived {totals["applications"]} applications')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {totals["applications"]} applications, {totals["attachments"]} attachments '
+            f'and {totals["notifications"]} notifications older than {options["days"]} days'
+        ))
+
+    @transaction.atomic
+    def _archive_batch(self, candidates, ids):
+        # Re-filter inside the transaction so rows reopened meanwhile stay live
+        applications = list(candidates.filter(pk__in=ids))
+        ids = [application.pk for application in applications]
+        attachments = list(Attachment.objects.filter(application_id__in=ids))
+        notifications = list(Notification.objects.filter(application_id__in=ids))
+
+        ArchivedApplication.objects.bulk_create([
+            ArchivedApplication(**self._copy(application, ArchivedApplication)) for application in applications
+        ])
+        ArchivedAttachment.objects.bulk_create([
+            ArchivedAttachment(**self._copy(attachment, ArchivedAttachment)) for attachment in attachments
+        ])
+        ArchivedNotification.objects.bulk_create([
+            ArchivedNotification(**self._copy(notification, ArchivedNotification)) for notification in notifications
+        ])
+
+        Notification.objects.filter(pk__in=[notification.pk for notification in notifications]).delete()
+        Attachment.objects.filter(pk__in=[attachment.pk for attachment in attachments]).delete()
+        Application.objects.filter(pk__in=ids).delete()
+        return {'applications': len(applications), 'attachments': len(attachments), 'notifications': len(notifications)}
+
+    def _copy(self, instance, archive_model):
+        # Column values are copied as-is, so file fields keep their stored paths
+        values = {}
+        for field in archive_model._meta.concrete_fields:
+            if hasattr(instance, field.attname):
+                value = getattr(instance, field.attname)
+                values[field.attname] = value.name if isinstance(value, FieldFile) else value
+        return values
@@ -0,0 +1,206 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SEED_SCRIPT = """
+import json
+from registry.authentication import RegistryRefreshToken
+from registry.models import Application, DocumentType, RegistryBranch, User
+branch = RegistryBranch.objects.create(name='Bench Branch', address='1 Bench Road', phone='+263242000000')
+document_type = DocumentType.objects.create(name='Bench Certificate', processing_days=5)
+user = User.objects.create_user(
+    username='bench', email='bench@example.com', password='bench-password',
+    full_name='Bench Citizen', phone_number='+263771234567',
+)
+refs = [
+    Application.objects.create(user=user, document_type=document_type, branch=branch).reference_number
+    for _ in range(20)
+]
+print(json.dumps({
+    'token': str(RegistryRefreshToken.for_user(user).access_token),
+    'document_type': str(document_type.pk),
+    'branch': str(branch.pk),
+    'refs': refs,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent slow requests under uvicorn with the async views on and off'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--sms-latency', type=int, default=300,
+                            help='Milliseconds the stub SMS gateway takes to answer')
+        parser.add_argument('--port', type=int, default=8765, help='Port for the uvicorn server')
+
+    def handle(self, *args, **options):
+        try:
+            import aiohttp  # noqa: F401
+            import uvicorn  # noqa: F401
+        except ImportError as e:
+            raise CommandError(f'bench_asgi needs uvicorn and aiohttp installed ({e})')
+
+        workdir = tempfile.mkdtemp(prefix='bench_asgi_')
+        gateway_port = self._free_port()
+        env = {
+            **os.environ,
+            'PYTHONPATH': str(settings.BASE_DIR),
+            'DJANGO_SETTINGS_MODULE': 'civil_backend.settings',
+            'DATABASE_NAME': os.path.join(workdir, 'bench.sqlite3'),
+            'MEDIA_ROOT': os.path.join(workdir, 'media'),
+            'SQLITE_CONCURRENCY_PROFILE': '1',
+            'TWILIO_ACCOUNT_SID': 'ACbench',
+            'TWILIO_AUTH_TOKEN': 'bench',
+            'TWILIO_PHONE_NUMBER': '+15005550006',
+            'TWILIO_API_BASE_URL': f'http://127.0.0.1:{gateway_port}',
+        }
+
+        try:
+            seed = self._prepare_database(env, workdir)
+            gateway = self._start_gateway(gateway_port, options['sms_latency'] / 1000)
+            self.stdout.write(
+                f'{options["requests"]} requests per scenario, concurrency {options["concurrency"]}, '
+                f'SMS gateway latency {options["sms_latency"]} ms\n'
+            )
+            self.stdout.write(f'{"mode":<6} {"scenario":<8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+                              f'{"errors":>7} {"threads":>8}')
+            for mode, flag in (('sync', '0'), ('async', '1')):
+                server = self._start_server({**env, 'ASYNC_VIEWS': flag}, workdir, options['port'])
+                try:
+                    for scenario in ('track', 'submit'):
+                        result = asyncio.run(self._load(scenario, seed, server.pid, options))
+                        self.stdout.write(
+                            f'{mode:<6} {scenario:<8} {result["rate"]:8.1f} {result["p50"]:8.1f} '
+                            f'{result["p95"]:8.1f} {result["errors"]:7d} {result["threads"]:8d}'
+                        )
+                finally:
+                    server.terminate()
+                    server.wait(timeout=10)
+            gateway.call_soon_threadsafe(gateway.stop)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def _prepare_database(self, env, workdir):
+        manage = os.path.join(settings.BASE_DIR, 'manage.py')
+        subprocess.run([sys.executable, manage, 'migrate', '-v0'], env=env, cwd=workdir, check=True,
+                       stderr=subprocess.DEVNULL)
+        seeded = subprocess.run([sys.executable, manage, 'shell', '-c', SEED_SCRIPT], env=env, cwd=workdir,
+                                check=True, capture_output=True, text=True)
+        return json.loads(seeded.stdout.strip().splitlines()[-1])
+
+    def _start_gateway(self, port, latency):
+        """Stub Twilio Messages API that answers after `latency` seconds"""
+        from aiohttp import web
+
+        async def create_message(request):
+            await asyncio.sleep(latency)
+            return web.json_response({'sid': 'SMbench', 'status': 'queued'}, status=201)
+
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            app = web.Application()
+            app.router.add_post('/2010-04-01/Accounts/{sid}/Messages.json', create_message)
+            runner = web.AppRunner(app, access_log=None)
+            loop.run_until_complete(runner.setup())
+            loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', port).start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        ready.wait(10)
+        return loop
+
+    def _start_server(self, env, workdir, port):
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'civil_backend.asgi:application', '--port', str(port),
+             '--log-level', 'warning', '--no-access-log'],
+            env=env, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+                return server
+            except OSError:
+                time.sleep(0.1)
+        server.terminate()
+        raise CommandError('uvicorn did not start')
+
+    async def _load(self, scenario, seed, pid, options):
+        import aiohttp
+
+        base = f'http://127.0.0.1:{options["port"]}/api'
+        headers = {'Authorization': f'Bearer {seed["token"]}'}
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+        errors = 0
+        peak_threads = 0
+
+        async def one(session, i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                if scenario == 'track':
+                    request = session.get(f'{base}/track-by-reference/',
+                                          params={'ref': seed['refs'][i % len(seed['refs'])]})
+                else:
+                    request = session.post(f'{base}/applications/', headers=headers,
+                                           json={'document_type': seed['document_type'], 'branch': seed['branch']})
+                async with request as response:
+                    await response.read()
+                    if response.status >= 400:
+                        errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        async def watch_threads():
+            nonlocal peak_threads
+            while True:
+                peak_threads = max(peak_threads, self._thread_count(pid))
+                await asyncio.sleep(0.05)
+
+        connector = aiohttp.TCPConnector(limit=options['concurrency'])
+        async with aiohttp.ClientSession(connector=connector) as session:
+            watcher = asyncio.ensure_future(watch_threads())
+            started = time.perf_counter()
+            await asyncio.gather(*(one(session, i) for i in range(options['requests'])))
+            elapsed = time.perf_counter() - started
+            watcher.cancel()
+
+        latencies.sort()
+        return {
+            'rate': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'errors': errors,
+            'threads': peak_threads,
+        }
+
+    def _thread_count(self, pid):
+        try:
+            with open(f'/proc/{pid}/status') as status:
+                for line in status:
+                    if line.startswith('Threads:'):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
@@ -0,0 +1,132 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from registry import filetypes
+from registry.labels import render_qr_matrix, stream_label_sheet
+from registry.security import SecurityValidator
+from registry.utils import render_qr_png
+from io import BytesIO
+import os
+import struct
+import threading
+import time
+import zipfile
+
+
+def _jpeg():
+    from PIL import Image
+    buffer = BytesIO()
+    Image.frombytes('L', (400, 300), os.urandom(400 * 300)).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def _gif():
+    from PIL import Image
+    buffer = BytesIO()
+    Image.frombytes('P', (200, 200), bytes(range(256)) * 156 + bytes(64)).save(buffer, 'GIF')
+    return buffer.getvalue()
+
+
+def _pdf():
+    labels = [((f'AB-{i:010d}', 'Citizen Number', 'Birth Certificate', 'Harare'), render_qr_matrix(f'AB-{i:010d}'))
+              for i in range(14)]
+    return b''.join(stream_label_sheet(labels))
+
+
+def _docx():
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', '<Types>' + '<Override PartName="/word/x.xml"/>' * 12 + '</Types>')
+        package.writestr('_rels/.rels', '<Relationships><Relationship Target="word/document.xml"/></Relationships>')
+        package.writestr('word/document.xml', '<w:document>' + '<w:p><w:r><w:t>Text</w:t></w:r></w:p>' * 2000
+                         + '</w:document>')
+    return buffer.getvalue()
+
+
+def _doc():
+    """Minimal OLE2 file laid out like Word's: stream data first, the directory sector after it"""
+    end, free, fat_sector, no_stream = 0xFFFFFFFE, 0xFFFFFFFF, 0xFFFFFFFD, 0xFFFFFFFF
+    header = (filetypes.OLE_SIGNATURE + bytes(16) + struct.pack('<HHHHH', 0x3E, 3, 0xFFFE, 9, 6) + bytes(6)
+              + struct.pack('<9I', 0, 1, 8, 0, 4096, end, 0, end, 0)
+              + struct.pack('<I', 9) + struct.pack('<I', free) * 108)
+
+    def entry(name, kind, child=no_stream, start=end, size=0):
+        name = (name + '\0').encode('utf-16-le') if name else b''
+        return (name.ljust(64, b'\0') + struct.pack('<HBB', len(name), kind, 1 if kind else 0)
+                + struct.pack('<III', no_stream, no_stream, child) + bytes(36) + struct.pack('<IQ', start, size))
+
+    word_document = struct.pack('<H', 0xA5EC).ljust(4096, b'\0')
+    directory = entry('Root Entry', 5, child=1) + entry('WordDocument', 2, start=0, size=4096) + entry('', 0) * 2
+    fat = list(range(1, 8)) + [end, end, fat_sector]
+    fat = struct.pack(f'<{len(fat)}I', *fat) + struct.pack('<I', free) * (128 - len(fat))
+    return header + word_document + directory + fat
+
+
+SAMPLES = (
+    ('photo.jpg', _jpeg),
+    ('label.png', lambda: render_qr_png('AB-0000000000')),
+    ('scan.gif', _gif),
+    ('labels.pdf', _pdf),
+    ('letter.docx', _docx),
+    ('letter.doc', _doc),
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark upload type detection: python-magic, per-thread libmagic and the signature fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=5000, help='Detections per thread for each method')
+        parser.add_argument('--threads', type=int, default=4, help='Threads for the concurrent runs')
+
+    def handle(self, *args, **options):
+        import magic
+
+        samples = [(name, build()) for name, build in SAMPLES]
+        self.stdout.write(f"Samples (fast path / libmagic on the first {filetypes.HEAD_SIZE} bytes / libmagic on the whole file):")
+        mismatches = []
+        for name, data in samples:
+            head = data[:filetypes.HEAD_SIZE]
+            fast = filetypes.sniff(head)
+            whole = magic.from_buffer(data, mime=True)
+            self.stdout.write(f'  {name:12} {len(data):7} bytes  {fast} / {magic.from_buffer(head, mime=True)} / {whole}')
+            if fast != whole:
+                mismatches.append(name)
+
+        heads = [data[:filetypes.HEAD_SIZE] for _, data in samples]
+        methods = (
+            ('python-magic', lambda head: magic.from_buffer(head, mime=True)),
+            ('MagicDetector', filetypes.detector.from_buffer),
+            ('detect_mime_type', filetypes.detect_mime_type),
+        )
+        self.stdout.write(f"\nHeader detection, {options['calls']} calls per thread (calls/s):")
+        self.stdout.write(f"  {'method':18} {'1 thread':>12} {str(options['threads']) + ' threads':>12}")
+        for label, detect in methods:
+            single = self._throughput(detect, heads, options['calls'], 1)
+            concurrent = self._throughput(detect, heads, options['calls'], options['threads'])
+            self.stdout.write(f'  {label:18} {single:12,.0f} {concurrent:12,.0f}')
+
+        self.stdout.write('\nFull validation (SecurityValidator.validate_file_upload, header and structure):')
+        for name, data in samples:
+            upload = SimpleUploadedFile(name, data)
+            repeat = max(options['calls'] // 10, 1)
+            started = time.perf_counter()
+            for _ in range(repeat):
+                SecurityValidator.validate_file_upload(upload)
+            per_call = (time.perf_counter() - started) / repeat
+            self.stdout.write(f'  {name:12} {per_call * 1e6:9.1f} us')
+
+        if mismatches:
+            raise CommandError(f"Fast path disagrees with libmagic for: {', '.join(mismatches)}")
+
+    def _throughput(self, detect, heads, calls, threads):
+        def work():
+            for index in range(calls):
+                detect(heads[index % len(heads)])
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return calls * threads / (time.perf_counter() - started)
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import json
+import statistics
+import subprocess
+import sys
+
+# What a web worker imports before serving its first request
+WORKER_BOOT = (
+    "from civil_backend.asgi import application; "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+# Only needed once an SMS is sent, a file is sniffed or a QR code is drawn;
+# importing any of them at startup is a regression
+DEFERRED_PACKAGES = ('twilio', 'magic', 'qrcode', 'PIL', 'aiohttp')
+
+# name: (arguments to python -X importtime, import budget in ms for the median run, deferred packages allowed)
+SCENARIOS = {
+    # ImageField's system check imports Pillow itself to verify it is installed
+    'check': (['manage.py', 'check'], 500, ('PIL',)),
+    'worker': (['-c', WORKER_BOOT], 500, ()),
+}
+
+
+def parse_importtime(output):
+    """-X importtime lines as (self_us, cumulative_us, depth, module), in the order Python printed them"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def importer_chain(rows, index):
+    """Module at `index` and the modules that imported it, innermost first"""
+    # Children are printed before their parent, so the importer is the next row one level up
+    chain = [rows[index][3]]
+    depth = rows[index][2] - 1
+    for _, _, row_depth, module in rows[index + 1:]:
+        if depth < 0:
+            break
+        if row_depth == depth:
+            chain.append(module)
+            depth -= 1
+    return chain
+
+
+class Command(BaseCommand):
+    help = 'Measure startup import time of manage.py check and a worker boot with -X importtime, against budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per scenario; the median is reported')
+        parser.add_argument('--top', type=int, default=10, help='Packages listed per scenario, by import time')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        report = {}
+        failures = []
+        for name, (command, budget, allowed) in SCENARIOS.items():
+            result = report[name] = self._measure(command, options['repeat'])
+            result['budget_ms'] = budget
+            if result['import_ms'] > budget:
+                failures.append(f"{name}: imports take {result['import_ms']:.0f} ms, budget {budget} ms")
+            for package, chain in result['deferred_imported'].items():
+                if package not in allowed:
+                    failures.append(f"{name}: {package} imported at startup via {' <- '.join(chain)}")
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for name, result in report.items():
+                self._print(name, result, options['top'])
+        if failures:
+            raise CommandError('Import-time budget exceeded:\n  ' + '\n  '.join(failures))
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS('All scenarios within their import-time budget'))
+
+    def _measure(self, command, repeat):
+        runs = []
+        for _ in range(repeat):
+            completed = subprocess.run(
+                [sys.executable, '-X', 'importtime', *command],
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+            )
+            if completed.returncode:
+                raise CommandError(f"{' '.join(command)} failed:\n{completed.stderr[-2000:]}")
+            runs.append(parse_importtime(completed.stderr))
+
+        totals = [sum(cumulative for _, cumulative, depth, _ in rows if depth == 0) for rows in runs]
+        median_run = runs[totals.index(sorted(totals)[len(totals) // 2])]
+
+        packages = {}
+        deferred = {}
+        for index, (self_us, _, _, module) in enumerate(median_run):
+            package = module.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us
+            if package in DEFERRED_PACKAGES and package not in deferred:
+                chain = importer_chain(median_run, index)
+                # Name the first importer that is not itself a deferred package: the code to fix
+                culprit = next(
+                    (i for i, name in enumerate(chain) if name.split('.')[0] not in DEFERRED_PACKAGES), len(chain)
+                )
+                if culprit == len(chain):
+                    # Imported from inside a function rather than by another module
+                    deferred[package] = chain[-1:]
+                else:
+                    deferred[package] = chain[:1] + (['...'] if culprit > 1 else []) + chain[culprit:culprit + 2]
+
+        return {
+            'import_ms': round(statistics.median(totals) / 1000, 1),
+            'min_ms': round(min(totals) / 1000, 1),
+            'max_ms': round(max(totals) / 1000, 1),
+            'modules': len(median_run),
+            'packages_ms': {
+                package: round(us / 1000, 1)
+                for package, us in sorted(packages.items(), key=lambda item: -item[1])
+            },
+            'deferred_imported': deferred,
+        }
+
+    def _print(self, name, result, top):
+        self.stdout.write(
+            f"{name:7} imports {result['import_ms']:7.1f} ms (min {result['min_ms']:.1f}, max {result['max_ms']:.1f}, "
+            f"budget {result['budget_ms']}), {result['modules']} modules"
+        )
+        for package, ms in list(result['packages_ms'].items())[:top]:
+            self.stdout.write(f"          {package:28} {ms:7.1f} ms")
+        for package, chain in result['deferred_imported'].items():
+            self.stdout.write(self.style.WARNING(f"          {package} imported via {' <- '.join(chain)}"))
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from registry.middleware import brotli
+from registry.models import Application, DocumentType, RegistryBranch, User
+from registry.parsers import FastJSONParser
+from registry.renderers import FastJSONRenderer, orjson
+from registry.serializers import ApplicationSerializer
+from decimal import Decimal
+from io import BytesIO
+import gzip
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JSON encode/parse time and compressed size of application list payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Applications in the payload')
+        parser.add_argument('--repeat', type=int, default=20, help='Timing repetitions (best run is reported)')
+        parser.add_argument('--from-db', action='store_true', help='Serialize real rows instead of synthetic ones')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; FastJSONRenderer falls back to stdlib json'))
+
+        applications = self._applications(options['rows'], options['from_db'])
+        for label, context in (('compact list', {'compact': True}),
+                               ('full list', {'expand': ['user']})):
+            data = ApplicationSerializer(applications, many=True, context=context).data
+            self.stdout.write(f'\n{label}: {len(applications)} applications')
+            self._bench_encode(data, options['repeat'])
+            self._bench_size(FastJSONRenderer().render(data))
+
+    def _applications(self, rows, from_db):
+        if from_db:
+            return list(Application.objects.select_related('user', 'document_type', 'branch')[:rows])
+
+        # Unsaved instances exercise the real serializer without touching the database
+        branch = RegistryBranch(name='Harare Central', address='Corner Fourth Street')
+        document_type = DocumentType(name='Birth Certificate', processing_days=5, fee=Decimal('20.00'))
+        now = timezone.now()
+        applications = []
+        for i in range(rows):
+            user = User(
+                username=f'citizen{i}', email=f'citizen{i}@example.com', full_name=f'Citizen Number {i}',
+                phone_number=f'+2637712{i:05d}', address='12 Example Avenue, Harare', gender='female',
+            )
+            applications.append(Application(
+                user=user, document_type=document_type, branch=branch,
+                reference_number=f'CI-{i:010d}', status='review', created_at=now, updated_at=now,
+            ))
+        return applications
+
+    def _best_of(self, repeat, func):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    def _bench_encode(self, data, repeat):
+        stdlib_body = JSONRenderer().render(data)
+        fast_body = FastJSONRenderer().render(data)
+        encode_stdlib = self._best_of(repeat, lambda: JSONRenderer().render(data))
+        encode_fast = self._best_of(repeat, lambda: FastJSONRenderer().render(data))
+        parse_stdlib = self._best_of(repeat, lambda: JSONParser().parse(BytesIO(stdlib_body)))
+        parse_fast = self._best_of(repeat, lambda: FastJSONParser().parse(BytesIO(fast_body)))
+        self.stdout.write(
+            f'  encode  stdlib {encode_stdlib:8.2f} ms   fast {encode_fast:8.2f} ms   ({encode_stdlib / encode_fast:.1f}x)'
+        )
+        self.stdout.write(
+            f'  parse   stdlib {parse_stdlib:8.2f} ms   fast {parse_fast:8.2f} ms   ({parse_stdlib / parse_fast:.1f}x)'
+        )
+
+    def _bench_size(self, body):
+        raw = len(body)
+        self.stdout.write(f'  raw     {raw:10d} bytes')
+        started = time.perf_counter()
+        gzipped = len(gzip.compress(body, compresslevel=6, mtime=0))
+        gzip_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'  gzip-6  {gzipped:10d} bytes   saved {100 - gzipped / raw * 100:5.1f}%   {gzip_ms:6.2f} ms')
+        if brotli is not None:
+            started = time.perf_counter()
+            brotlied = len(brotli.compress(body, quality=4))
+            br_ms = (time.perf_counter() - started) * 1000
+            self.stdout.write(f'  br-4    {brotlied:10d} bytes   saved {100 - brotlied / raw * 100:5.1f}%   {br_ms:6.2f} ms')
@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from registry.offload import OffloadService, OffloadUnavailable
+from registry.utils import render_qr_png
+from registry.security import SecurityValidator
+import json
+import statistics
+import threading
+import time
+
+# A light request: build and encode a small JSON payload
+PAYLOAD = [{'id': i, 'reference_number': f'AB-{i:010d}', 'status': 'review', 'branch': 'Harare'} for i in range(40)]
+# Leading bytes of a PNG, as the upload handler sniffs them
+PNG_HEAD = render_qr_png('AB-0000000000')[:2048]
+
+HEAVY_TASKS = (
+    ('qr', render_qr_png, 'AB-1234567890'),
+    ('hash', make_password, 'Correct-horse-1'),
+    ('sniff', SecurityValidator.check_file_header, 'label.png', PNG_HEAD),
+)
+
+
+def _light(stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        json.loads(json.dumps(PAYLOAD))
+        latencies.append(time.perf_counter() - started)
+
+
+def _heavy(service, stop, counts, errors):
+    index = 0
+    while not stop.is_set():
+        name, fn, *args = HEAVY_TASKS[index % len(HEAVY_TASKS)]
+        index += 1
+        try:
+            service.run(fn, *args)
+            counts[name] = counts.get(name, 0) + 1
+        except OffloadUnavailable:
+            errors.append(name)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark light-request throughput next to QR, hashing and sniffing work, inline and offloaded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+        parser.add_argument('--light-threads', type=int, default=4, help='Threads serving light requests')
+        parser.add_argument('--heavy-threads', type=int, default=2, help='Threads doing CPU-bound work')
+        parser.add_argument('--workers', type=int, default=settings.OFFLOAD_WORKERS or 1,
+                            help='Pool processes for the offloaded run')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Mixed load: {options['light_threads']} light + {options['heavy_threads']} heavy threads, "
+            f"{options['seconds']}s per run, {options['workers']} pool workers"
+        )
+        for label, workers in (('inline', 0), ('offload', options['workers'])):
+            service = OffloadService(workers=workers)
+            try:
+                if workers:
+                    # Start the workers (and their Django setup) before timing
+                    for _ in range(workers):
+                        service.run(render_qr_png, 'warm-up')
+                self._report(label, self._run(service, options), options['seconds'])
+            finally:
+                service.shutdown()
+
+    def _run(self, service, options):
+        stop = threading.Event()
+        latency_lists = [[] for _ in range(options['light_threads'])]
+        counts = [{} for _ in range(options['heavy_threads'])]
+        errors = []
+        threads = [threading.Thread(target=_light, args=(stop, latencies)) for latencies in latency_lists]
+        threads += [threading.Thread(target=_heavy, args=(service, stop, count, errors)) for count in counts]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        heavy = {}
+        for count in counts:
+            for name, value in count.items():
+                heavy[name] = heavy.get(name, 0) + value
+        return sorted(latency for latencies in latency_lists for latency in latencies), heavy, errors
+
+    def _report(self, label, results, seconds):
+        latencies, heavy, errors = results
+        p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+        heavy_text = '  '.join(f'{name}/s={heavy.get(name, 0) / seconds:7.1f}' for name, *_ in HEAVY_TASKS)
+        self.stdout.write(
+            f"{label:8} light/s={len(latencies) / seconds:9.1f}  "
+            f"p50={statistics.median(latencies) * 1000 if latencies else 0:6.2f}ms  p99={p99 * 1000:7.2f}ms  "
+            f"{heavy_text}  busy/timeouts={len(errors)}"
+        )
@@ -0,0 +1,144 @@
+from django.core.management.base import BaseCommand
+from registry.sqlite import apply_pragmas, get_sqlite_pragmas
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+SCHEMA = '''
+CREATE TABLE bench_application (
+    id char(32) PRIMARY KEY,
+    reference_number varchar(20) UNIQUE,
+    status varchar(20) NOT NULL,
+    created_at datetime NOT NULL
+)
+'''
+
+
+def _connect(path, pragmas):
+    # Match Django's sqlite backend: autocommit with explicit BEGIN, default 5s timeout
+    connection = sqlite3.connect(path, isolation_level=None)
+    if pragmas:
+        apply_pragmas(connection.cursor(), pragmas)
+    return connection
+
+
+def _is_lock_error(exc):
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _writer(path, pragmas, writes, start_event, results):
+    connection = _connect(path, pragmas)
+    committed = errors = 0
+    start_event.wait()
+    for _ in range(writes):
+        try:
+            # Read-then-write, the shape of a serializer validating before saving.
+            # The profile starts transactions the way registry.sqlite_backend does.
+            connection.execute('BEGIN IMMEDIATE' if pragmas else 'BEGIN')
+            connection.execute("SELECT count(*) FROM bench_application WHERE status = 'submitted'").fetchone()
+            connection.execute(
+                'INSERT INTO bench_application VALUES (?, ?, ?, datetime("now"))',
+                (uuid.uuid4().hex, uuid.uuid4().hex[:20], 'submitted'),
+            )
+            connection.execute('COMMIT')
+            committed += 1
+        except sqlite3.OperationalError as exc:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            if not _is_lock_error(exc):
+                raise
+            errors += 1
+    connection.close()
+    results.put(('writer', committed, errors))
+
+
+def _reader(path, pragmas, stop_event, start_event, results):
+    connection = _connect(path, pragmas)
+    reads = errors = 0
+    start_event.wait()
+    while not stop_event.is_set():
+        try:
+            connection.execute('SELECT status, count(*) FROM bench_application GROUP BY status').fetchall()
+            reads += 1
+        except sqlite3.OperationalError as exc:
+            if not _is_lock_error(exc):
+                raise
+            errors += 1
+    connection.close()
+    results.put(('reader', reads, errors))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent SQLite writers with and without the concurrency profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Writer processes')
+        parser.add_argument('--readers', type=int, default=2, help='Reader processes')
+        parser.add_argument('--writes', type=int, default=500, help='Write transactions per writer')
+        parser.add_argument('--seed-rows', type=int, default=50000, help='Rows inserted before the run')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"SQLite contention benchmark: {options['writers']} writers x {options['writes']} writes, "
+            f"{options['readers']} readers, {options['seed_rows']} seed rows"
+        )
+        for label, pragmas in (('default', {}), ('profile', get_sqlite_pragmas())):
+            stats = self._run(pragmas, options)
+            attempts = stats['committed'] + stats['write_errors']
+            error_rate = stats['write_errors'] / attempts * 100 if attempts else 0
+            self.stdout.write(
+                f"{label:8} writes/s={stats['committed'] / stats['elapsed']:9.1f}  "
+                f"committed={stats['committed']:6d}  lock_errors={stats['write_errors']:5d} ({error_rate:5.1f}%)  "
+                f"reads/s={stats['reads'] / stats['elapsed']:9.1f}  read_errors={stats['read_errors']}"
+            )
+
+    def _run(self, pragmas, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            setup = _connect(path, pragmas)
+            setup.execute(SCHEMA)
+            setup.execute('BEGIN')
+            setup.executemany(
+                'INSERT INTO bench_application VALUES (?, ?, ?, datetime("now"))',
+                ((uuid.uuid4().hex, uuid.uuid4().hex[:20], 'review') for _ in range(options['seed_rows'])),
+            )
+            setup.execute('COMMIT')
+            setup.close()
+
+            results = multiprocessing.Queue()
+            start_event = multiprocessing.Event()
+            stop_event = multiprocessing.Event()
+            writers = [
+                multiprocessing.Process(target=_writer, args=(path, pragmas, options['writes'], start_event, results))
+                for _ in range(options['writers'])
+            ]
+            readers = [
+                multiprocessing.Process(target=_reader, args=(path, pragmas, stop_event, start_event, results))
+                for _ in range(options['readers'])
+            ]
+            for process in writers + readers:
+                process.start()
+
+            started = time.perf_counter()
+            start_event.set()
+            for process in writers:
+                process.join()
+            elapsed = time.perf_counter() - started
+            stop_event.set()
+            for process in readers:
+                process.join()
+
+            stats = {'elapsed': elapsed, 'committed': 0, 'write_errors': 0, 'reads': 0, 'read_errors': 0}
+            for _ in writers + readers:
+                kind, count, errors = results.get()
+                if kind == 'writer':
+                    stats['committed'] += count
+                    stats['write_errors'] += errors
+                else:
+                    stats['reads'] += count
+                    stats['read_errors'] += errors
+            return stats
@@ -0,0 +1,321 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+from django.utils import timezone
+from registry import slow_queries
+from registry.status_sms import overdue_status_sms
+from registry.models import (
+    Application, ApplicationStatusEvent, ArchivedApplication, ArchivedAttachment, Attachment, ChangeLogEntry,
+    IdempotencyKey, Notification, PendingStatusSMS, User,
+)
+from datetime import timedelta
+import json
+import os
+import time
+import uuid
+
+ANY_ID = uuid.UUID(int=0)
+
+# The queries behind the busiest endpoints and jobs: (name, queryset, whether the
+# index must also give the order). Ordering a few rows found by a selective
+# lookup is cheap; ordering a page of a large result must not need a sort.
+HOT_QUERIES = (
+    ('track by reference', lambda now: Application.objects.filter(reference_number='AB-0000000000')
+        .only('id', 'status', 'created_at', 'updated_at'), False),
+    ("applicant's applications", lambda now: Application.objects.filter(user_id=ANY_ID).order_by('-created_at'),
+        False),
+    ('branch work queue', lambda now: Application.objects.filter(
+        branch_id=ANY_ID, document_type_id=ANY_ID, status='review').order_by('-created_at'), True),
+    ('applications changelist', lambda now: Application.objects.order_by('-created_at', '-id')[:50], True),
+    ('archive candidates', lambda now: Application.objects.filter(
+        status__in=settings.ARCHIVE_STATUSES, updated_at__lt=now), False),
+    ('archived by reference', lambda now: ArchivedApplication.objects.filter(reference_number='AB-0000000000')
+        .order_by('-archived_at'), False),
+    ("user's notifications", lambda now: Notification.objects.filter(user_id=ANY_ID).order_by('-created_at'), True),
+    ('read notifications to prune', lambda now: Notification.objects.filter(is_read=True, created_at__lt=now), False),
+    ('status history', lambda now: ApplicationStatusEvent.objects.filter(application_id=ANY_ID).order_by('id'), True),
+    ("user's change feed", lambda now: ChangeLogEntry.objects.filter(user_id=ANY_ID, seq__gt=0).order_by('seq'), True),
+    ('user by email', lambda now: User.objects.filter(email='citizen@example.com'), False),
+    ('user by phone', lambda now: User.objects.filter(phone_e164='+263771000000'), False),
+    ('expired idempotency keys', lambda now: IdempotencyKey.objects.filter(expires_at__lt=now), False),
+    ('due status SMS', lambda now: PendingStatusSMS.objects.filter(send_after__lte=now), False),
+)
+
+SORT_PROBLEM = 'sort not served by an index'
+
+# Query plan lines that mean a table scan or a sort the indexes could not avoid
+PLAN_PROBLEMS = {
+    'sqlite': (
+        (lambda line: ' SCAN ' in f' {line} ' and ' USING ' not in line, 'full table scan'),
+        (lambda line: 'USE TEMP B-TREE FOR ORDER BY' in line, SORT_PROBLEM),
+    ),
+    'postgresql': (
+        (lambda line: 'Seq Scan' in line, 'full table scan'),
+        (lambda line: line.lstrip().startswith('Sort') or '->  Sort' in line, SORT_PROBLEM),
+    ),
+}
+
+GROWTH_DAYS = (1, 7, 30)
+DATE_FIELDS = ('created_at', 'date_joined', 'timestamp', 'archived_at')
+MEDIA_DIRS = {
+    'qr_codes': ((Application, 'qr_code'), (ArchivedApplication, 'qr_code')),
+    'attachments': ((Attachment, 'file'), (ArchivedAttachment, 'file')),
+}
+# Share of free pages past which VACUUM is worth scheduling
+FREELIST_WARNING_RATIO = 0.2
+
+
+class Command(BaseCommand):
+    help = 'Report database and media health: table growth, query plans, SQLite storage, slow queries and media files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON, for scheduled runs')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to check')
+        parser.add_argument('--slow-queries', type=int, default=10, help='Slowest recorded queries listed')
+        parser.add_argument('--slow-query-hours', type=float, default=24,
+                            help='Only slow queries recorded in this many past hours are reported')
+        parser.add_argument('--sample', type=int, default=10, help='Example rows or files listed per finding')
+        parser.add_argument('--fail-on-warning', action='store_true', help='Exit with an error if anything is flagged')
+
+    def handle(self, *args, **options):
+        self.alias = options['database']
+        self.sample = options['sample']
+        connection = connections[self.alias]
+        # The counts below are slow by design; keep them out of the slow query log
+        slow_queries.uninstall(connection)
+
+        started = time.perf_counter()
+        self.warnings = []
+        report = {
+            'checked_at': timezone.now().isoformat(timespec='seconds'),
+            'database': self.alias,
+            'vendor': connection.vendor,
+            'tables': self._tables(),
+            'hot_queries': self._hot_queries(connection),
+            'storage': self._storage(connection),
+            'slow_queries': self._slow_queries(options['slow_queries'], options['slow_query_hours']),
+            'media': self._media(),
+            'applications_without_qr': self._applications_without_qr(),
+            'overdue_status_sms': self._overdue_status_sms(),
+        }
+        report['seconds'] = round(time.perf_counter() - started, 2)
+        report['warnings'] = self.warnings
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+        else:
+            self._print(report)
+        if options['fail_on_warning'] and self.warnings:
+            raise CommandError(f'{len(self.warnings)} performance warning(s)')
+
+    def _warn(self, message):
+        self.warnings.append(message)
+
+    def _tables(self):
+        now = timezone.now()
+        tables = []
+        for model in apps.get_app_config('registry').get_models():
+            manager = model._base_manager.using(self.alias)
+            row = {'model': model.__name__, 'table': model._meta.db_table, 'rows': manager.count()}
+            field_names = {field.name for field in model._meta.fields}
+            date_field = next((name for name in DATE_FIELDS if name in field_names), None)
+            if date_field:
+                row['growth_field'] = date_field
+                row['growth'] = {
+                    f'{days}d': manager.filter(**{f'{date_field}__gte': now - timedelta(days=days)}).count()
+                    for days in GROWTH_DAYS
+                }
+            tables.append(row)
+        return sorted(tables, key=lambda row: -row['rows'])
+
+    def _hot_queries(self, connection):
+        checks = PLAN_PROBLEMS.get(connection.vendor)
+        if checks is None:
+            return {'skipped': f'query plans are not checked on {connection.vendor}'}
+        now = timezone.now()
+        results = []
+        for name, build, index_order in HOT_QUERIES:
+            queryset = build(now).using(self.alias)
+            plan = queryset.explain()
+            problems = sorted({
+                problem for line in plan.splitlines() for matches, problem in checks
+                if matches(line) and (index_order or problem != SORT_PROBLEM)
+            })
+            results.append({'query': name, 'problems': problems, 'plan': plan.splitlines()})
+            for problem in problems:
+                self._warn(f'Hot query "{name}": {problem}')
+        return results
+
+    def _storage(self, connection):
+        if connection.vendor != 'sqlite':
+            return {'skipped': f'page statistics are only read on SQLite, not {connection.vendor}'}
+        pragmas = {}
+        with connection.cursor() as cursor:
+            for name in ('page_size', 'page_count', 'freelist_count', 'journal_mode', 'auto_vacuum'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+            try:
+                # dbstat is an optional SQLite build option
+                cursor.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY 2 DESC LIMIT 10')
+                largest = [{'name': name, 'bytes': size} for name, size in cursor.fetchall()]
+            except Exception:
+                largest = None
+
+        database = connection.settings_dict['NAME']
+        storage = {
+            **pragmas,
+            'database_bytes': pragmas['page_size'] * pragmas['page_count'],
+            'free_bytes': pragmas['page_size'] * pragmas['freelist_count'],
+            'freelist_ratio': round(pragmas['freelist_count'] / max(pragmas['page_count'], 1), 3),
+            'wal_bytes': os.path.getsize(f'{database}-wal') if os.path.exists(f'{database}-wal') else 0,
+            'largest': largest,
+        }
+        if storage['freelist_ratio'] > FREELIST_WARNING_RATIO:
+            self._warn(f"{storage['freelist_ratio']:.0%} of the database file is free pages; schedule a VACUUM")
+        return storage
+
+    def _slow_queries(self, limit, hours):
+        since = (timezone.now() - timedelta(hours=hours)).isoformat(timespec='seconds')
+        # Timestamps are ISO 8601 in UTC, so they compare as strings
+        entries = [entry for entry in slow_queries.read_slow_queries() if entry.get('at', '') >= since]
+        if entries:
+            self._warn(f'{len(entries):,} slow queries (>= {settings.SLOW_QUERY_MS:g} ms) in the last {hours:g} hours')
+        return {
+            'threshold_ms': settings.SLOW_QUERY_MS,
+            'hours': hours,
+            'recorded': len(entries),
+            'slowest': slow_queries.slowest(entries, limit),
+        }
+
+    def _media(self):
+        media = {}
+        for directory, references in MEDIA_DIRS.items():
+            # File name -> referenced yet; only the files on disk are held in memory, not every row
+            files = {}
+            root = os.path.join(settings.MEDIA_ROOT, directory)
+            for folder, _, names in os.walk(root):
+                for name in names:
+                    path = os.path.join(folder, name)
+                    files[os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')] = False
+
+            missing = []
+            missing_count = 0
+            for model, field in references:
+                names = (model._base_manager.using(self.alias).exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                         .values_list(field, flat=True).iterator(chunk_size=5000))
+                for name in names:
+                    if name in files:
+                        files[name] = True
+                    else:
+                        missing_count += 1
+                        if len(missing) < self.sample:
+                            missing.append(name)
+
+            orphans = [name for name, referenced in files.items() if not referenced]
+            orphan_bytes = sum(os.path.getsize(os.path.join(settings.MEDIA_ROOT, name)) for name in orphans)
+            media[directory] = {
+                'files': len(files),
+                'missing': missing_count,
+                'missing_examples': missing,
+                'orphaned': len(orphans),
+                'orphaned_bytes': orphan_bytes,
+                'orphaned_examples': orphans[:self.sample],
+            }
+            if missing_count:
+                self._warn(f'{missing_count:,} {directory} files are referenced but missing from MEDIA_ROOT')
+            if orphans:
+                self._warn(f'{len(orphans):,} {directory} files ({orphan_bytes / 2**20:.1f} MB) are not referenced by any row')
+        return media
+
+    def _applications_without_qr(self):
+        queryset = Application.objects.using(self.alias).filter(Q(qr_code='') | Q(qr_code__isnull=True))
+        count = queryset.count()
+        if count:
+            self._warn(f'{count:,} applications have no QR code image')
+        return {
+            'count': count,
+            'examples': list(queryset.order_by().values_list('reference_number', flat=True)[:self.sample]),
+        }
+
+    def _overdue_status_sms(self):
+        queryset = overdue_status_sms().using(self.alias)
+        count = queryset.count()
+        if count:
+            self._warn(f'{count:,} queued status SMS are overdue; is `manage.py send_status_sms --loop` running?')
+        return {
+            'count': count,
+            'oldest': queryset.order_by('send_after').values_list('send_after', flat=True).first(),
+        }
+
+    def _print(self, report):
+        self.stdout.write(f"Performance check of '{report['database']}' ({report['vendor']}), {report['checked_at']}")
+
+        self.stdout.write('\nTables (rows, added in the last ' + ' / '.join(f'{days}d' for days in GROWTH_DAYS) + '):')
+        for row in report['tables']:
+            growth = ' / '.join(f'{count:,}' for count in row.get('growth', {}).values())
+            self.stdout.write(f"  {row['model']:24} {row['rows']:>12,}   {growth}")
+
+        self.stdout.write('\nHot queries:')
+        if 'skipped' in report['hot_queries']:
+            self.stdout.write(f"  skipped: {report['hot_queries']['skipped']}")
+        else:
+            for result in report['hot_queries']:
+                if result['problems']:
+                    self.stdout.write(self.style.WARNING(f"  ⚠️  {result['query']}: {', '.join(result['problems'])}"))
+                    for line in result['plan']:
+                        self.stdout.write(f'        {line}')
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"  ✅ {result['query']}"))
+
+        storage = report['storage']
+        self.stdout.write('\nStorage:')
+        if 'skipped' in storage:
+            self.stdout.write(f"  skipped: {storage['skipped']}")
+        else:
+            self.stdout.write(
+                f"  {storage['database_bytes'] / 2**20:,.1f} MB in {storage['page_count']:,} pages of "
+                f"{storage['page_size']} bytes; {storage['freelist_count']:,} free ({storage['freelist_ratio']:.1%}); "
+                f"journal {storage['journal_mode']}, WAL {storage['wal_bytes'] / 2**20:,.1f} MB"
+            )
+            for table in storage['largest'] or []:
+                self.stdout.write(f"    {table['name']:48} {table['bytes'] / 2**20:9,.1f} MB")
+
+        slow = report['slow_queries']
+        self.stdout.write(
+            f"\nSlow queries (>= {slow['threshold_ms']:g} ms) in the last {slow['hours']:g} hours: {slow['recorded']}"
+        )
+        for query in slow['slowest']:
+            self.stdout.write(
+                f"  max {query['max_ms']:8.1f} ms  avg {query['avg_ms']:8.1f} ms  x{query['count']:<5} {query['sql'][:120]}"
+            )
+
+        self.stdout.write('\nMedia:')
+        for directory, media in report['media'].items():
+            self.stdout.write(
+                f"  {directory + '/':14} {media['files']:,} files, {media['missing']:,} missing, "
+                f"{media['orphaned']:,} orphaned ({media['orphaned_bytes'] / 2**20:,.1f} MB)"
+            )
+            for name in media['missing_examples']:
+                self.stdout.write(f'    missing  {name}')
+            for name in media['orphaned_examples']:
+                self.stdout.write(f'    orphaned {name}')
+
+        without_qr = report['applications_without_qr']
+        self.stdout.write(f"\nApplications without a QR code: {without_qr['count']:,}")
+        for reference in without_qr['examples']:
+            self.stdout.write(f'    {reference}')
+
+        overdue = report['overdue_status_sms']
+        self.stdout.write(f"\nOverdue status SMS: {overdue['count']:,}")
+        if overdue['oldest']:
+            self.stdout.write(f"    oldest due {overdue['oldest'].isoformat(timespec='seconds')}")
+
+        self.stdout.write(f"\nChecked in {report['seconds']} s")
+        if report['warnings']:
+            self.stdout.write(self.style.WARNING(f"{len(report['warnings'])} warning(s):"))
+            for warning in report['warnings']:
+                self.stdout.write(self.style.WARNING(f'  ⚠️  {warning}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ No performance problems found'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from registry.labels import LABELS_PER_PAGE, application_labels, stream_label_sheet
+from registry.models import Application
+import time
+
+
+class Command(BaseCommand):
+    help = 'Write a printable PDF sheet of QR labels for a set of applications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='PDF file to write')
+        parser.add_argument('--reference', nargs='+', default=[], help='Reference numbers to print')
+        parser.add_argument('--status', choices=[choice for choice, _ in Application.STATUS_CHOICES],
+                            help='Print every application in this status')
+        parser.add_argument('--branch', help='With --status, only applications at this branch id')
+        parser.add_argument('--limit', type=int, default=None, help='Print at most this many labels')
+
+    def handle(self, *args, **options):
+        applications = Application.objects.select_related('user', 'document_type', 'branch')
+        if options['reference']:
+            applications = applications.filter(reference_number__in=[ref.upper() for ref in options['reference']])
+        elif options['status']:
+            applications = applications.filter(status=options['status'])
+            if options['branch']:
+                applications = applications.filter(branch_id=options['branch'])
+        else:
+            raise CommandError('Give --reference or --status')
+
+        applications = applications.order_by('branch__name', 'reference_number')
+        if options['limit']:
+            applications = applications[:options['limit']]
+        applications = list(applications)
+        if not applications:
+            raise CommandError('No applications match')
+
+        started = time.perf_counter()
+        with open(options['output'], 'wb') as output:
+            for chunk in stream_label_sheet(application_labels(applications)):
+                output.write(chunk)
+        elapsed = time.perf_counter() - started
+        pages = -(-len(applications) // LABELS_PER_PAGE)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(applications)} labels on {pages} pages to {options['output']} in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from registry.models import ChangeLogEntry
+from datetime import timedelta
+
+
+class Command(BaseCommand):
+    help = 'Delete change log entries older than N days; clients holding older cursors get reset=true'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep entries newer than this many days')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per transaction')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Always keep the newest entry so expired cursors can still be detected
+        newest = ChangeLogEntry.objects.aggregate(seq=Max('seq'))['seq'] or 0
+
+        deleted = 0
+        while True:
+            # Short batches keep the write lock brief for concurrent requests
+            batch = list(
+                ChangeLogEntry.objects.filter(created_at__lt=cutoff, seq__lt=newest)
+                .order_by('seq')
+                .values_list('seq', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            ChangeLogEntry.objects.filter(seq__gte=batch[0], seq__lte=batch[-1]).delete()
+            deleted += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} change log entries older than {options["days"]} days'))
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from registry.models import Notification
+from datetime import timedelta
+import time
+
+SUMMARY_TYPE = 'cleanup_summary'
+
+
+class Command(BaseCommand):
+    help = 'Delete or summarize old read notifications and cap unread notifications per user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help='Remove read notifications older than this many days')
+        parser.add_argument('--max-unread', type=int, default=settings.NOTIFICATION_MAX_UNREAD_PER_USER,
+                            help='Unread notifications kept per user; older ones beyond this are removed')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to give other writers the lock')
+        parser.add_argument('--summarize', action='store_true',
+                            help='Leave each affected user one read notification summarizing what was removed; '
+                                 'these are never pruned')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        self.dry_run = options['dry_run']
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Summaries from earlier runs stay; each user keeps the latest one
+        prunable = Notification.objects.exclude(type=SUMMARY_TYPE)
+        expired = prunable.filter(is_read=True, created_at__lt=cutoff)
+        summaries = {}
+        if options['summarize']:
+            summaries = dict(expired.order_by().values_list('user').annotate(count=Count('id')))
+        read_deleted = self._delete_in_batches(expired.order_by('created_at'))
+
+        unread_deleted = 0
+        over_cap = (
+            prunable.filter(is_read=False).order_by()
+            .values('user').annotate(count=Count('id')).filter(count__gt=options['max_unread'])
+        )
+        for row in over_cap:
+            unread = prunable.filter(user=row['user'], is_read=False).order_by('-created_at')
+            unread_deleted += self._delete_in_batches(unread, keep=options['max_unread'])
+
+        if summaries and not self.dry_run:
+            self._write_summaries(summaries, options['days'])
+
+        verb = 'Would remove' if self.dry_run else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {read_deleted + unread_deleted} notifications: {read_deleted} read older than '
+            f'{options["days"]} days, {unread_deleted} unread over the per-user cap of {options["max_unread"]}'
+        ))
+
+    def _delete_in_batches(self, queryset, keep=0):
+        """Delete the rows of an ordered queryset after its first `keep`, one batch of ids at a time"""
+        if self.dry_run:
+            return queryset[keep:].count()
+
+        deleted = 0
+        while True:
+            # Only one batch of ids is held; the rows deleted before drop out of the next read
+            ids = list(queryset.values_list('id', flat=True)[keep:keep + self.batch_size])
+            if not ids:
+                return deleted
+            # One short transaction per batch keeps the SQLite write lock brief
+            with transaction.atomic():
+                deleted += Notification.objects.filter(id__in=ids).delete()[0]
+            if self.pause:
+                time.sleep(self.pause)
+
+    def _write_summaries(self, summaries, days):
+        # Replaces each user's summary from an earlier run, so they never pile up
+        Notification.objects.filter(type=SUMMARY_TYPE, user__in=list(summaries)).delete()
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                type=SUMMARY_TYPE,
+                title='Older notifications cleared',
+                message=f'{count} read notification{"s" if count != 1 else ""} older than {days} days '
+                        f'were removed. Your applications are unaffected.',
+                is_read=True,
+            )
+            for user_id, count in summaries.items()
+        ], batch_size=self.batch_size)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from registry.queue import renumber_queues
+
+
+class Command(BaseCommand):
+    help = 'Renumber queue positions from scratch, after status changes that bypassed Application.save()'
+
+    def handle(self, *args, **options):
+        numbered = renumber_queues()
+        self.stdout.write(self.style.SUCCESS(f'Numbered {numbered} waiting applications'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from registry.status_sms import send_due_status_sms
+import time
+
+
+class Command(BaseCommand):
+    help = 'Send status SMS whose coalescing window has closed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Messages sent per pass')
+        parser.add_argument('--loop', action='store_true', help='Keep running, checking every --interval seconds')
+        parser.add_argument('--interval', type=float, default=15.0, help='Seconds between passes with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            totals = [0, 0, 0]
+            while True:
+                sent, skipped, failed = send_due_status_sms(limit=options['batch_size'])
+                totals = [totals[0] + sent, totals[1] + skipped, totals[2] + failed]
+                if sent + skipped + failed < options['batch_size']:
+                    break
+
+            if any(totals) or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Sent {totals[0]} status SMS, skipped {totals[1]} with no net change, {totals[2]} failed'
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
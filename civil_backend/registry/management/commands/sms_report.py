@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from registry.models import Application, DocumentType, RegistryBranch, User
+from registry.sms_service import sms_service
+from registry.sms_templates import STATUS_TEXT, TEMPLATES, SegmentBudgetExceeded
+from contextlib import contextmanager
+
+
+class Command(BaseCommand):
+    help = 'Render every SMS template and report encoding, segments and cost against each template budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variant', choices=sorted(TEMPLATES), help='Only report this template variant')
+        parser.add_argument('--from-db', type=int, default=0, metavar='N',
+                            help='Also render the status messages of the N newest applications')
+
+    def handle(self, *args, **options):
+        variants = [options['variant']] if options['variant'] else sorted(TEMPLATES)
+        failures = 0
+        self.stdout.write(f'{"variant":<8} {"template":<22} {"case":<8} {"encoding":<8} {"length":>6} '
+                          f'{"segments":>8} {"budget":>6} {"cost":>8}  dropped')
+        for variant in variants:
+            with self._variant(variant):
+                for case, application in (('typical', self._typical()), ('longest', self._longest())):
+                    for name, render in self._messages(application):
+                        failures += self._report(variant, name, case, render)
+
+        if options['from_db']:
+            failures += self._report_database(variants, options['from_db'])
+        if failures:
+            raise CommandError(f'{failures} message(s) exceed their segment budget')
+
+    @contextmanager
+    def _variant(self, variant):
+        previous = settings.SMS_TEMPLATE_VARIANT
+        settings.SMS_TEMPLATE_VARIANT = variant
+        try:
+            yield
+        finally:
+            settings.SMS_TEMPLATE_VARIANT = previous
+
+    def _messages(self, application):
+        yield 'submission', lambda: sms_service.build_submission_message(application)
+        for status in STATUS_TEXT:
+            yield f'status:{status}', lambda status=status: sms_service.build_status_message(application, status)
+        yield 'welcome', lambda: sms_service.build_welcome_message(application.user)
+
+    def _report(self, variant, name, case, render):
+        try:
+            sms = render()
+        except SegmentBudgetExceeded as e:
+            self.stdout.write(self.style.ERROR(f'{variant:<8} {name:<22} {case:<8} {e}'))
+            return 1
+        template = TEMPLATES[variant][sms.template]
+        self.stdout.write(
+            f'{variant:<8} {name:<22} {case:<8} {sms.encoding:<8} {sms.units:>6} {sms.segments:>8} '
+            f'{template.max_segments:>6} {sms.cost:>8}  {", ".join(sms.dropped) or "-"}'
+        )
+        return 0
+
+    def _report_database(self, variants, count):
+        applications = list(
+            Application.objects.select_related('user', 'document_type', 'branch').order_by('-created_at')[:count]
+        )
+        failures = 0
+        self.stdout.write(f'\n{len(applications)} recent applications, status message for their current status:')
+        for variant in variants:
+            segments = cost = over = 0
+            with self._variant(variant):
+                for application in applications:
+                    try:
+                        sms = sms_service.build_status_message(application, application.status)
+                    except SegmentBudgetExceeded:
+                        over += 1
+                        continue
+                    segments += sms.segments
+                    cost += sms.cost
+            failures += over
+            average = segments / max(len(applications) - over, 1)
+            self.stdout.write(f'{variant:<8} {segments} segments, {average:.2f} per message, cost {cost}, '
+                              f'{over} over budget')
+        return failures
+
+    def _typical(self):
+        branch = RegistryBranch(name='Harare Central', address='Makombe Building, Harare', phone='+263242791371')
+        user = User(full_name='Tendai Moyo', phone_number='+263771234567')
+        return Application(user=user, branch=branch, reference_number='TM-A1B2C3D4E5',
+                           document_type=DocumentType(name='Birth Certificate'))
+
+    def _longest(self):
+        # Longest values the models and clip() limits allow, with characters outside GSM-7
+        reference_length = Application._meta.get_field('reference_number').max_length
+        branch = RegistryBranch(name='Ñ' * 100, address='“Ö”' * 100, phone='+' + '9' * 19)
+        user = User(full_name='Ó' * 100, phone_number='+263771234567')
+        return Application(user=user, branch=branch, reference_number='X' * reference_length,
+                           document_type=DocumentType(name='É' * 100))
@@ -1,10 +1,28 @@
 from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .authentication import CachedJWTAuthentication
 from .security import SecurityHeaders
+from . import db_routers
+from io import BytesIO
+import gzip
 import logging
+import secrets
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
 
 security_logger = logging.getLogger('django.security')
 
+# Most random bytes added to gzip output to blur its length, as in Django's GZipMiddleware
+GZIP_MAX_RANDOM_BYTES = 100
+
 class SecurityMiddleware(MiddlewareMixin):
     """Custom security middleware to add security headers and monitor requests"""
     
@@ -42,3 +60,150 @@ class RequestLoggingMiddleware(MiddlewareMixin):
             )
         
         return None
+
+class PrimaryPinningMiddleware(MiddlewareMixin):
+    """
+    Route a request's reads to the primary when it writes or follows a recent write.
+
+    A write pins its user for DATABASE_REPLICA_PIN_SECONDS, keyed on the user
+    id so the pin holds whichever token or device the next request comes
+    with, and sets a signed pin cookie so anonymous browsers stick too. The
+    user pins live in the default cache, which must be shared by every
+    worker process (see CACHES in settings).
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    PIN_COOKIE = 'primary_pin'
+    PIN_SALT = 'registry.primary-pin'
+
+    @staticmethod
+    def _pin_key(user_id):
+        return f'primary-pin:user:{user_id}'
+
+    def _token_user_id(self, request):
+        # The user a valid bearer token names; a signature check, no database lookup
+        authentication = CachedJWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+        if raw_token is None:
+            return None
+        try:
+            return authentication.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+        except InvalidToken:
+            return None
+
+    def _response_user_id(self, request):
+        user_id = getattr(request, 'primary_pin_user_id', None) or self._token_user_id(request)
+        if user_id is None:
+            # DRF stores the user it authenticated on the request, whatever the scheme
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                user_id = user.pk
+        return user_id
+
+    def process_request(self, request):
+        if not db_routers.replica_configured():
+            return None
+
+        pinned = request.method not in self.SAFE_METHODS or request.get_signed_cookie(
+            self.PIN_COOKIE, default=None, salt=self.PIN_SALT, max_age=settings.DATABASE_REPLICA_PIN_SECONDS
+        ) is not None
+        if not pinned:
+            user_id = self._token_user_id(request)
+            pinned = user_id is not None and cache.get(self._pin_key(user_id)) is not None
+        db_routers._pinned_to_primary.set(pinned)
+        db_routers._wrote_to_primary.set(False)
+        return None
+
+    def process_response(self, request, response):
+        if not db_routers.replica_configured():
+            return response
+
+        if db_routers._wrote_to_primary.get():
+            pin_seconds = settings.DATABASE_REPLICA_PIN_SECONDS
+            user_id = self._response_user_id(request)
+            if user_id is not None:
+                cache.set(self._pin_key(user_id), True, pin_seconds)
+            response.set_signed_cookie(
+                self.PIN_COOKIE, '1', salt=self.PIN_SALT, max_age=pin_seconds,
+                secure=request.is_secure(), httponly=True, samesite='Lax',
+            )
+
+        # Worker threads are reused, so never let one request's pin leak into the next
+        db_routers._pinned_to_primary.set(False)
+        db_routers._wrote_to_primary.set(False)
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Negotiated brotli/gzip compression for text responses above RESPONSE_COMPRESSION_MIN_SIZE.
+
+    Compressed length can leak a secret in the body to an attacker who can
+    get their own text reflected next to it (BREACH). Responses that carry
+    tokens are therefore never compressed: paths in
+    RESPONSE_COMPRESSION_EXCLUDED_PATHS and any response a view marks with
+    `response.compress = False`. Gzip output also gets a random-length file
+    name, as in Django's GZipMiddleware, to blur the length.
+    """
+
+    COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+    def _accepted_encodings(self, request):
+        accepted = set()
+        for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            coding, _, params = part.strip().partition(';')
+            quality = params.strip()
+            if quality.startswith('q='):
+                try:
+                    if float(quality[2:]) <= 0:
+                        continue
+                except ValueError:
+                    continue
+            accepted.add(coding.strip().lower())
+        return accepted
+
+    def _gzip(self, content):
+        # Random-length file name in the gzip header (RFC 1952); decoders ignore it
+        filename = secrets.token_hex(secrets.randbelow(GZIP_MAX_RANDOM_BYTES // 2 + 1)) or None
+        buffer = BytesIO()
+        with gzip.GzipFile(filename=filename, mode='wb', fileobj=buffer, mtime=0,
+                           compresslevel=settings.RESPONSE_COMPRESSION_GZIP_LEVEL) as stream:
+            stream.write(content)
+        return buffer.getvalue()
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not getattr(response, 'compress', True) or request.path.startswith(
+            tuple(settings.RESPONSE_COMPRESSION_EXCLUDED_PATHS)
+        ):
+            return response
+        if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+        if not response.get('Content-Type', '').startswith(self.COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accepted = self._accepted_encodings(request)
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+            compressed = brotli.compress(response.content, quality=settings.RESPONSE_COMPRESSION_BROTLI_QUALITY)
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+            compressed = self._gzip(response.content)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The body bytes changed, so a strong validator no longer applies
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,157 @@
+from django.db import migrations
+
+# Full-text index over applications and the applicant, document type and
+# branch fields staff search by. SQLite triggers keep it in sync with every
+# write path, including bulk updates that bypass model signals.
+#
+# Application ids are UUIDs, so registry_application_fts_doc maps each one to
+# a stable integer docid used as the FTS rowid. Reference and national ID
+# numbers are also indexed without dashes so "AB-12" style fragments match a
+# single selective token.
+
+# Phone numbers are indexed as bare digits plus the national and trunk-prefixed
+# subscriber forms, so "+263 77 123 4567", "0771234567" and "771234" all match
+PHONE_DIGITS = "replace(replace(replace(replace(coalesce(u.phone_number, ''), '+', ''), ' ', ''), '-', ''), '.', '')"
+PHONE_FORMS = (
+    f"CASE WHEN length({PHONE_DIGITS}) > 9 "
+    f"THEN {PHONE_DIGITS} || ' ' || substr({PHONE_DIGITS}, -9) || ' 0' || substr({PHONE_DIGITS}, -9) "
+    f"ELSE {PHONE_DIGITS} END"
+)
+
+DOCUMENT_SELECT = f"""
+    SELECT d.docid,
+           a.reference_number || ' ' || replace(a.reference_number, '-', ''),
+           trim(coalesce(u.full_name, '') || ' ' || u.first_name || ' ' || u.last_name || ' ' || u.username),
+           coalesce(u.national_id_number || ' ' || replace(u.national_id_number, '-', ''), ''),
+           {PHONE_FORMS},
+           u.email,
+           t.name,
+           b.name
+    FROM registry_application a
+    JOIN registry_application_fts_doc d ON d.application_id = a.id
+    JOIN registry_user u ON u.id = a.user_id
+    JOIN registry_documenttype t ON t.id = a.document_type_id
+    JOIN registry_registrybranch b ON b.id = a.branch_id
+"""
+
+FTS_COLUMNS = 'rowid, reference_number, applicant_name, national_id_number, phone_number, email, document_type, branch'
+
+
+def _reindex(where):
+    return f"""
+        DELETE FROM registry_application_fts WHERE rowid IN (
+            SELECT d.docid FROM registry_application a
+            JOIN registry_application_fts_doc d ON d.application_id = a.id
+            WHERE {where}
+        );
+        INSERT INTO registry_application_fts ({FTS_COLUMNS}) {DOCUMENT_SELECT} WHERE {where};
+    """
+
+
+CREATE_SQL = [
+    """
+    CREATE TABLE registry_application_fts_doc (
+        docid INTEGER PRIMARY KEY,
+        application_id char(32) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE registry_application_fts USING fts5(
+        reference_number, applicant_name, national_id_number, phone_number, email, document_type, branch,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+    """,
+    # Reference numbers and IDs outrank names, which outrank document type and branch
+    "INSERT INTO registry_application_fts (registry_application_fts, rank) "
+    "VALUES ('rank', 'bm25(10.0, 5.0, 8.0, 6.0, 4.0, 1.0, 1.0)')",
+    f"""
+    CREATE TRIGGER registry_application_fts_ai AFTER INSERT ON registry_application BEGIN
+        INSERT INTO registry_application_fts_doc (application_id) VALUES (new.id);
+        INSERT INTO registry_application_fts ({FTS_COLUMNS}) {DOCUMENT_SELECT} WHERE a.id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER registry_application_fts_au
+    AFTER UPDATE OF reference_number, user_id, document_type_id, branch_id ON registry_application
+    WHEN old.reference_number IS NOT new.reference_number
+      OR old.user_id IS NOT new.user_id
+      OR old.document_type_id IS NOT new.document_type_id
+      OR old.branch_id IS NOT new.branch_id
+    BEGIN
+        {_reindex('a.id = new.id')}
+    END
+    """,
+    """
+    CREATE TRIGGER registry_application_fts_ad AFTER DELETE ON registry_application BEGIN
+        DELETE FROM registry_application_fts WHERE rowid = (
+            SELECT docid FROM registry_application_fts_doc WHERE application_id = old.id
+        );
+        DELETE FROM registry_application_fts_doc WHERE application_id = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER registry_user_fts_au
+    AFTER UPDATE OF full_name, first_name, last_name, username, national_id_number, phone_number, email
+    ON registry_user
+    WHEN old.full_name IS NOT new.full_name
+      OR old.first_name IS NOT new.first_name
+      OR old.last_name IS NOT new.last_name
+      OR old.username IS NOT new.username
+      OR old.national_id_number IS NOT new.national_id_number
+      OR old.phone_number IS NOT new.phone_number
+      OR old.email IS NOT new.email
+    BEGIN
+        {_reindex('a.user_id = new.id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER registry_documenttype_fts_au AFTER UPDATE OF name ON registry_documenttype
+    WHEN old.name IS NOT new.name
+    BEGIN
+        {_reindex('a.document_type_id = new.id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER registry_registrybranch_fts_au AFTER UPDATE OF name ON registry_registrybranch
+    WHEN old.name IS NOT new.name
+    BEGIN
+        {_reindex('a.branch_id = new.id')}
+    END
+    """,
+    # Backfill existing applications
+    "INSERT INTO registry_application_fts_doc (application_id) SELECT id FROM registry_application",
+    f"INSERT INTO registry_application_fts ({FTS_COLUMNS}) {DOCUMENT_SELECT}",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS registry_registrybranch_fts_au",
+    "DROP TRIGGER IF EXISTS registry_documenttype_fts_au",
+    "DROP TRIGGER IF EXISTS registry_user_fts_au",
+    "DROP TRIGGER IF EXISTS registry_application_fts_ad",
+    "DROP TRIGGER IF EXISTS registry_application_fts_au",
+    "DROP TRIGGER IF EXISTS registry_application_fts_ai",
+    "DROP TABLE IF EXISTS registry_application_fts",
+    "DROP TABLE IF EXISTS registry_application_fts_doc",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite-only; other databases fall back to LIKE filtering in registry.search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0007_alter_user_groups_alter_user_user_permissions'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
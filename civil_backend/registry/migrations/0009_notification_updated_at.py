@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0008_application_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # Existing rows have not changed since they were created
+        migrations.RunSQL(
+            'UPDATE registry_notification SET updated_at = created_at',
+            migrations.RunSQL.noop,
+        ),
+    ]
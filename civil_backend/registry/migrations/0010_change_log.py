@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:21
+
+from django.db import migrations, models
+
+# Every write to applications and notifications appends to the change log,
+# including queryset .update() calls and cascaded deletes that never reach
+# model signals. AUTOINCREMENT guarantees seq is never reused.
+
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _log(model, row, action):
+    return (
+        "INSERT INTO registry_changelogentry (model, object_id, user_id, action, created_at) "
+        f"VALUES ('{model}', {row}.id, {row}.user_id, '{action}', {NOW});"
+    )
+
+
+def _triggers(model, table):
+    return [
+        f"""
+        CREATE TRIGGER {table}_changelog_ai AFTER INSERT ON {table} BEGIN
+            {_log(model, 'new', 'upsert')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER {table}_changelog_au AFTER UPDATE ON {table} BEGIN
+            {_log(model, 'new', 'upsert')}
+        END
+        """,
+        # Moving a row to another owner removes it from the previous owner's feed
+        f"""
+        CREATE TRIGGER {table}_changelog_owner AFTER UPDATE OF user_id ON {table}
+        WHEN old.user_id IS NOT new.user_id
+        BEGIN
+            {_log(model, 'old', 'delete')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER {table}_changelog_ad AFTER DELETE ON {table} BEGIN
+            {_log(model, 'old', 'delete')}
+        END
+        """,
+    ]
+
+
+CREATE_SQL = _triggers('application', 'registry_application') + _triggers('notification', 'registry_notification')
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {table}_changelog_{suffix}'
+    for table in ('registry_application', 'registry_notification')
+    for suffix in ('ai', 'au', 'owner', 'ad')
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0009_notification_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(choices=[('application', 'Application'), ('notification', 'Notification')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('user_id', models.UUIDField(null=True)),
+                ('action', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['seq'],
+                'indexes': [models.Index(fields=['model', 'seq'], name='registry_changelog_model_seq'), models.Index(fields=['user_id', 'seq'], name='registry_changelog_user_seq'), models.Index(fields=['created_at'], name='registry_changelog_created')],
+            },
+        ),
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
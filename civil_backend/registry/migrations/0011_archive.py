@@ -0,0 +1,96 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0010_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedApplication',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('reference_number', models.CharField(blank=True, db_index=True, max_length=20, null=True)),
+                ('qr_code', models.ImageField(blank=True, null=True, upload_to='qr_codes/')),
+                ('status', models.CharField(choices=[('submitted', 'Submitted'), ('review', 'Under Review'), ('approved', 'Approved'), ('printed', 'Printed'), ('ready', 'Ready for Collection'), ('collected', 'Collected'), ('rejected', 'Rejected')], max_length=20)),
+                ('rejection_reason', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAttachment',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('file', models.FileField(upload_to='attachments/')),
+                ('description', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('type', models.CharField(choices=[('status_update', 'Status Update'), ('application_approved', 'Application Approved'), ('application_rejected', 'Application Rejected'), ('application_ready', 'Application Ready for Collection'), ('system', 'System Notification')], default='system', max_length=50)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['status', 'updated_at'], name='registry_app_status_updated'),
+        ),
+        migrations.AddField(
+            model_name='archivednotification',
+            name='application',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='registry.archivedapplication'),
+        ),
+        migrations.AddField(
+            model_name='archivednotification',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedattachment',
+            name='application',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='registry.archivedapplication'),
+        ),
+        migrations.AddField(
+            model_name='archivedapplication',
+            name='branch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='registry.registrybranch'),
+        ),
+        migrations.AddField(
+            model_name='archivedapplication',
+            name='document_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='registry.documenttype'),
+        ),
+        migrations.AddField(
+            model_name='archivedapplication',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_applications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedapplication',
+            index=models.Index(fields=['user', '-created_at'], name='registry_archapp_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedapplication',
+            index=models.Index(fields=['-created_at'], name='registry_archapp_created'),
+        ),
+    ]
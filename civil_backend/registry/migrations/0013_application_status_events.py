@@ -0,0 +1,78 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Status transitions are recorded by triggers so every write path, including
+# queryset .update() calls from bulk status changes, lands in the history.
+
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+COLUMNS = 'application_id, branch_id, document_type_id, from_status, status, timestamp'
+
+CREATE_SQL = [
+    f"""
+    CREATE TRIGGER registry_application_statusevent_ai AFTER INSERT ON registry_application BEGIN
+        INSERT INTO registry_applicationstatusevent ({COLUMNS})
+        VALUES (new.id, new.branch_id, new.document_type_id, NULL, new.status, new.created_at);
+    END
+    """,
+    f"""
+    CREATE TRIGGER registry_application_statusevent_au AFTER UPDATE OF status ON registry_application
+    WHEN old.status IS NOT new.status
+    BEGIN
+        INSERT INTO registry_applicationstatusevent ({COLUMNS})
+        VALUES (new.id, new.branch_id, new.document_type_id, old.status, new.status, {NOW});
+    END
+    """,
+    # Backfill: submission at created_at, then the current status at the last write
+    f"""
+    INSERT INTO registry_applicationstatusevent ({COLUMNS})
+    SELECT id, branch_id, document_type_id, NULL, 'submitted', created_at FROM registry_application
+    """,
+    f"""
+    INSERT INTO registry_applicationstatusevent ({COLUMNS})
+    SELECT id, branch_id, document_type_id, 'submitted', status, updated_at FROM registry_application
+    WHERE status != 'submitted'
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS registry_application_statusevent_au',
+    'DROP TRIGGER IF EXISTS registry_application_statusevent_ai',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0012_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('application_id', models.UUIDField()),
+                ('from_status', models.CharField(blank=True, choices=[('submitted', 'Submitted'), ('review', 'Under Review'), ('approved', 'Approved'), ('printed', 'Printed'), ('ready', 'Ready for Collection'), ('collected', 'Collected'), ('rejected', 'Rejected')], max_length=20, null=True)),
+                ('status', models.CharField(choices=[('submitted', 'Submitted'), ('review', 'Under Review'), ('approved', 'Approved'), ('printed', 'Printed'), ('ready', 'Ready for Collection'), ('collected', 'Collected'), ('rejected', 'Rejected')], max_length=20)),
+                ('timestamp', models.DateTimeField()),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='registry.registrybranch')),
+                ('document_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='registry.documenttype')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'timestamp'], name='registry_statusevent_status_ts'), models.Index(fields=['application_id', 'id'], name='registry_statusevent_app')],
+            },
+        ),
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0013_application_status_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['branch', 'document_type', 'status', 'created_at'], name='registry_app_queue'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0015_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingStatusSMS',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('from_status', models.CharField(choices=[('submitted', 'Submitted'), ('review', 'Under Review'), ('approved', 'Approved'), ('printed', 'Printed'), ('ready', 'Ready for Collection'), ('collected', 'Collected'), ('rejected', 'Rejected')], max_length=20)),
+                ('status', models.CharField(choices=[('submitted', 'Submitted'), ('review', 'Under Review'), ('approved', 'Approved'), ('printed', 'Printed'), ('ready', 'Ready for Collection'), ('collected', 'Collected'), ('rejected', 'Rejected')], max_length=20)),
+                ('changes', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('send_after', models.DateTimeField()),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='registry.application')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['send_after'], name='registry_pendingsms_due')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pendingstatussms',
+            constraint=models.UniqueConstraint(fields=('user', 'application'), name='registry_pendingsms_user_app'),
+        ),
+    ]
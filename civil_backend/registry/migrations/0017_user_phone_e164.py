@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:45
+
+from django.db import migrations, models, transaction
+
+from registry.phone import to_e164
+
+# Each batch commits on its own so the backfill never holds the write lock for long
+BATCH_SIZE = 1000
+
+
+def backfill_phone_e164(apps, schema_editor):
+    User = apps.get_model('registry', 'User')
+    db = schema_editor.connection.alias
+    users = User.objects.using(db).exclude(phone_number__isnull=True).exclude(phone_number='').order_by('pk')
+    last_pk = None
+    while True:
+        batch = users if last_pk is None else users.filter(pk__gt=last_pk)
+        rows = list(batch.only('pk', 'phone_number')[:BATCH_SIZE])
+        if not rows:
+            break
+        for user in rows:
+            user.phone_e164 = to_e164(user.phone_number)
+        with transaction.atomic(using=db):
+            User.objects.using(db).bulk_update(rows, ['phone_e164'])
+        last_pk = rows[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('registry', '0016_pending_status_sms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(backfill_phone_e164, migrations.RunPython.noop),
+    ]
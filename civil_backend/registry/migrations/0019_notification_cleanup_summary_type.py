@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0018_changelist_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivednotification',
+            name='type',
+            field=models.CharField(choices=[('status_update', 'Status Update'), ('application_approved', 'Application Approved'), ('application_rejected', 'Application Rejected'), ('application_ready', 'Application Ready for Collection'), ('system', 'System Notification'), ('cleanup_summary', 'Notifications Cleared')], default='system', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('status_update', 'Status Update'), ('application_approved', 'Application Approved'), ('application_rejected', 'Application Rejected'), ('application_ready', 'Application Ready for Collection'), ('system', 'System Notification'), ('cleanup_summary', 'Notifications Cleared')], default='system', max_length=50),
+        ),
+    ]
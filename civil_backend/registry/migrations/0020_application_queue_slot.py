@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:37
+
+from django.db import migrations, models
+
+from registry.queue import renumber_queues
+
+
+def number_waiting_applications(apps, schema_editor):
+    renumber_queues(apps.get_model('registry', 'Application'), using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0019_notification_cleanup_summary_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='queue_slot',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['branch', 'document_type', 'queue_slot'], name='registry_app_queue_slot'),
+        ),
+        migrations.RunPython(number_waiting_applications, migrations.RunPython.noop),
+    ]
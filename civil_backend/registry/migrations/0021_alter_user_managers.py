@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:39
+
+from django.db import migrations
+import registry.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0020_application_queue_slot'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', registry.models.RegistryUserManager()),
+            ],
+        ),
+    ]
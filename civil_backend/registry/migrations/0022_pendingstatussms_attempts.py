@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0021_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingstatussms',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,7 +1,9 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db import models, transaction
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.utils import timezone
 import uuid
 from . import utils
+from .phone import to_e164
 
 class RegistryBranch(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -16,6 +18,21 @@ class RegistryBranch(models.Model):
     def __str__(self):
         return self.name
 
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # update() sends no post_save, so drop the cached principals here (registry.signals)
+        from .authentication import user_cache
+
+        user_ids = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        user_cache.invalidate_many(user_ids)
+        return updated
+
+
+class RegistryUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     full_name = models.CharField(max_length=100, blank=True, null=True)
@@ -23,6 +40,8 @@ class User(AbstractUser):
     gender = models.CharField(max_length=10, blank=True, null=True)
     national_id_number = models.CharField(max_length=20, unique=True, blank=True, null=True)
     phone_number = models.CharField(max_length=15, blank=True, null=True)
+    # phone_number in E.164, set on save; what SMS is sent to and phone lookups match
+    phone_e164 = models.CharField(max_length=16, blank=True, null=True, editable=False, db_index=True)
     address = models.TextField(blank=True, null=True)
     registry_branch = models.ForeignKey(RegistryBranch, null=True, blank=True, on_delete=models.SET_NULL)
     is_admin = models.BooleanField(default=False)
@@ -48,12 +67,21 @@ class User(AbstractUser):
         related_query_name='registry_user',
     )
 
+    objects = RegistryUserManager()
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
     def __str__(self):
         return f'{self.full_name} ({self.email})'
 
+    def save(self, *args, **kwargs):
+        self.phone_e164 = to_e164(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_e164'}
+        super().save(*args, **kwargs)
+
 class DocumentType(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
@@ -78,6 +106,9 @@ class Application(models.Model):
         ('collected', 'Collected'),
         ('rejected', 'Rejected'),
     ]
+    # Statuses still waiting to be made ready; these hold a place in the branch queue
+    QUEUE_STATUSES = ['submitted', 'review', 'approved', 'printed']
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     document_type = models.ForeignKey(DocumentType, on_delete=models.CASCADE)
@@ -88,22 +119,103 @@ class Application(models.Model):
     rejection_reason = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # 1-based place in the branch and document type queue while the status is in
+    # QUEUE_STATUSES, else None; kept up to date by save() and delete() (registry.queue)
+    queue_slot = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f'Name : {self.user.full_name} | Ref: {self.reference_number} | Status: {self.status}'
 
-    def save(self, *args, **kwargs):
+    # QR code rendered by render_qr_code() and not yet saved
+    _qr_image = None
+
+    def render_qr_code(self):
+        """
+        Assign the reference number and render its QR code ahead of save().
+
+        Rendering may wait seconds for the offload pool, so callers that save
+        inside transaction.atomic() call this first, before the write lock is held.
+        """
         if not self.reference_number:
             user_name = self.user.full_name if self.user.full_name else "NA"
             self.reference_number = utils.generate_reference_number(user_name)
-        super().save(*args, **kwargs)
-        if not self.qr_code and self.reference_number:
-            qr_image = utils.generate_qr_code(self.reference_number)
+        if not self.qr_code and self._qr_image is None:
+            self._qr_image = utils.generate_qr_code(self.reference_number)
+
+    def touch(self):
+        """Bump updated_at after a change to rows this application renders, such as its attachments"""
+        self.updated_at = timezone.now()
+        Application.objects.filter(pk=self.pk).update(updated_at=self.updated_at)
+
+    def _queue_key(self, status, branch_id, document_type_id):
+        return (branch_id, document_type_id) if status in self.QUEUE_STATUSES else None
+
+    def save(self, *args, **kwargs):
+        # Rendered before the row is written, so a busy or timed-out render leaves nothing half-saved
+        self.render_qr_code()
+        qr_image, self._qr_image = self._qr_image, None
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'status', 'branch', 'document_type'} & set(update_fields):
+            super().save(*args, **kwargs)
+        else:
+            self._save_with_queue_slot(*args, **kwargs)
+
+        if qr_image is not None:
             self.qr_code.save(f'{self.reference_number}_qr.png', qr_image, save=False)
             super().save(update_fields=['qr_code'])
 
+    def _save_with_queue_slot(self, *args, **kwargs):
+        from . import queue
+
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Application.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'status', 'branch_id', 'document_type_id', 'queue_slot'
+                ).first()
+            old_key = self._queue_key(*previous[:3]) if previous else None
+            new_key = self._queue_key(self.status, self.branch_id, self.document_type_id)
+            if old_key == new_key:
+                # The slot may have moved up since this instance was loaded; never write a stale one back
+                self.queue_slot = previous[3] if previous else None
+                super().save(*args, **kwargs)
+                return
+
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'queue_slot'}
+            if old_key is not None:
+                queue.leave_queue(*old_key, previous[3])
+            # Joining takes the slot after the last one, read in the same statement that writes it
+            self.queue_slot = queue.next_slot(*new_key) if new_key is not None else None
+            super().save(*args, **kwargs)
+        if new_key is not None:
+            self.refresh_from_db(fields=['queue_slot'])
+
+    def delete(self, *args, **kwargs):
+        from . import queue
+
+        with transaction.atomic():
+            previous = Application.objects.select_for_update().filter(pk=self.pk).values_list(
+                'branch_id', 'document_type_id', 'queue_slot'
+            ).first()
+            result = super().delete(*args, **kwargs)
+            if previous and previous[2] is not None:
+                queue.leave_queue(*previous)
+        return result
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Finds finished applications for archive_applications
+            models.Index(fields=['status', 'updated_at'], name='registry_app_status_updated'),
+            # Ordered queue of one branch and document type (registry.queue)
+            models.Index(fields=['branch', 'document_type', 'status', 'created_at'], name='registry_app_queue'),
+            # Newest-first listings such as the admin changelist, which adds id as a tie-breaker
+            models.Index(fields=['created_at', 'id'], name='registry_app_created'),
+            # Queue positions (registry.queue): the last slot of a queue, and the slots behind a leaver
+            models.Index(fields=['branch', 'document_type', 'queue_slot'], name='registry_app_queue_slot'),
+        ]
 class Attachment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     application = models.ForeignKey(Application, related_name='attachments', on_delete=models.CASCADE)
@@ -120,6 +232,8 @@ class Notification(models.Model):
         ('application_rejected', 'Application Rejected'),
         ('application_ready', 'Application Ready for Collection'),
         ('system', 'System Notification'),
+        # Left by `prune_notifications --summarize`, which never prunes these
+        ('cleanup_summary', 'Notifications Cleared'),
     ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -130,9 +244,209 @@ class Notification(models.Model):
     message = models.TextField()
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-user inbox, newest first
+            models.Index(fields=['user', '-created_at'], name='registry_notif_user_created'),
+            # Retention sweeps in prune_notifications
+            models.Index(fields=['is_read', 'created_at'], name='registry_notif_read_created'),
+            # Newest-first listings such as the admin changelist, which adds id as a tie-breaker
+            models.Index(fields=['created_at', 'id'], name='registry_notif_created'),
+        ]
     
     def __str__(self):
         return f'{self.user.username} - {self.title}'
+
+
+class ApplicationStatusEvent(models.Model):
+    """
+    Append-only history of application status transitions.
+
+    Written by SQLite triggers (migration 0013) on insert and on every status
+    change, so bulk .update() calls are recorded too. application_id is a
+    plain value so the history survives archiving.
+    """
+    id = models.BigAutoField(primary_key=True)
+    application_id = models.UUIDField()
+    branch = models.ForeignKey(RegistryBranch, on_delete=models.CASCADE, related_name='+')
+    document_type = models.ForeignKey(DocumentType, on_delete=models.CASCADE, related_name='+')
+    from_status = models.CharField(max_length=20, choices=Application.STATUS_CHOICES, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=Application.STATUS_CHOICES)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'timestamp'], name='registry_statusevent_status_ts'),
+            models.Index(fields=['application_id', 'id'], name='registry_statusevent_app'),
+        ]
+
+    def __str__(self):
+        return f'{self.application_id}: {self.from_status} -> {self.status} at {self.timestamp}'
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only record of every write to applications and notifications.
+
+    Rows are written by SQLite triggers (migration 0010), so bulk updates and
+    cascaded deletes are captured too. `seq` only ever grows, which makes it
+    the cursor for the delta-sync feed in registry.changes.
+    """
+    ACTION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+    MODEL_CHOICES = [
+        ('application', 'Application'),
+        ('notification', 'Notification'),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.UUIDField()
+    # Owner of the row at the time of the change; kept as a plain value so tombstones outlive the user
+    user_id = models.UUIDField(null=True)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+        indexes = [
+            models.Index(fields=['model', 'seq'], name='registry_changelog_model_seq'),
+            models.Index(fields=['user_id', 'seq'], name='registry_changelog_user_seq'),
+            models.Index(fields=['created_at'], name='registry_changelog_created'),
+        ]
+
+    def __str__(self):
+        return f'#{self.seq} {self.action} {self.model} {self.object_id}'
+
+
+class ArchivedApplication(models.Model):
+    """
+    Finished application moved out of the live table by `archive_applications`.
+
+    Keeps the original id, reference number and timestamps; uploaded files
+    and QR codes stay where they are and are referenced by the same paths.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_applications')
+    document_type = models.ForeignKey(DocumentType, on_delete=models.CASCADE, related_name='+')
+    branch = models.ForeignKey(RegistryBranch, on_delete=models.CASCADE, related_name='+')
+    # Not unique: references are only guaranteed unique among live applications
+    reference_number = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    qr_code = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
+    status = models.CharField(max_length=20, choices=Application.STATUS_CHOICES)
+    rejection_reason = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='registry_archapp_user_created'),
+            models.Index(fields=['-created_at'], name='registry_archapp_created'),
+        ]
+
+    def __str__(self):
+        return f'Archived | Ref: {self.reference_number} | Status: {self.status}'
+
+
+class ArchivedAttachment(models.Model):
+    id = models.UUIDField(primary_key=True, editable=False)
+    application = models.ForeignKey(ArchivedApplication, related_name='attachments', on_delete=models.CASCADE)
+    file = models.FileField(upload_to='attachments/')
+    description = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f'Archived | Ref: {self.application.reference_number}'
+
+
+class ArchivedNotification(models.Model):
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    application = models.ForeignKey(ArchivedApplication, on_delete=models.CASCADE, related_name='notifications')
+    type = models.CharField(max_length=50, choices=Notification.NOTIFICATION_TYPES, default='system')
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'Archived | {self.title}'
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a write sent with an Idempotency-Key header (registry.idempotency).
+
+    A row is claimed before the write runs, with no status code, and filled
+    in with the rendered response afterwards so retries get the same answer
+    without repeating the write. Rows expire after IDEMPOTENCY_KEY_TTL_HOURS
+    and are removed by `prune_idempotency_keys`.
+    """
+    id = models.BigAutoField(primary_key=True)
+    # Key owner: the user's id, or 'anonymous'
+    scope = models.CharField(max_length=40)
+    key = models.CharField(max_length=255)
+    # Hash of method, path and body; a key reused for a different request is refused
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    headers = models.JSONField(default=dict)
+    body = models.BinaryField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='registry_idempotency_scope_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='registry_idempotency_expires'),
+        ]
+
+    def __str__(self):
+        return f'{self.scope}:{self.key} -> {self.status_code or "pending"}'
+
+
+class PendingStatusSMS(models.Model):
+    """
+    Status SMS waiting out its coalescing window (registry.status_sms).
+
+    One row per user and application: further status changes inside the
+    window update `status` instead of queueing another message, and
+    `send_status_sms` sends a single SMS with the latest status once
+    `send_after` has passed, and puts it back with a later `send_after`
+    when the provider fails.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='+')
+    # Status before the first change in the window; no SMS goes out if the application ends up back there
+    from_status = models.CharField(max_length=20, choices=Application.STATUS_CHOICES)
+    status = models.CharField(max_length=20, choices=Application.STATUS_CHOICES)
+    changes = models.PositiveIntegerField(default=1)
+    # Failed sends so far; a failed row is kept and tried again later
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    send_after = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'application'], name='registry_pendingsms_user_app'),
+        ]
+        indexes = [
+            models.Index(fields=['send_after'], name='registry_pendingsms_due'),
+        ]
+
+    def __str__(self):
+        return f'{self.application_id}: {self.from_status} -> {self.status} after {self.send_after}'
@@ -0,0 +1,176 @@
+"""
+Shared process pool for CPU-bound work in the request path.
+
+Pure-Python work such as QR rendering holds the GIL, so while one request
+thread renders, every other thread in the worker waits. Request threads
+hand that work to `offload_service.run()` instead, which blocks only the
+caller until a pool process returns the result.
+
+The pool is bounded: at most OFFLOAD_MAX_PENDING tasks are queued or
+running. A caller that cannot get a slot within
+OFFLOAD_QUEUE_TIMEOUT_SECONDS gets OffloadBusy rather than piling more
+work onto a saturated pool, and a task that runs past its timeout raises
+OffloadTimeout; both render as 503 responses. With OFFLOAD_WORKERS = 0
+tasks run inline in the calling thread.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import threading
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from rest_framework import exceptions, status
+
+logger = logging.getLogger(__name__)
+
+
+class OffloadUnavailable(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy. Please try again shortly.'
+    default_code = 'busy'
+
+
+class OffloadBusy(OffloadUnavailable):
+    """Every pool slot stayed taken for the whole queue timeout"""
+
+
+class OffloadTimeout(OffloadUnavailable):
+    default_detail = 'The server took too long to process the request. Please try again.'
+    default_code = 'timeout'
+
+
+def _init_worker():
+    # Tasks may use Django utilities (password hashers, settings); never the database
+    import django
+    django.setup()
+
+
+def _call_chunk(fn, values):
+    return [fn(value) for value in values]
+
+
+class OffloadService:
+    def __init__(self, workers=None, max_pending=None, queue_timeout=None, task_timeout=None):
+        self.workers = settings.OFFLOAD_WORKERS if workers is None else workers
+        self.max_pending = max_pending or settings.OFFLOAD_MAX_PENDING
+        self.queue_timeout = settings.OFFLOAD_QUEUE_TIMEOUT_SECONDS if queue_timeout is None else queue_timeout
+        self.task_timeout = task_timeout or settings.OFFLOAD_TASK_TIMEOUT_SECONDS
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._counts = {'submitted': 0, 'rejected': 0, 'timed_out': 0, 'broken': 0}
+
+    def _executor(self):
+        # Started on first use, so importing this module never spawns processes
+        with self._lock:
+            if self._pool is None:
+                # Workers come from a clean interpreter rather than a fork of a threaded server
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context, initializer=_init_worker
+                )
+            return self._pool
+
+    def _discard(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                self._counts['broken'] += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+        logger.error('Offload pool broke (a worker died); starting a new one on next use')
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def submit(self, fn, *args):
+        """Queue fn(*args) on the pool; raises OffloadBusy when no slot frees up in time"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('rejected')
+            raise OffloadBusy()
+        pool = self._executor()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard(pool)
+            raise OffloadUnavailable()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._count('submitted')
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def result(self, future, timeout=None):
+        try:
+            return future.result(timeout=timeout or self.task_timeout)
+        except FutureTimeoutError:
+            # A task that already started keeps its slot until it finishes
+            future.cancel()
+            self._count('timed_out')
+            raise OffloadTimeout()
+        except BrokenProcessPool:
+            if self._pool is not None:
+                self._discard(self._pool)
+            raise OffloadUnavailable()
+
+    def run(self, fn, *args, timeout=None):
+        """fn(*args) in a pool process, waiting at most `timeout` (default OFFLOAD_TASK_TIMEOUT_SECONDS)"""
+        if not self.workers:
+            return fn(*args)
+        return self.result(self.submit(fn, *args), timeout)
+
+    def imap(self, fn, values, chunk_size=1, window=None):
+        """
+        Yield fn(value) for each value, in order.
+
+        Values are sent in chunks, with at most `window` chunks in flight,
+        so a long batch neither floods the pool nor holds every result.
+        """
+        values = list(values)
+        if not self.workers:
+            yield from map(fn, values)
+            return
+        window = window or self.workers * 2
+        pending = deque()
+        try:
+            for start in range(0, len(values), chunk_size):
+                pending.append(self.submit(_call_chunk, fn, values[start:start + chunk_size]))
+                if len(pending) >= window:
+                    yield from self.result(pending.popleft())
+            while pending:
+                yield from self.result(pending.popleft())
+        finally:
+            # Also reached when a streamed download is abandoned
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            # BoundedSemaphore keeps its free count in _value
+            'pending': self.max_pending - self._slots._value,
+            **counts,
+        }
+
+
+offload_service = OffloadService()
+
+
+def hash_password(raw_password):
+    """make_password() run in the pool; PBKDF2 keeps a core busy for hundreds of milliseconds"""
+    return offload_service.run(make_password, raw_password)
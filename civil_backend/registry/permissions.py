@@ -0,0 +1,15 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsRegistryAdmin(BasePermission):
+    """
+    Allow access to registry staff.
+
+    Decided from the user's current flags rather than the token claims, which
+    refreshed tokens copy unchanged; CachedJWTAuthentication keeps the user
+    lookup off the database.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.is_admin or user.is_staff))
@@ -0,0 +1,46 @@
+import re
+
+# Numbers without a country code are Zimbabwean
+DEFAULT_COUNTRY_CODE = '263'
+# E.164 allows up to 15 digits; anything under 10 cannot be a reachable mobile number here
+MIN_DIGITS = 10
+MAX_DIGITS = 15
+
+_E164_RE = re.compile(r'^\+[1-9]\d{%d,%d}$' % (MIN_DIGITS - 1, MAX_DIGITS - 1))
+_SEPARATORS_RE = re.compile(r'[\s\-().]')
+
+
+def to_e164(phone_number):
+    """
+    Normalize a phone number to E.164 (+263771234567), or None if it cannot be one.
+
+    Accepts +263 77 123 4567, 00263771234567, 263771234567, 0771234567 and
+    771234567; spaces, dashes, dots and brackets are ignored.
+    """
+    if not phone_number:
+        return None
+    value = str(phone_number).strip()
+    if _E164_RE.match(value):
+        return value
+
+    normalized = e164_prefix(value)
+    return normalized if normalized and _E164_RE.match(normalized) else None
+
+
+def e164_prefix(phone_number):
+    """
+    The E.164 form of a number typed so far, of any length (0771 -> +263771),
+    or None if it is not a phone number at all. For prefix searches.
+    """
+    value = _SEPARATORS_RE.sub('', str(phone_number).strip())
+    if value.startswith('+'):
+        digits = value[1:]
+    elif value.startswith('00'):
+        digits = value[2:]
+    elif value.startswith('0'):
+        digits = DEFAULT_COUNTRY_CODE + value[1:]
+    elif value.startswith(DEFAULT_COUNTRY_CODE):
+        digits = value
+    else:
+        digits = DEFAULT_COUNTRY_CODE + value
+    return '+' + digits if digits.isascii() and digits.isdigit() else None
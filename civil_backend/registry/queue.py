@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+from django.db.models import F, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .db_routers import read_db
+from .models import Application
+
+
+def queue_positions(applications):
+    """
+    Map application id -> (queue position, processing days) for waiting applications.
+
+    A queue is the open applications of one branch and document type in the
+    order they joined it. Each waiting application keeps its place in
+    `Application.queue_slot`, maintained on writes (`next_slot`,
+    `leave_queue`), so reading positions is one primary-key lookup per
+    application whatever the queue length.
+    """
+    waiting = [application.pk for application in applications if application.status in Application.QUEUE_STATUSES]
+    if not waiting:
+        return {}
+
+    rows = Application.objects.using(read_db()).filter(
+        pk__in=waiting, status__in=Application.QUEUE_STATUSES, queue_slot__isnull=False
+    ).values_list('pk', 'queue_slot', 'document_type__processing_days')
+    return {pk: (slot, processing_days) for pk, slot, processing_days in rows}
+
+
+def next_slot(branch_id, document_type_id):
+    """Expression for the slot after the last one in a queue, found through the (branch, document_type, queue_slot) index"""
+    last = Application.objects.filter(
+        branch_id=branch_id, document_type_id=document_type_id, queue_slot__isnull=False
+    ).order_by('-queue_slot').values('queue_slot')[:1]
+    return Coalesce(Subquery(last), 0) + 1
+
+
+def leave_queue(branch_id, document_type_id, slot):
+    """Move everyone behind `slot` up one place; writes only the applications behind it"""
+    Application.objects.filter(
+        branch_id=branch_id, document_type_id=document_type_id, queue_slot__gt=slot
+    ).update(queue_slot=F('queue_slot') - 1)
+
+
+def renumber_queues(model=Application, using='default', batch_size=500):
+    """
+    Number every queue from scratch in submission order; returns the waiting applications numbered.
+
+    For the migration that added queue_slot and `manage.py renumber_queues`
+    after writes that bypass Application.save(), such as QuerySet.update().
+    """
+    applications = model.objects.using(using)
+    applications.exclude(status__in=Application.QUEUE_STATUSES).exclude(queue_slot=None).update(queue_slot=None)
+    waiting = applications.filter(status__in=Application.QUEUE_STATUSES).order_by(
+        'branch_id', 'document_type_id', 'created_at', 'id'
+    ).only('id', 'branch_id', 'document_type_id', 'queue_slot')
+    changed, numbered, queue, slot = [], 0, None, 0
+    for application in waiting.iterator(chunk_size=batch_size):
+        key = (application.branch_id, application.document_type_id)
+        slot = slot + 1 if key == queue else 1
+        queue = key
+        numbered += 1
+        if application.queue_slot != slot:
+            application.queue_slot = slot
+            changed.append(application)
+    applications.bulk_update(changed, ['queue_slot'], batch_size=batch_size)
+    return numbered
+
+
+def estimated_ready_date(application, processing_days):
+    """Submission date plus the document type's processing days, never earlier than today"""
+    estimate = timezone.localdate(application.created_at) + timedelta(days=processing_days)
+    return max(estimate, timezone.localdate())
+
+
+def queue_details(application, positions):
+    """`queue_position` / `estimated_ready_date` for an application, None when it is not waiting"""
+    if application.pk not in positions:
+        return {'queue_position': None, 'estimated_ready_date': None}
+    position, processing_days = positions[application.pk]
+    return {'queue_position': position, 'estimated_ready_date': estimated_ready_date(application, processing_days)}
@@ -0,0 +1,86 @@
+import re
+import uuid
+
+from django.db import connections
+from django.db.models import Q
+
+from .db_routers import read_db
+from .models import Application
+
+MAX_QUERY_TERMS = 8
+
+# Only the newest matches are ranked, which bounds the cost of broad terms
+# such as a branch or document type name that match most of the table
+RANK_CANDIDATES = 2000
+
+_TERM_RE = re.compile(r'\w+(?:-\w+)*', re.UNICODE)
+
+
+def build_match_query(text):
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word is quoted so FTS syntax typed by the user is never interpreted.
+    Dashed fragments are joined to match the compact reference and national ID
+    tokens, and the last term is a prefix so "AB-12" finds "AB-12XYZ...".
+    """
+    terms = [f'"{term.replace("-", "")}"' for term in _TERM_RE.findall(text or '')[:MAX_QUERY_TERMS]]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_application_ids(text, limit, offset=0):
+    """
+    Return (ids, has_next) for the best-ranked applications matching `text`.
+
+    Uses the FTS5 index from migration 0008; fetching one extra row answers
+    "is there a next page" without counting every match.
+    """
+    match = build_match_query(text)
+    if not match:
+        return [], False
+
+    connection = connections[read_db()]
+    if connection.vendor != 'sqlite':
+        return _fallback_search_ids(connection.alias, text, limit, offset)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT d.application_id
+            FROM (
+                SELECT rowid, rank FROM registry_application_fts
+                WHERE registry_application_fts MATCH %s
+                ORDER BY rowid DESC
+                LIMIT %s
+            ) f
+            JOIN registry_application_fts_doc d ON d.docid = f.rowid
+            ORDER BY f.rank
+            LIMIT %s OFFSET %s
+            """,
+            [match, max(RANK_CANDIDATES, offset + limit + 1), limit + 1, offset],
+        )
+        ids = [uuid.UUID(row[0]) for row in cursor.fetchall()]
+    return ids[:limit], len(ids) > limit
+
+
+def _fallback_search_ids(alias, text, limit, offset):
+    query = Q()
+    for term in _TERM_RE.findall(text)[:MAX_QUERY_TERMS]:
+        query &= (
+            Q(reference_number__icontains=term)
+            | Q(user__full_name__icontains=term)
+            | Q(user__username__icontains=term)
+            | Q(user__national_id_number__icontains=term)
+            | Q(user__phone_number__icontains=term)
+            | Q(user__email__icontains=term)
+            | Q(document_type__name__icontains=term)
+            | Q(branch__name__icontains=term)
+        )
+    ids = list(
+        Application.objects.using(alias).filter(query)
+        .order_by('-created_at')
+        .values_list('id', flat=True)[offset:offset + limit + 1]
+    )
+    return ids[:limit], len(ids) > limit
@@ -1,9 +1,10 @@
 import os
-import magic
 from django.core.exceptions import ValidationError
 from django.conf import settings
 import hashlib
 import uuid
+from .filetypes import HEAD_SIZE, StructureCheck, detect_mime_type
+from .phone import to_e164
 
 class SecurityValidator:
     """Security validation utilities for file uploads and data"""
@@ -31,21 +32,34 @@ class SecurityValidator:
         if file.size > cls.MAX_FILE_SIZE:
             raise ValidationError(f"File too large. Maximum size: {cls.MAX_FILE_SIZE / (1024*1024):.1f}MB")
         
-        # Get file MIME type
         file.seek(0)
-        mime_type = magic.from_buffer(file.read(1024), mime=True)
+        mime_type = cls.check_file_header(file.name, file.read(HEAD_SIZE))
         file.seek(0)
+        structure = StructureCheck()
+        for chunk in file.chunks():
+            structure.feed(chunk)
+        file.seek(0)
+        problem = structure.problem(mime_type)
+        if problem:
+            raise ValidationError(problem)
+        
+        return True
+    
+    @classmethod
+    def check_file_header(cls, file_name, head):
+        """Check a file's leading bytes and extension against the allowed types; returns the MIME type"""
+        mime_type = detect_mime_type(head)
         
         # Check if MIME type is allowed
         if mime_type not in cls.ALLOWED_FILE_TYPES:
             raise ValidationError(f"File type not allowed. Allowed types: {list(cls.ALLOWED_FILE_TYPES.keys())}")
         
         # Check file extension
-        file_extension = os.path.splitext(file.name)[1].lower()
+        file_extension = os.path.splitext(file_name)[1].lower()
         if file_extension not in cls.ALLOWED_FILE_TYPES[mime_type]:
             raise ValidationError(f"File extension {file_extension} does not match file type")
         
-        return True
+        return mime_type
     
     @classmethod
     def generate_secure_filename(cls, original_filename):
@@ -75,18 +89,8 @@ class SecurityValidator:
     
     @classmethod
     def validate_phone_number(cls, phone_number):
-        """Validate phone number format"""
-        if not phone_number:
-            return False
-        
-        # Remove all non-digit characters except +
-        cleaned = ''.join(c for c in phone_number if c.isdigit() or c == '+')
-        
-        # Check if it starts with + and has 10-15 digits
-        if cleaned.startswith('+') and 10 <= len(cleaned[1:]) <= 15:
-            return True
-        
-        return False
+        """Validate phone number format; same rules as the E.164 normalization used for storage and SMS"""
+        return to_e164(phone_number) is not None
     
     @classmethod
     def validate_email(cls, email):
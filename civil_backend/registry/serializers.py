@@ -1,13 +1,80 @@
 from rest_framework import serializers
 from .models import User, DocumentType, Application, Attachment, RegistryBranch, Notification
+from .models import ArchivedApplication, ArchivedAttachment, ApplicationStatusEvent
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .authentication import RegistryRefreshToken
+from .queue import queue_details
+from .phone import to_e164
+from .offload import hash_password
 
-class UserSerializer(serializers.ModelSerializer):
+
+class SparseFieldsetMixin:
+    """
+    Trim a read representation using the serializer context.
+
+    - context['fields']: only render these fields (`?fields=`); unknown names are a ValidationError
+    - context['expand']: swap in the richer fields from Meta.expandable_fields (`?expand=`)
+    - context['compact']: render Meta.compact_fields, the default list representation
+
+    get_queryset_columns() reports the model columns the remaining fields
+    need so the view can load just those with .only().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = set(self.context.get('expand') or ())
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in expand & set(expandable):
+            self.fields[name] = expandable[name]()
+
+        requested = self.context.get('fields')
+        if requested:
+            keep = set(requested)
+            unknown = sorted(keep - set(self.fields) - set(expandable))
+            if unknown:
+                raise serializers.ValidationError({'fields': [f'Unknown field(s): {", ".join(unknown)}.']})
+        elif self.context.get('compact') and hasattr(self.Meta, 'compact_fields'):
+            keep = set(self.Meta.compact_fields) | (expand & set(expandable))
+        else:
+            return
+
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+    def get_queryset_columns(self):
+        """`.only()` paths needed to render the selected fields"""
+        columns = {'id'}
+        field_sources = getattr(self.Meta, 'field_sources', {})
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in field_sources:
+                columns.update(field_sources[name])
+            elif isinstance(field, serializers.ListSerializer):
+                # Reverse relations are prefetched separately
+                continue
+            elif isinstance(field, SparseFieldsetMixin):
+                columns.add(field.source)
+                columns.update(f'{field.source}__{column}' for column in field.get_queryset_columns())
+            elif isinstance(field, serializers.BaseSerializer):
+                columns.add(field.source)
+                columns.update(f'{field.source}__{child.source}' for child in field.fields.values()
+                               if not child.write_only and child.source != '*')
+            elif field.source != '*':
+                parts = field.source.split('.')
+                columns.update('__'.join(parts[:i]) for i in range(1, len(parts) + 1))
+        return columns
+
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ['id', 'username', 'full_name', 'email', 'phone_number', 'is_admin', 'password', 'first_name', 'last_name', 'date_of_birth', 'gender', 'address', 'sms_notifications_enabled']
+        compact_fields = ['id', 'username', 'full_name', 'email', 'phone_number', 'is_admin', 'first_name', 'last_name']
+        field_sources = {'full_name': ['full_name', 'first_name', 'last_name']}
         extra_kwargs = {
             'password': {'write_only': True},
             'email': {'required': True, 'allow_blank': False},
@@ -20,6 +87,12 @@ class UserSerializer(serializers.ModelSerializer):
             return obj.full_name
         return f"{obj.first_name} {obj.last_name}".strip()
 
+    def validate_phone_number(self, value):
+        # Stored as entered, but it must normalize to E.164 so SMS can reach it
+        if value and to_e164(value) is None:
+            raise serializers.ValidationError("Enter a valid phone number, e.g. +263771234567 or 0771234567.")
+        return value
+
     def validate_password(self, value):
         """Validate password contains both letters and numbers"""
         if value:
@@ -42,8 +115,9 @@ class UserSerializer(serializers.ModelSerializer):
         # Extract password and other fields
         password = validated_data.pop('password', None)
         
-        # Create the user with specific fields only
+        # Create the user with specific fields only; the hash is computed in the offload pool
         user = User.objects.create(
+            password=hash_password(password) if password else '',
             username=validated_data['username'],
             email=validated_data['email'],
             full_name=validated_data.get('full_name', ''),
@@ -55,11 +129,6 @@ class UserSerializer(serializers.ModelSerializer):
             address=validated_data.get('address', ''),
             sms_notifications_enabled=validated_data.get('sms_notifications_enabled', True)
         )
-        
-        # Set password after user creation
-        if password:
-            user.set_password(password)
-            user.save()
 
         return user
     
@@ -67,8 +136,8 @@ class UserSerializer(serializers.ModelSerializer):
         # Handle password if provided
         password = validated_data.get('password')
         if password:
-            # Set password
-            instance.set_password(password)
+            # Set password (hashed in the offload pool)
+            instance.password = hash_password(password)
             validated_data.pop('password', None)
         
         # Update other fields
@@ -119,8 +188,23 @@ class RegistryBranchFlexibleField(serializers.PrimaryKeyRelatedField):
                 raise serializers.ValidationError("Invalid branch.")
 
 
-class ApplicationSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class UserSummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Applicant details embedded in application payloads; ?expand=user gives the full profile"""
+    full_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'full_name', 'email', 'phone_number']
+        field_sources = {'full_name': ['full_name', 'first_name', 'last_name']}
+
+    def get_full_name(self, obj):
+        if obj.full_name:
+            return obj.full_name
+        return f"{obj.first_name} {obj.last_name}".strip()
+
+
+class ApplicationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    user = UserSummarySerializer(read_only=True)
     document_type = DocumentTypeFlexibleField(queryset=DocumentType.objects.all())
     branch = RegistryBranchFlexibleField(queryset=RegistryBranch.objects.all())
     attachments = AttachmentSerializer(many=True, read_only=True)
@@ -129,6 +213,21 @@ class ApplicationSerializer(serializers.ModelSerializer):
     document_type_name = serializers.CharField(source='document_type.name', read_only=True)
     branch_name = serializers.CharField(source='branch.name', read_only=True)
     applicant_name = serializers.SerializerMethodField()
+    queue_position = serializers.SerializerMethodField()
+    estimated_ready_date = serializers.SerializerMethodField()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only views that looked up queue positions (context['queue_positions']) render them
+        if 'queue_positions' not in self.context:
+            self.fields.pop('queue_position', None)
+            self.fields.pop('estimated_ready_date', None)
+
+    def get_queue_position(self, obj):
+        return queue_details(obj, self.context['queue_positions'])['queue_position']
+
+    def get_estimated_ready_date(self, obj):
+        return queue_details(obj, self.context['queue_positions'])['estimated_ready_date']
     
     def get_applicant_name(self, obj):
         if obj.user.full_name:
@@ -146,13 +245,36 @@ class ApplicationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Application
-        fields = '__all__'
+        # queue_slot is rendered as queue_position, for views that look positions up
+        exclude = ['queue_slot']
+        compact_fields = [
+            'id', 'reference_number', 'status', 'rejection_reason', 'qr_code', 'created_at', 'updated_at',
+            'user', 'document_type', 'document_type_name', 'branch', 'branch_name', 'applicant_name',
+            'queue_position', 'estimated_ready_date',
+        ]
+        expandable_fields = {
+            'user': lambda: UserSerializer(read_only=True),
+            'attachments': lambda: AttachmentSerializer(many=True, read_only=True),
+        }
+        field_sources = {
+            'applicant_name': ['user', 'user__full_name', 'user__username', 'user__first_name', 'user__last_name'],
+            'queue_position': ['status'],
+            'estimated_ready_date': ['status', 'created_at'],
+        }
 
 class ApplicationStatusSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     branch = RegistryBranchSerializer(read_only=True)
     document_type = DocumentTypeSerializer(read_only=True)
     attachments = AttachmentSerializer(many=True, read_only=True)
+    queue_position = serializers.SerializerMethodField()
+    estimated_ready_date = serializers.SerializerMethodField()
+
+    def get_queue_position(self, obj):
+        return queue_details(obj, self.context.get('queue_positions', {}))['queue_position']
+
+    def get_estimated_ready_date(self, obj):
+        return queue_details(obj, self.context.get('queue_positions', {}))['estimated_ready_date']
 
     class Meta:
         model = Application
@@ -167,10 +289,54 @@ class ApplicationStatusSerializer(serializers.ModelSerializer):
             "updated_at",
             "qr_code",
             "attachments",
+            "queue_position",
+            "estimated_ready_date",
         ]
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class ArchivedAttachmentSerializer(serializers.ModelSerializer):
+    full_name = serializers.CharField(source='application.user.full_name', read_only=True)
+    reference_number = serializers.CharField(source='application.reference_number', read_only=True)
+
+    class Meta:
+        model = ArchivedAttachment
+        fields = '__all__'
+
+
+class ArchivedApplicationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    user = UserSummarySerializer(read_only=True)
+    document_type_name = serializers.CharField(source='document_type.name', read_only=True)
+    branch_name = serializers.CharField(source='branch.name', read_only=True)
+    attachments = ArchivedAttachmentSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedApplication
+        fields = [
+            'id', 'reference_number', 'status', 'rejection_reason', 'qr_code', 'created_at', 'updated_at',
+            'archived_at', 'user', 'document_type', 'document_type_name', 'branch', 'branch_name', 'attachments',
+        ]
+        compact_fields = [name for name in fields if name != 'attachments']
+        expandable_fields = {
+            'attachments': lambda: ArchivedAttachmentSerializer(many=True, read_only=True),
+        }
+
+
+class ArchivedApplicationStatusSerializer(ApplicationStatusSerializer):
+    """track_by_reference payload for an archived application"""
+    attachments = ArchivedAttachmentSerializer(many=True, read_only=True)
+
+    class Meta(ApplicationStatusSerializer.Meta):
+        model = ArchivedApplication
+        fields = ApplicationStatusSerializer.Meta.fields + ['archived_at']
+
+
+class ApplicationStatusEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ApplicationStatusEvent
+        fields = ['from_status', 'status', 'timestamp', 'branch', 'document_type']
+
+
+class NotificationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     application_reference = serializers.CharField(source='application.reference_number', read_only=True)
     
     class Meta:
@@ -179,6 +345,8 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RegistryRefreshToken
+
     def validate(self, attrs):
         data = super().validate(attrs)
         data['username'] = self.user.username
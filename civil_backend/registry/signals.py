@@ -0,0 +1,20 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import slow_queries
+from .authentication import user_cache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the cached principal whenever the user row changes"""
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(connection_created)
+def record_slow_queries(sender, connection, **kwargs):
+    """Log slow queries on every database alias, whichever backend serves it"""
+    slow_queries.install(connection)
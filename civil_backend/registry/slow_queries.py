@@ -0,0 +1,94 @@
+"""
+Slow query log.
+
+`SlowQueryRecorder` is installed as an execute wrapper on every database
+connection, whatever its alias or backend (registry.signals), and writes
+each query that takes SLOW_QUERY_MS or longer to the `registry.slow_queries`
+logger as one JSON line: the SQL with its placeholders, never the
+parameters. `manage.py perf_check` reads the log back with
+`read_slow_queries`.
+"""
+from django.conf import settings
+from django.utils import timezone
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger('registry.slow_queries')
+
+# Most of the log read back, from its end
+READ_LIMIT_BYTES = 8 * 1024 * 1024
+
+
+class SlowQueryRecorder:
+    def __init__(self, alias, threshold_ms):
+        self.alias = alias
+        self.threshold_ms = threshold_ms
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= self.threshold_ms:
+                logger.warning(json.dumps({
+                    'at': timezone.now().isoformat(timespec='seconds'),
+                    'alias': self.alias,
+                    'ms': round(duration_ms, 1),
+                    'many': many,
+                    'sql': sql,
+                }))
+
+
+def install(connection):
+    """Add the recorder to a connection's execute wrappers unless SLOW_QUERY_MS is 0 or it is there already"""
+    if settings.SLOW_QUERY_MS <= 0 or getattr(connection, 'slow_queries_off', False):
+        return
+    if not any(isinstance(wrapper, SlowQueryRecorder) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryRecorder(connection.alias, settings.SLOW_QUERY_MS))
+
+
+def uninstall(connection):
+    """Remove the recorder, and keep it off when the connection reconnects"""
+    connection.slow_queries_off = True
+    connection.execute_wrappers[:] = [
+        wrapper for wrapper in connection.execute_wrappers if not isinstance(wrapper, SlowQueryRecorder)
+    ]
+
+
+def read_slow_queries(path=None):
+    """Recorded slow queries, oldest first, from the log and its rotated copy"""
+    path = path or settings.SLOW_QUERY_LOG
+    entries = []
+    for name in (f'{path}.1', path):
+        if not os.path.exists(name):
+            continue
+        with open(name, 'rb') as log:
+            log.seek(max(os.path.getsize(name) - READ_LIMIT_BYTES, 0))
+            for line in log:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # The first line is partial after a seek; a crash can leave one half-written
+                    continue
+    return entries
+
+
+def slowest(entries, limit=10):
+    """Recorded queries grouped by SQL text, slowest first"""
+    grouped = {}
+    for entry in entries:
+        group = grouped.setdefault(entry['sql'], {
+            'sql': entry['sql'], 'alias': entry.get('alias'), 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'last_at': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['last_at'] = entry.get('at')
+    for group in grouped.values():
+        group['avg_ms'] = round(group['total_ms'] / group['count'], 1)
+        group['total_ms'] = round(group['total_ms'], 1)
+    return sorted(grouped.values(), key=lambda group: -group['max_ms'])[:limit]
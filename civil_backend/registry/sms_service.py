@@ -1,10 +1,32 @@
 import os
-from twilio.rest import Client
+import random
+import threading
+import time
+import weakref
+from decimal import Decimal
 from django.conf import settings
+from django.utils.functional import cached_property
+import asyncio
 import logging
+from .circuit_breaker import CircuitBreaker
+from .phone import to_e164
+from .sms_templates import (
+    STATUS_FALLBACK, STATUS_TEXT, RenderedSMS, SegmentBudgetExceeded, clip, get_template, labelled,
+)
 
 logger = logging.getLogger(__name__)
 
+TWILIO_API_BASE_URL = 'https://api.twilio.com'
+
+
+class SMSProviderError(Exception):
+    """Error response from the Messages API; `status` decides whether it is retried"""
+
+    def __init__(self, status, message):
+        super().__init__(f'HTTP {status}: {message}')
+        self.status = status
+
+
 class SMSService:
     def __init__(self):
         # Twilio credentials - these should be set in environment variables or Django settings
@@ -12,24 +34,140 @@ class SMSService:
         self.auth_token = getattr(settings, 'TWILIO_AUTH_TOKEN', os.environ.get('TWILIO_AUTH_TOKEN'))
         self.from_number = getattr(settings, 'TWILIO_PHONE_NUMBER', os.environ.get('TWILIO_PHONE_NUMBER'))
         
-        # Initialize Twilio client if credentials are available
-        if self.account_sid and self.auth_token:
-            self.client = Client(self.account_sid, self.auth_token)
-        else:
-            self.client = None
+        self.api_base_url = getattr(settings, 'TWILIO_API_BASE_URL', None) or TWILIO_API_BASE_URL
+        
+        # A slow or failing provider must not hold request threads (see send_sms)
+        self.timeout = settings.SMS_TIMEOUT_SECONDS
+        # Retries are only made by background senders that pass retries=max_retries
+        self.max_retries = settings.SMS_MAX_RETRIES
+        self.backoff_base = settings.SMS_RETRY_BACKOFF_SECONDS
+        self.backoff_cap = settings.SMS_RETRY_BACKOFF_MAX_SECONDS
+        self.breaker = CircuitBreaker(
+            'sms',
+            failure_threshold=settings.SMS_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.SMS_CIRCUIT_RESET_SECONDS,
+        )
+        
+        # One aiohttp session per event loop for the async senders
+        self._sessions = weakref.WeakKeyDictionary()
+
+        # Running totals of what has been sent, per template (see metrics())
+        self._totals = {}
+        self._totals_lock = threading.Lock()
+
+    @cached_property
+    def client(self):
+        """
+        Twilio REST client, None without credentials.
+
+        Built on first use rather than at import: the twilio package and the
+        client are only needed by processes that actually send SMS, not by
+        every manage.py command and worker that imports the views.
+        """
+        if not (self.account_sid and self.auth_token):
             logger.warning("Twilio credentials not configured. SMS notifications will be disabled.")
+            return None
+
+        from twilio.http.http_client import TwilioHttpClient
+        from twilio.rest import Client
 
-    def send_sms(self, to_phone, message):
+        client = Client(self.account_sid, self.auth_token, http_client=TwilioHttpClient(timeout=self.timeout))
+        client.api.base_url = self.api_base_url
+        return client
+
+    def send_sms(self, to_phone, message, retries=0):
         """
         Send SMS message to a phone number
         
+        Each attempt is bounded by SMS_TIMEOUT_SECONDS. Timeouts, connection
+        errors, 429s and 5xx responses count against the circuit breaker;
+        while it is open the call fails immediately instead of holding the
+        worker thread. They are retried with jittered exponential backoff only
+        when `retries` is given, which request handlers never do: a retry
+        would keep the request thread waiting on a struggling provider.
+        
         Args:
             to_phone (str): Phone number in international format (e.g., +263712345678)
-            message (str): Message content
+            message (str or RenderedSMS): Message content
+            retries (int): Further attempts after a retryable failure, for background senders
             
         Returns:
-            dict: Result with success status and message
+            dict: Result with success status and message, plus the message's segment metrics
         """
+        error = self._precheck(to_phone)
+        if error:
+            return error
+        
+        sms = self._measured(message)
+        try:
+            clean_phone = self._clean_phone(to_phone)
+        except ValueError as e:
+            return self._failure(to_phone, e)
+        
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                return self._circuit_open()
+            try:
+                # Send SMS
+                message_obj = self.client.messages.create(
+                    body=sms.text,
+                    from_=self.from_number,
+                    to=clean_phone
+                )
+            except Exception as e:
+                if not self._settle(e) or attempt == retries:
+                    return self._failure(to_phone, e, attempt + 1)
+                time.sleep(self._backoff(attempt))
+                continue
+            
+            self.breaker.record_success()
+            return self._success(sms, clean_phone, message_obj.sid)
+
+    async def asend_sms(self, to_phone, message, retries=0):
+        """
+        Async counterpart of send_sms for the async views.
+
+        Posts to the Twilio Messages API with aiohttp, so the event loop keeps
+        serving other requests while the gateway responds. Same timeout,
+        retry rules and circuit breaker as send_sms.
+        """
+        error = self._precheck(to_phone)
+        if error:
+            return error
+        
+        import aiohttp
+
+        sms = self._measured(message)
+        try:
+            clean_phone = self._clean_phone(to_phone)
+        except ValueError as e:
+            return self._failure(to_phone, e)
+
+        url = f'{self.api_base_url}/2010-04-01/Accounts/{self.account_sid}/Messages.json'
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                return self._circuit_open()
+            try:
+                session = self._async_session()
+                async with session.post(
+                    url,
+                    data={'To': clean_phone, 'From': self.from_number, 'Body': sms.text},
+                    auth=aiohttp.BasicAuth(self.account_sid, self.auth_token),
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                ) as response:
+                    payload = await response.json(content_type=None)
+                    if response.status >= 400:
+                        raise SMSProviderError(response.status, payload.get('message', 'unknown error'))
+            except Exception as e:
+                if not self._settle(e) or attempt == retries:
+                    return self._failure(to_phone, e, attempt + 1)
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            self.breaker.record_success()
+            return self._success(sms, clean_phone, payload.get('sid'))
+
+    def _precheck(self, to_phone):
         if not self.client:
             return {
                 'success': False,
@@ -41,42 +179,122 @@ class SMSService:
                 'success': False,
                 'message': 'Phone number not provided'
             }
-        
-        try:
-            # Clean phone number (remove spaces, dashes, etc.)
-            clean_phone = ''.join(filter(str.isdigit, to_phone))
-            if not clean_phone.startswith('+'):
-                # Assume Zimbabwe number if no country code
-                if clean_phone.startswith('0'):
-                    clean_phone = '+263' + clean_phone[1:]
-                elif clean_phone.startswith('263'):
-                    clean_phone = '+' + clean_phone
-                else:
-                    clean_phone = '+263' + clean_phone
-            
-            # Send SMS
-            message_obj = self.client.messages.create(
-                body=message,
-                from_=self.from_number,
-                to=clean_phone
-            )
-            
-            logger.info(f"SMS sent successfully to {clean_phone}. Message SID: {message_obj.sid}")
-            
+        return None
+
+    def _settle(self, error):
+        """Record a failed attempt with the breaker; True if it is worth retrying"""
+        status = getattr(error, 'status', None)
+        if isinstance(status, int) and status < 500 and status != 429:
+            # The provider answered and refused this message (bad number, ...); it is up
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure(error)
+        return True
+
+    def _backoff(self, attempt):
+        # Full jitter: spread retries from many workers instead of retrying in lockstep
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _success(self, sms, clean_phone, sid):
+        self._record(sms)
+        logger.info(f"SMS sent successfully to {clean_phone}. Message SID: {sid}. "
+                    f"{sms.encoding}, {sms.segments} segment(s), cost {sms.cost}")
+        return {
+            'success': True,
+            'message': 'SMS sent successfully',
+            'message_sid': sid,
+            'metrics': sms.metrics(),
+        }
+
+    def _failure(self, to_phone, error, attempts=1):
+        logger.error(f"Failed to send SMS to {to_phone} after {attempts} attempt(s): {str(error)}")
+        return {
+            'success': False,
+            'message': f'Failed to send SMS: {str(error)}'
+        }
+
+    def _circuit_open(self):
+        retry_after = self.breaker.retry_after()
+        return {
+            'success': False,
+            'message': f'SMS provider unavailable; not sending for another {retry_after:.0f}s',
+            'retry_after': retry_after,
+        }
+
+    def status(self):
+        """Circuit breaker state and send totals, for monitoring"""
+        return {
+            'configured': self.client is not None,
+            'timeout': self.timeout,
+            'max_retries': self.max_retries,
+            'circuit': self.breaker.snapshot(),
+            'sent': self.metrics(),
+        }
+
+    def _measured(self, message):
+        return message if isinstance(message, RenderedSMS) else RenderedSMS(message)
+
+    def _record(self, sms):
+        with self._totals_lock:
+            totals = self._totals.setdefault(sms.template or 'custom', {
+                'messages': 0, 'segments': 0, 'cost': Decimal('0'), 'GSM-7': 0, 'UCS-2': 0,
+            })
+            totals['messages'] += 1
+            totals['segments'] += sms.segments
+            totals['cost'] += sms.cost
+            totals[sms.encoding] += 1
+
+    def metrics(self):
+        """Messages, segments, cost and encodings sent by this process, per template"""
+        with self._totals_lock:
             return {
-                'success': True,
-                'message': 'SMS sent successfully',
-                'message_sid': message_obj.sid
+                template: {**totals, 'cost': str(totals['cost'])}
+                for template, totals in self._totals.items()
             }
-            
-        except Exception as e:
-            logger.error(f"Failed to send SMS to {to_phone}: {str(e)}")
+
+    def _async_session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession()
+            self._sessions[loop] = session
+        return session
+
+    def _clean_phone(self, to_phone):
+        # Stored numbers are already E.164 (User.phone_e164); anything else is normalized the same way
+        clean_phone = to_e164(to_phone)
+        if clean_phone is None:
+            raise ValueError(f'{to_phone!r} is not a valid phone number')
+        return clean_phone
+
+    def _recipient(self, user):
+        return user.phone_e164 or user.phone_number
+
+    def _recipient_error(self, user):
+        if not user.phone_number:
             return {
                 'success': False,
-                'message': f'Failed to send SMS: {str(e)}'
+                'message': 'User phone number not available'
             }
+        
+        if not getattr(user, 'sms_notifications_enabled', True):
+            return {
+                'success': False,
+                'message': 'SMS notifications disabled by user'
+            }
+        return None
 
-    def send_application_status_sms(self, user, application, old_status, new_status):
+    def _branch_lines(self, application):
+        branch = application.branch
+        return {
+            'branch': labelled('Branch', branch.name, 40) if branch else '',
+            'location': labelled('Location', branch.address, 60) if branch else '',
+            'contact': labelled('Contact', branch.phone, 20) if branch else '',
+        }
+
+    def send_application_status_sms(self, user, application, old_status, new_status, retries=0):
         """
         Send SMS notification for application status change
         
@@ -85,51 +303,44 @@ class SMSService:
             application: Application object
             old_status: Previous status
             new_status: New status
+            retries: Passed on to send_sms
             
         Returns:
             dict: Result with success status and message
         """
-        if not user.phone_number:
-            return {
-                'success': False,
-                'message': 'User phone number not available'
-            }
-        
-        if not getattr(user, 'sms_notifications_enabled', True):
-            return {
-                'success': False,
-                'message': 'SMS notifications disabled by user'
-            }
-        
-        # Get branch information
-        branch_info = ""
-        if application.branch:
-            branch_info = f"\nBranch: {application.branch.name}"
-            if application.branch.location:
-                branch_info += f"\nLocation: {application.branch.location}"
-            if application.branch.contact_info:
-                branch_info += f"\nContact: {application.branch.contact_info}"
-        
-        # Create detailed SMS message based on status
-        status_messages = {
-            'submitted': f'✅ APPLICATION SUBMITTED\n\nRef: {application.reference_number}\nDocument: {application.document_type.name}\nStatus: Submitted for Review{branch_info}\n\nYour application has been received and is under review.',
-            'review': f'🔍 APPLICATION UNDER REVIEW\n\nRef: {application.reference_number}\nDocument: {application.document_type.name}\nStatus: Under Review{branch_info}\n\nYour application is currently being reviewed by our team.',
-            'approved': f'🎉 APPLICATION APPROVED\n\nRef: {application.reference_number}\nDocument: {application.document_type.name}\nStatus: Approved{branch_info}\n\nGreat news! Your application has been approved and will be processed.',
-            'printed': f'🖨️ DOCUMENT PRINTED\n\nRef: {application.reference_number}\nDocument: {application.document_type.name}\nStatus: Printed{branch_info}\n\nYour document has been printed and is being processed.',
-            'ready': f'📋 READY FOR COLLECTION\n\nRef: {application.reference_number}\nDocument: {application.document_type.name}\nStatus: Ready for Collection{branch_info}\n\nYour document is ready! Please visit the branch to collect it.',
-            'collected': f'✅ DOCUMENT COLLECTED\n\nRef: {application.reference_number}\nDocument: {application.document_type.name}\nStatus: Collected{branch_info}\n\nYour document has been successfully collected.',
-            'rejected': f'❌ APPLICATION REJECTED\n\nRef: {application.reference_number}\nDocument: {application.document_type.name}\nStatus: Rejected{branch_info}\n\nUnfortunately, your application has been rejected. Please contact us for more information.'
-        }
-        
-        message = status_messages.get(new_status, f'📄 APPLICATION UPDATE\n\nRef: {application.reference_number}\nDocument: {application.document_type.name}\nStatus: {new_status}{branch_info}\n\nYour application status has been updated.')
+        error = self._recipient_error(user)
+        if error:
+            return error
         
-        # Add QR code info and system signature
-        if application.qr_code:
-            message += f'\n\nQR Code: {application.qr_code}'
-        
-        message += '\n\nCivil Registry System'
+        try:
+            message = self.build_status_message(application, new_status)
+        except SegmentBudgetExceeded as e:
+            return {'success': False, 'message': str(e)}
+        return self.send_sms(self._recipient(user), message, retries)
+
+    async def asend_application_status_sms(self, user, application, old_status, new_status):
+        """Async counterpart of send_application_status_sms; branch and document type must be loaded"""
+        error = self._recipient_error(user)
+        if error:
+            return error
         
-        return self.send_sms(user.phone_number, message)
+        try:
+            message = self.build_status_message(application, new_status)
+        except SegmentBudgetExceeded as e:
+            return {'success': False, 'message': str(e)}
+        return await self.asend_sms(self._recipient(user), message)
+
+    def build_status_message(self, application, new_status):
+        icon, title, status_label, detail = STATUS_TEXT.get(new_status, STATUS_FALLBACK)
+        return get_template('status').render(
+            icon=icon,
+            title=title,
+            reference=application.reference_number,
+            document=clip(application.document_type.name, 40),
+            status=status_label or clip(new_status, 20),
+            detail=detail,
+            **self._branch_lines(application),
+        )
 
     def send_application_submission_sms(self, user, application):
         """
@@ -142,37 +353,34 @@ class SMSService:
         Returns:
             dict: Result with success status and message
         """
-        if not user.phone_number:
-            return {
-                'success': False,
-                'message': 'User phone number not available'
-            }
+        error = self._recipient_error(user)
+        if error:
+            return error
         
-        if not getattr(user, 'sms_notifications_enabled', True):
-            return {
-                'success': False,
-                'message': 'SMS notifications disabled by user'
-            }
-        
-        # Get branch information
-        branch_info = ""
-        if application.branch:
-            branch_info = f"\nBranch: {application.branch.name}"
-            if application.branch.location:
-                branch_info += f"\nLocation: {application.branch.location}"
-            if application.branch.contact_info:
-                branch_info += f"\nContact: {application.branch.contact_info}"
-        
-        # Create detailed submission SMS
-        message = f'📝 APPLICATION SUBMITTED\n\nRef: {application.reference_number}\nDocument: {application.document_type.name}\nStatus: Submitted for Review{branch_info}\n\nYour application has been successfully submitted and is now under review. You will receive updates via SMS as the status changes.'
-        
-        # Add QR code info if available
-        if application.qr_code:
-            message += f'\n\nQR Code: {application.qr_code}'
-        
-        message += '\n\nCivil Registry System'
+        try:
+            message = self.build_submission_message(application)
+        except SegmentBudgetExceeded as e:
+            return {'success': False, 'message': str(e)}
+        return self.send_sms(self._recipient(user), message)
+
+    async def asend_application_submission_sms(self, user, application):
+        """Async counterpart of send_application_submission_sms; branch and document type must be loaded"""
+        error = self._recipient_error(user)
+        if error:
+            return error
         
-        return self.send_sms(user.phone_number, message)
+        try:
+            message = self.build_submission_message(application)
+        except SegmentBudgetExceeded as e:
+            return {'success': False, 'message': str(e)}
+        return await self.asend_sms(self._recipient(user), message)
+
+    def build_submission_message(self, application):
+        return get_template('submission').render(
+            reference=application.reference_number,
+            document=clip(application.document_type.name, 40),
+            **self._branch_lines(application),
+        )
 
     def send_welcome_sms(self, user):
         """
@@ -190,9 +398,10 @@ class SMSService:
                 'message': 'User phone number not available'
             }
         
-        message = f"Welcome to Civil Registry System, {user.full_name or user.username}! You can now submit applications for various documents. Visit our website to get started."
-        
-        return self.send_sms(user.phone_number, message)
+        return self.send_sms(self._recipient(user), self.build_welcome_message(user))
+
+    def build_welcome_message(self, user):
+        return get_template('welcome').render(name=clip(user.full_name or user.username, 30))
 
 # Create global instance
 sms_service = SMSService()
@@ -0,0 +1,233 @@
+"""
+Precompiled SMS templates with GSM-7 / UCS-2 segment accounting.
+
+A message that is entirely in the GSM 03.38 alphabet is sent as GSM-7:
+160 characters in one segment, 153 per segment once it is split. A single
+character outside it (an emoji, a curly quote) switches the whole message
+to UCS-2, where a segment holds 70 characters, or 67 when split, and
+every segment is billed. Templates are parsed once at import, rendered
+with GSM-7-safe values, and measured on the final text so every message
+reports its encoding, segment count and cost.
+"""
+from decimal import Decimal
+from string import Formatter
+import unicodedata
+
+from django.conf import settings
+
+GSM7_BASIC = (
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+# Sent as an escape plus the character, so each costs two septets
+GSM7_EXTENDED = '^{}\\[~]|€\f'
+GSM7_CHARSET = frozenset(GSM7_BASIC + GSM7_EXTENDED)
+
+# Single-segment capacity and per-segment capacity once split (concatenation headers take the rest)
+SEGMENT_LIMITS = {
+    'GSM-7': (160, 153),
+    'UCS-2': (70, 67),
+}
+
+# Common characters outside GSM-7 that have a close GSM-7 spelling
+TRANSLITERATIONS = {
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u2032': "'",
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u2033': '"',
+    '\u2013': '-', '\u2014': '-', '\u2212': '-', '\u2026': '...',
+    '\u00a0': ' ', '\u202f': ' ', '\u200b': '', '\t': ' ',
+    '\u2022': '-', '`': "'",
+}
+
+
+def is_gsm7(text):
+    return all(char in GSM7_CHARSET for char in text)
+
+
+def to_gsm7(text):
+    """Rewrite text into the GSM-7 alphabet: transliterate what has an equivalent, drop the rest"""
+    if is_gsm7(text):
+        return text
+    result = []
+    for char in text:
+        if char in GSM7_CHARSET:
+            result.append(char)
+            continue
+        if char in TRANSLITERATIONS:
+            result.append(TRANSLITERATIONS[char])
+            continue
+        # Accented letters lose their accent (ó -> o); emoji and other symbols have no spelling and go
+        base = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+        result.append(''.join(c for c in base if c in GSM7_CHARSET))
+    return ''.join(result)
+
+
+def _units(text, encoding):
+    # Septets for GSM-7, UTF-16 code units for UCS-2; neither may be split across segments
+    if encoding == 'GSM-7':
+        return [2 if char in GSM7_EXTENDED else 1 for char in text]
+    return [2 if ord(char) > 0xFFFF else 1 for char in text]
+
+
+def segment_count(text, encoding):
+    units = _units(text, encoding)
+    single, per_segment = SEGMENT_LIMITS[encoding]
+    if sum(units) <= single:
+        return 1
+    segments, used = 1, 0
+    for size in units:
+        if used + size > per_segment:
+            segments += 1
+            used = 0
+        used += size
+    return segments
+
+
+class RenderedSMS:
+    """A message body with its encoding, length in encoding units, segment count and cost"""
+
+    def __init__(self, text, template=None):
+        self.text = text
+        self.template = template
+        self.encoding = 'GSM-7' if is_gsm7(text) else 'UCS-2'
+        self.units = sum(_units(text, self.encoding))
+        self.segments = segment_count(text, self.encoding)
+        self.cost = Decimal(settings.SMS_COST_PER_SEGMENT) * self.segments
+        # Optional template fields left out to stay within the segment budget
+        self.dropped = ()
+
+    def metrics(self):
+        return {
+            'template': self.template,
+            'encoding': self.encoding,
+            'length': self.units,
+            'segments': self.segments,
+            'cost': str(self.cost),
+        }
+
+    def __str__(self):
+        return self.text
+
+
+class SegmentBudgetExceeded(ValueError):
+    pass
+
+
+class SMSTemplate:
+    """
+    A str.format-style template parsed once into literal and field parts.
+
+    `max_segments` is the budget: when a render goes over it the `optional`
+    fields are blanked in order, and SegmentBudgetExceeded is raised if that
+    is still not enough. With `gsm7=True` the literal text must be GSM-7
+    and values are rewritten into it, so one stray character in a name
+    cannot turn the message into UCS-2.
+    """
+
+    def __init__(self, name, source, max_segments, optional=(), gsm7=True):
+        self.name = name
+        self.max_segments = max_segments
+        self.optional = tuple(optional)
+        self.gsm7 = gsm7
+        self.parts = []
+        self.fields = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if spec or conversion:
+                raise ValueError(f'SMS template {name}: format specs are not supported ({field})')
+            self.parts.append((literal, field))
+            if field:
+                self.fields.append(field)
+        literals = ''.join(literal for literal, _ in self.parts)
+        if gsm7 and not is_gsm7(literals):
+            raise ValueError(f'SMS template {name} is marked GSM-7 but its text is not')
+
+    def render(self, **values):
+        if self.gsm7:
+            values = {field: to_gsm7(str(value)) for field, value in values.items()}
+        message = self._measure(values)
+        dropped = []
+        for field in self.optional:
+            if message.segments <= self.max_segments:
+                break
+            if values.get(field):
+                values[field] = ''
+                dropped.append(field)
+                message = self._measure(values)
+        message.dropped = tuple(dropped)
+        if message.segments > self.max_segments:
+            raise SegmentBudgetExceeded(
+                f'SMS template {self.name} needs {message.segments} segments; its budget is {self.max_segments}'
+            )
+        return message
+
+    def _measure(self, values):
+        text = ''.join(literal + (str(values[field]) if field else '') for literal, field in self.parts)
+        return RenderedSMS(text, self.name)
+
+
+def clip(value, limit):
+    """Shorten free text supplied by staff or citizens so templates keep a predictable length"""
+    value = ' '.join(str(value or '').split())
+    return value if len(value) <= limit else value[:limit - 3].rstrip() + '...'
+
+
+def labelled(label, value, limit):
+    """An optional '\\nLabel: value' line, empty when there is no value"""
+    value = clip(value, limit)
+    return f'\n{label}: {value}' if value else ''
+
+
+STATUS_TEXT = {
+    'submitted': ('✅', 'APPLICATION SUBMITTED', 'Submitted for Review',
+                  'Your application has been received and is under review.'),
+    'review': ('🔍', 'APPLICATION UNDER REVIEW', 'Under Review',
+               'Your application is currently being reviewed by our team.'),
+    'approved': ('🎉', 'APPLICATION APPROVED', 'Approved',
+                 'Great news! Your application has been approved and will be processed.'),
+    'printed': ('🖨️', 'DOCUMENT PRINTED', 'Printed',
+                'Your document has been printed and is being processed.'),
+    'ready': ('📋', 'READY FOR COLLECTION', 'Ready for Collection',
+              'Your document is ready! Please visit the branch to collect it.'),
+    'collected': ('✅', 'DOCUMENT COLLECTED', 'Collected',
+                  'Your document has been successfully collected.'),
+    'rejected': ('❌', 'APPLICATION REJECTED', 'Rejected',
+                 'Unfortunately, your application has been rejected. Please contact us for more information.'),
+}
+STATUS_FALLBACK = ('📄', 'APPLICATION UPDATE', None, 'Your application status has been updated.')
+
+_STATUS_BODY = (
+    'Ref: {reference}\nDocument: {document}\nStatus: {status}{branch}{location}{contact}\n\n{detail}'
+    '\n\nCivil Registry System'
+)
+_SUBMISSION_BODY = (
+    'Ref: {reference}\nDocument: {document}\nStatus: Submitted for Review{branch}{location}{contact}\n\n'
+    'Your application has been received. You will get an SMS each time its status changes.'
+    '\n\nCivil Registry System'
+)
+_WELCOME_BODY = (
+    'Welcome to Civil Registry System, {name}! You can now submit applications for various documents. '
+    'Visit our website to get started.'
+)
+# Branch details are dropped, least useful first, when a message would go over budget
+_BRANCH_LINES = ('location', 'contact', 'branch')
+
+# 'gsm7' variants are plain text and bill at 153-160 characters a segment;
+# 'unicode' variants keep the emoji headings at 67-70 (settings.SMS_TEMPLATE_VARIANT)
+TEMPLATES = {
+    'gsm7': {
+        'status': SMSTemplate('status', '{title}\n' + _STATUS_BODY, max_segments=2, optional=_BRANCH_LINES),
+        'submission': SMSTemplate('submission', 'APPLICATION SUBMITTED\n' + _SUBMISSION_BODY, max_segments=2,
+                                  optional=_BRANCH_LINES),
+        'welcome': SMSTemplate('welcome', _WELCOME_BODY, max_segments=1),
+    },
+    'unicode': {
+        'status': SMSTemplate('status', '{icon} {title}\n\n' + _STATUS_BODY, max_segments=5,
+                              optional=_BRANCH_LINES, gsm7=False),
+        'submission': SMSTemplate('submission', '📝 APPLICATION SUBMITTED\n\n' + _SUBMISSION_BODY, max_segments=5,
+                                  optional=_BRANCH_LINES, gsm7=False),
+        'welcome': SMSTemplate('welcome', _WELCOME_BODY, max_segments=3, gsm7=False),
+    },
+}
+
+
+def get_template(name, variant=None):
+    return TEMPLATES[variant or settings.SMS_TEMPLATE_VARIANT][name]
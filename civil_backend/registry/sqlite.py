@@ -0,0 +1,31 @@
+from django.conf import settings
+
+# Connection profile for running SQLite under several concurrent workers:
+# WAL lets readers and a writer proceed together, NORMAL sync is durable
+# across application crashes in WAL mode, and the busy timeout makes a
+# contended writer wait for the lock instead of failing immediately.
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+
+def get_sqlite_pragmas():
+    return {**DEFAULT_SQLITE_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def apply_pragmas(cursor, pragmas):
+    """Run each PRAGMA on a DB-API cursor"""
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+
+
+def profile_enabled(alias):
+    return (
+        getattr(settings, 'SQLITE_CONCURRENCY_PROFILE', False)
+        and alias in getattr(settings, 'SQLITE_CONCURRENCY_ALIASES', ['default'])
+    )
@@ -0,0 +1,30 @@
+from django.db.backends.sqlite3 import base
+
+from registry.sqlite import apply_pragmas, get_sqlite_pragmas, profile_enabled
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Django's SQLite backend plus the opt-in concurrency profile.
+
+    With the profile on, every new connection gets the configured PRAGMAs and
+    atomic blocks start with BEGIN IMMEDIATE. Taking the write lock up front
+    lets the busy timeout queue writers instead of failing a read-then-write
+    transaction with "database is locked" when another writer commits first.
+    """
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        if profile_enabled(self.alias):
+            cursor = connection.cursor()
+            try:
+                apply_pragmas(cursor, get_sqlite_pragmas())
+            finally:
+                cursor.close()
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if profile_enabled(self.alias):
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
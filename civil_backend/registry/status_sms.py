@@ -0,0 +1,128 @@
+"""
+Coalesced status SMS.
+
+A status change queues a PendingStatusSMS for the application owner
+instead of texting right away. Changes made within
+STATUS_SMS_COALESCE_SECONDS of the first one update that row, so an
+application moved approved -> printed -> ready in a few minutes produces a
+single SMS with the latest status. `send_due_status_sms` sends the rows
+whose window has closed; in-app notifications are not delayed. A send the
+provider refuses is queued again with a backoff (`retry_later`).
+
+Nothing else sends queued rows, so coalescing is off unless configured and
+a backlog left by a stopped `send_status_sms` worker is logged as an error.
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PendingStatusSMS
+from .sms_service import sms_service
+
+logger = logging.getLogger(__name__)
+
+
+def queue_status_sms(application, old_status, new_status):
+    """
+    Queue (or merge into the queued) status SMS for the application owner.
+
+    Returns the send result when coalescing is off, else None.
+    """
+    window = settings.STATUS_SMS_COALESCE_SECONDS
+    if window <= 0:
+        return sms_service.send_application_status_sms(application.user, application, old_status, new_status)
+
+    pending = PendingStatusSMS.objects.filter(user_id=application.user_id, application=application)
+    if pending.update(status=new_status, changes=F('changes') + 1):
+        return None
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            PendingStatusSMS.objects.create(
+                user_id=application.user_id,
+                application=application,
+                from_status=old_status,
+                status=new_status,
+                send_after=now + timedelta(seconds=window),
+            )
+    except IntegrityError:
+        # Another request queued one for this application first; fold into it
+        pending.update(status=new_status, changes=F('changes') + 1)
+    if overdue_status_sms(now).exists():
+        logger.error('Queued status SMS are overdue and are not being sent: run `manage.py send_status_sms --loop` '
+                     'or set STATUS_SMS_COALESCE_SECONDS=0')
+    return None
+
+
+def overdue_status_sms(now=None):
+    """Queued status SMS that a running send_status_sms worker would already have sent"""
+    now = now or timezone.now()
+    return PendingStatusSMS.objects.filter(
+        send_after__lt=now - timedelta(seconds=settings.STATUS_SMS_OVERDUE_SECONDS)
+    )
+
+
+def send_due_status_sms(limit=200, now=None):
+    """Send every queued status SMS whose window has closed; returns (sent, skipped, failed)"""
+    now = now or timezone.now()
+    due = list(
+        PendingStatusSMS.objects.filter(send_after__lte=now)
+        .select_related('user', 'application__document_type', 'application__branch')
+        .order_by('send_after')[:limit]
+    )
+    sent = skipped = failed = 0
+    for pending in due:
+        # Claim the row by deleting it; if the status moved on since it was read, a later run sends that instead
+        if not PendingStatusSMS.objects.filter(pk=pending.pk, status=pending.status).delete()[0]:
+            continue
+        if pending.status == pending.from_status:
+            skipped += 1
+            continue
+
+        application = pending.application
+        try:
+            # Off the request path, so a transient provider failure is worth retrying here
+            result = sms_service.send_application_status_sms(
+                pending.user, application, pending.from_status, pending.status, retries=sms_service.max_retries
+            )
+        except Exception as e:
+            result = {'success': False, 'message': str(e)}
+        if result['success']:
+            sent += 1
+            logger.info(f"Status SMS for {application.reference_number} sent: {pending.from_status} -> "
+                        f"{pending.status} ({pending.changes} change(s) coalesced)")
+        else:
+            failed += 1
+            retry_later(pending, result['message'], now)
+    return sent, skipped, failed
+
+
+def retry_later(pending, message, now):
+    """Queue a failed status SMS again with an exponential backoff, or give up after STATUS_SMS_MAX_ATTEMPTS"""
+    reference = pending.application.reference_number
+    attempts = pending.attempts + 1
+    if attempts >= settings.STATUS_SMS_MAX_ATTEMPTS:
+        logger.error(f"Status SMS for {reference} failed {attempts} times, giving up: {message}")
+        return
+    send_after = now + timedelta(seconds=settings.STATUS_SMS_RETRY_SECONDS * 2 ** (attempts - 1))
+    logger.warning(f"Status SMS for {reference} failed, retrying after {send_after:%H:%M:%S}: {message}")
+    try:
+        with transaction.atomic():
+            PendingStatusSMS.objects.create(
+                user_id=pending.user_id,
+                application_id=pending.application_id,
+                from_status=pending.from_status,
+                status=pending.status,
+                changes=pending.changes,
+                attempts=attempts,
+                send_after=send_after,
+            )
+    except IntegrityError:
+        # The status changed again meanwhile; the queued SMS must still cover the change that was never sent
+        PendingStatusSMS.objects.filter(user_id=pending.user_id, application_id=pending.application_id).update(
+            from_status=pending.from_status, changes=F('changes') + pending.changes
+        )
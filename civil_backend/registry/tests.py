@@ -1,3 +1,1146 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import (
+    analytics, async_views, changes, db_routers, filetypes, idempotency, labels, search, slow_queries, sms_templates,
+    status_sms,
+)
+from .admin import UserAdmin
+from .authentication import CachedJWTAuthentication, RegistryRefreshToken
+from .management.commands.bench_imports import DEFERRED_PACKAGES, WORKER_BOOT, importer_chain, parse_importtime
+from .middleware import CompressionMiddleware, PrimaryPinningMiddleware
+from .models import (
+    Application, ArchivedApplication, ArchivedAttachment, ArchivedNotification, Attachment, DocumentType,
+    IdempotencyKey, Notification, PendingStatusSMS, RegistryBranch, User,
+)
+from .offload import OffloadBusy, OffloadTimeout, offload_service
+from .phone import to_e164
+from .queue import queue_positions, renumber_queues
+from .serializers import ApplicationSerializer
+from .utils import render_qr_png
+
+
+class RegistryTestCase(TestCase):
+    """Branch, document type and applicant, with uploads kept in a temporary MEDIA_ROOT"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = RegistryBranch.objects.create(name='Harare Central', address='Corner Fourth Street')
+        cls.document_type = DocumentType.objects.create(
+            name='Birth Certificate', processing_days=5, fee=Decimal('20.00'), requirements='Hospital record'
+        )
+        cls.user = User.objects.create(
+            username='citizen', email='citizen@example.com', full_name='Citizen One', phone_number='+263771000001'
+        )
+
+    def setUp(self):
+        # Render QR codes inline; pool processes would not see the test database or the mocks
+        patcher = mock.patch.object(offload_service, 'workers', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Cached users and pins would outlive the test's rolled-back rows
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+
+    def png(self, name='scan.png'):
+        return SimpleUploadedFile(name, render_qr_png('AB-0000000000'), content_type='image/png')
+
+
+class IdempotencyTests(RegistryTestCase):
+    """[user-039] Idempotency-Key replay and conflict rules on POST /api/applications/submit/"""
+
+    def submit(self, key, upload, **fields):
+        return self.client.post(
+            '/api/applications/submit/',
+            {'document_type': str(self.document_type.pk), 'branch': str(self.branch.pk), 'files': [upload], **fields},
+            format='multipart', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.submit('key-1', self.png())
+        retry = self.submit('key-1', self.png())
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(Application.objects.count(), 1)
+
+    def test_corrected_request_after_validation_error_reuses_the_key(self):
+        rejected = self.submit('key-2', SimpleUploadedFile('scan.png', b'<html>not an image</html>'))
+        corrected = self.submit('key-2', self.png())
+
+        self.assertEqual(rejected.status_code, 400)
+        self.assertIn('files', rejected.json())
+        self.assertEqual(corrected.status_code, 201)
+        self.assertFalse(corrected.has_header('Idempotent-Replayed'))
+        self.assertEqual(Application.objects.count(), 1)
+
+    def test_validation_errors_are_not_stored(self):
+        self.submit('key-3', SimpleUploadedFile('scan.png', b'<html>not an image</html>'))
+        self.assertFalse(IdempotencyKey.objects.filter(key='key-3').exists())
+
+    def test_key_reused_for_a_different_upload_is_refused(self):
+        self.assertEqual(self.submit('key-6', self.png()).status_code, 201)
+
+        for upload, fields in ((self.png('other.png'), {}), (self.png(), {'descriptions': ['Front page']})):
+            with self.subTest(upload=upload.name, fields=fields):
+                self.assertEqual(self.submit('key-6', upload, **fields).status_code, 422)
+        self.assertEqual(Application.objects.count(), 1)
+
+    def test_key_reused_for_a_different_request_is_refused(self):
+        idempotency.claim('anonymous', 'key-4', 'fingerprint-a')
+        with self.assertRaises(idempotency.IdempotencyError) as raised:
+            idempotency.claim('anonymous', 'key-4', 'fingerprint-b')
+        self.assertEqual(raised.exception.status_code, 422)
+
+    def test_key_still_in_progress_is_refused(self):
+        idempotency.claim('anonymous', 'key-5', 'fingerprint')
+        with self.assertRaises(idempotency.IdempotencyError) as raised:
+            idempotency.claim('anonymous', 'key-5', 'fingerprint')
+        self.assertEqual(raised.exception.status_code, 409)
+
+
+class UploadFileTypeTests(RegistryTestCase):
+    """[user-049] Uploads are checked by signature and by the structure the format requires"""
+
+    def docx(self, parts=('word/document.xml',), name='letter.docx'):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as package:
+            package.writestr('[Content_Types].xml', '<Types/>')
+            for part in ('word/styles.xml', *parts):
+                package.writestr(part, '<w:document/>')
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def submit(self, upload):
+        return self.client.post(
+            '/api/applications/submit/',
+            {'document_type': str(self.document_type.pk), 'branch': str(self.branch.pk), 'files': [upload]},
+            format='multipart',
+        )
+
+    def test_rejections(self):
+        png = render_qr_png('AB-0000000000')
+        cases = {
+            'truncated PNG': (SimpleUploadedFile('scan.png', png[:-12]), 'The PNG image is incomplete.'),
+            'DOCX without a document part': (self.docx(parts=()), 'The file is not a Word document.'),
+            'DOCX cut short': (SimpleUploadedFile('letter.docx', self.docx().read()[:-30]),
+                               'The Word document is incomplete.'),
+            'mismatched extension': (SimpleUploadedFile('scan.pdf', png), 'File extension .pdf does not match file type'),
+        }
+        for case, (upload, message) in cases.items():
+            with self.subTest(case):
+                response = self.submit(upload)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'files': {'0': [message]}})
+        self.assertFalse(Application.objects.exists())
+
+    def test_structure_checks_both_ends(self):
+        png = render_qr_png('AB-0000000000')
+        check = filetypes.StructureCheck()
+        check.feed(b'\x00' * 8 + png[8:])
+        self.assertEqual(check.problem(filetypes.PNG), 'The file is not a PNG image.')
+
+        check = filetypes.StructureCheck()
+        for offset in range(0, len(png), 7):
+            check.feed(png[offset:offset + 7])
+        self.assertIsNone(check.problem(filetypes.PNG))
+
+    def test_well_formed_docx_is_accepted(self):
+        with mock.patch('registry.views.sms_service.send_application_submission_sms',
+                        return_value={'success': True, 'message': 'sent'}):
+            self.assertEqual(self.submit(self.docx()).status_code, 201)
+
+
+class QRLabelSheetTests(RegistryTestCase):
+    """[user-046] QR label sheets stream as a well-formed PDF, a page per 14 labels"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create(username='admin', email='admin@example.com', full_name='Admin', is_admin=True)
+        self.client.force_authenticate(self.admin)
+        self.applications = [
+            Application.objects.create(user=self.user, document_type=self.document_type, branch=self.branch)
+            for _ in range(labels.LABELS_PER_PAGE + 1)
+        ]
+
+    def sheet(self, payload):
+        return self.client.post('/api/applications/qr-labels/', payload, format='json')
+
+    def test_sheet_is_a_well_formed_pdf(self):
+        response = self.sheet({'status': 'submitted', 'branch': str(self.branch.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = b''.join(response.streaming_content)
+
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.endswith(b'%%EOF\n'))
+        self.assertIn(b'/Type /Pages /Kids [', pdf)
+        self.assertIn(b'/Count 2 >>', pdf)
+        self.assertEqual(pdf.count(b'/Subtype /Image'), len(self.applications))
+        # Every cross-reference entry points at its object
+        xref = int(pdf.rsplit(b'startxref\n', 1)[1].split()[0])
+        lines = pdf[xref:].split(b'\n')
+        objects = int(lines[1].split()[1])
+        for number, entry in enumerate(lines[3:objects + 2], start=1):
+            self.assertTrue(pdf[int(entry.split()[0]):].startswith(b'%d 0 obj' % number))
+
+    def test_pool_path_keeps_the_order(self):
+        values = [application.reference_number for application in self.applications]
+        with mock.patch.object(labels, 'POOL_THRESHOLD', 1):
+            self.assertEqual(list(labels.render_qr_matrices(values)), [labels.render_qr_matrix(v) for v in values])
+
+    @override_settings(QR_LABEL_MAX_BATCH=2)
+    def test_selection_errors(self):
+        self.assertEqual(self.sheet({'ids': ['not-a-uuid']}).status_code, 400)
+        self.assertEqual(self.sheet({}).status_code, 400)
+        self.assertEqual(self.sheet({'status': 'collected'}).status_code, 404)
+        self.assertEqual(self.sheet({'status': 'submitted'}).status_code, 400)
+        self.assertEqual(self.sheet({'ids': [str(self.applications[0].pk)]}).status_code, 200)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.sheet({'status': 'submitted'}).status_code, 403)
+
+
+class SQLiteProfileTests(TestCase):
+    """[user-028] The concurrency profile sets its PRAGMAs on new connections and takes the write lock up front"""
+
+    def wrapper(self):
+        from .sqlite_backend.base import DatabaseWrapper
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        database = DatabaseWrapper({**connection.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')})
+        self.addCleanup(database.close)
+        return database
+
+    def pragma(self, database, name):
+        with database.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_CONCURRENCY_PROFILE=True, SQLITE_PRAGMAS={'busy_timeout': 1234})
+    def test_profile(self):
+        database = self.wrapper()
+
+        self.assertEqual(self.pragma(database, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(database, 'busy_timeout'), 1234)
+        with CaptureQueriesContext(database) as queries:
+            database._start_transaction_under_autocommit()
+        self.assertEqual([query['sql'] for query in queries], ['BEGIN IMMEDIATE'])
+        database.connection.rollback()
+
+    @override_settings(SQLITE_CONCURRENCY_PROFILE=False)
+    def test_off_by_default(self):
+        database = self.wrapper()
+
+        self.assertEqual(self.pragma(database, 'journal_mode'), 'delete')
+        with CaptureQueriesContext(database) as queries:
+            database._start_transaction_under_autocommit()
+        self.assertNotIn('BEGIN IMMEDIATE', [query['sql'] for query in queries])
+        database.connection.rollback()
+
+
+class ApplicationSearchTests(RegistryTestCase):
+    """[user-029] Ranked full-text search for staff, with user input never read as FTS syntax"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create(username='admin', email='admin@example.com', full_name='Admin', is_admin=True)
+        self.client.force_authenticate(self.admin)
+        self.application = Application.objects.create(
+            user=self.user, document_type=self.document_type, branch=self.branch
+        )
+
+    def search(self, q, **params):
+        return self.client.get('/api/applications/search/', {'q': q, **params})
+
+    def found(self, q):
+        response = self.search(q)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_matches_applicant_reference_prefix_and_branch(self):
+        reference = self.application.reference_number
+        for q in ('Citizen', reference[:len(reference) // 2], 'harare', 'birth certificate'):
+            with self.subTest(q=q):
+                self.assertEqual(self.found(q), [str(self.application.pk)])
+        self.assertEqual(self.found('Bulawayo'), [])
+
+    def test_fts_syntax_is_quoted(self):
+        self.assertEqual(search.build_match_query('AB-12 "x" OR NEAR('), '"AB12" "x" "OR" "NEAR"*')
+        self.assertEqual(self.found('Citizen OR'), [])
+
+    def test_pages_and_validation(self):
+        Application.objects.create(user=self.user, document_type=self.document_type, branch=self.branch)
+        first = self.search('Citizen', page_size=1).json()
+        self.assertTrue(first['has_next'])
+        self.assertFalse(self.search('Citizen', page_size=1, page=2).json()['has_next'])
+
+        self.assertEqual(self.search('').status_code, 400)
+        self.assertEqual(self.search('Citizen', page='x').status_code, 400)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.search('Citizen').status_code, 403)
+
+
+class ArchiveTests(RegistryTestCase):
+    """[user-034] archive_applications moves finished applications and their rows into the archive tables"""
+
+    def application(self, status, days_old):
+        application = Application.objects.create(
+            user=self.user, document_type=self.document_type, branch=self.branch, status=status
+        )
+        Application.objects.filter(pk=application.pk).update(updated_at=timezone.now() - timedelta(days=days_old))
+        return application
+
+    def archive(self, *args):
+        call_command('archive_applications', '--days=30', '--batch-size=1', *args, stdout=io.StringIO())
+
+    def test_finished_applications_move_with_their_rows(self):
+        old = self.application('collected', 40)
+        attachment = Attachment.objects.create(application=old, file=self.png(), description='Scan')
+        Notification.objects.create(user=self.user, application=old, title='Ready', message='Collect it')
+        recent = self.application('rejected', 5)
+        waiting = self.application('review', 40)
+
+        self.archive('--dry-run')
+        self.assertFalse(ArchivedApplication.objects.exists())
+
+        self.archive()
+        self.assertEqual(set(Application.objects.values_list('pk', flat=True)), {recent.pk, waiting.pk})
+        archived = ArchivedApplication.objects.get()
+        self.assertEqual((archived.pk, archived.reference_number), (old.pk, old.reference_number))
+        self.assertEqual(ArchivedAttachment.objects.get().file.name, attachment.file.name)
+        self.assertEqual(ArchivedNotification.objects.get().title, 'Ready')
+        self.assertFalse(Attachment.objects.exists() or Notification.objects.filter(application=old).exists())
+
+    def test_archived_applications_stay_readable(self):
+        old = self.application('collected', 40)
+        self.archive()
+
+        self.client.force_authenticate(self.user)
+        listed = self.client.get('/api/archive/applications/').json()
+        tracked = self.client.get('/api/track-by-reference/', {'ref': old.reference_number})
+
+        self.assertEqual([row['id'] for row in listed['results']], [str(old.pk)])
+        self.assertEqual(tracked.status_code, 200)
+        self.assertEqual(tracked.json()['status'], 'collected')
+
+
+class QueuePositionTests(RegistryTestCase):
+    """[user-037] Queue positions are kept per branch and document type in the order applications joined"""
+
+    def application(self, status='submitted', branch=None):
+        return Application.objects.create(
+            user=self.user, document_type=self.document_type, branch=branch or self.branch, status=status
+        )
+
+    def positions(self, *applications):
+        return {pk: position for pk, (position, _) in queue_positions(applications).items()}
+
+    def test_positions(self):
+        other_branch = RegistryBranch.objects.create(name='Bulawayo', address='Main Street')
+        first = self.application('review')
+        self.application('ready')
+        self.application(branch=other_branch)
+        second, third = self.application(), self.application()
+        collected = self.application('collected')
+        last = self.application('printed')
+
+        self.assertEqual(self.positions(first, second, third, collected, last),
+                         {first.pk: 1, second.pk: 2, third.pk: 3, last.pk: 4})
+        self.assertEqual(queue_positions([first])[first.pk][1], 5)
+
+    def test_leaving_moves_the_applications_behind_up(self):
+        first, second, third = self.application(), self.application(), self.application()
+
+        first.status = 'ready'
+        first.save()
+        third.delete()
+        self.assertEqual(self.positions(first, second), {second.pk: 1})
+
+        # A stale instance saved without a status change keeps the current slot
+        second_stale = Application.objects.get(pk=second.pk)
+        second.status = 'review'
+        second.save()
+        second_stale.rejection_reason = 'Blurry'
+        second_stale.save()
+        self.assertEqual(self.positions(second), {second.pk: 1})
+
+        # Coming back joins at the back of the queue
+        first.status = 'submitted'
+        first.save()
+        self.assertEqual(self.positions(first, second), {second.pk: 1, first.pk: 2})
+
+    def test_renumber_queues(self):
+        first, second = self.application(), self.application()
+        Application.objects.filter(pk=first.pk).update(status='collected')
+
+        self.assertEqual(renumber_queues(), 1)
+        self.assertEqual(self.positions(Application.objects.get(pk=second.pk)), {second.pk: 1})
+        self.assertIsNone(Application.objects.get(pk=first.pk).queue_slot)
+
+
+class PhoneNumberTests(RegistryTestCase):
+    """[user-043] Phone numbers are stored as entered and matched through the indexed E.164 column"""
+
+    def test_spellings_normalize_to_one_number(self):
+        for spelling in ('+263 77 123 4567', '00263771234567', '263771234567', '0771-234-567', '(077) 123.4567',
+                         '771234567'):
+            with self.subTest(spelling=spelling):
+                self.assertEqual(to_e164(spelling), '+263771234567')
+        for invalid in ('', None, '12345', '+263 77 123 4567 8901 2', 'call me'):
+            with self.subTest(invalid=invalid):
+                self.assertIsNone(to_e164(invalid))
+
+    def test_save_keeps_the_e164_column_in_step(self):
+        self.assertEqual(self.user.phone_e164, '+263771000001')
+
+        self.user.phone_number = '0772 000 002'
+        self.user.save(update_fields=['phone_number'])
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.phone_number, self.user.phone_e164), ('0772 000 002', '+263772000002'))
+
+    def test_lookup_by_any_spelling(self):
+        for phone in ('0771000001', '+263 77 100 0001'):
+            with self.subTest(phone=phone):
+                response = self.client.get('/api/users/', {'phone': phone, 'fields': 'id'})
+                self.assertEqual(response.json(), [{'id': str(self.user.pk)}])
+        self.assertEqual(self.client.get('/api/users/', {'phone': 'nonsense'}).json(), [])
+
+    def test_registration_rejects_unreachable_numbers(self):
+        response = self.client.post('/api/register/', {
+            'username': 'newcomer', 'email': 'newcomer@example.com', 'full_name': 'New Comer',
+            'phone_number': '12345', 'password': 'a-long-Passw0rd!',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('phone_number', response.json())
+
+
+class UserAdminSearchTests(RegistryTestCase):
+    """[user-045] Admin user search matches prefixes and exact IDs through the column indexes"""
+
+    def search(self, term):
+        queryset, may_have_duplicates = UserAdmin(User, admin.site).get_search_results(None, User.objects.all(), term)
+        self.assertFalse(may_have_duplicates)
+        return queryset
+
+    def test_prefixes_and_exact_matches(self):
+        User.objects.filter(pk=self.user.pk).update(national_id_number='63-123456A78')
+        User.objects.create(username='citadel', email='ops@example.com', full_name='Ops', phone_number='0712000000')
+
+        for term in ('citizen@example.com', 'CITIZEN@', 'citiz', '+26377100', '0771 000 001', '63-123456A78'):
+            with self.subTest(term=term):
+                self.assertEqual(list(self.search(term)), [self.user])
+        self.assertEqual(self.search('cit').count(), 2)
+        self.assertFalse(self.search('63-123').exists())
+
+    def test_search_seeks_an_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            list(self.search('citiz'))
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {queries[0]["sql"]}')
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertNotIn('SCAN registry_user', plan)
+
+
+class SparseFieldsetTests(RegistryTestCase):
+    """[user-030] ?fields= and the compact list representation trim both the output and the columns loaded"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.application = Application.objects.create(
+            user=self.user, document_type=self.document_type, branch=self.branch
+        )
+
+    def rows(self, response):
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data['results'] if isinstance(data, dict) else data
+
+    def test_fields_limit_the_representation_and_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.rows(self.client.get('/api/applications/', {'fields': 'id,status'}))
+
+        self.assertEqual(rows, [{'id': str(self.application.pk), 'status': 'submitted'}])
+        select = next(query['sql'] for query in queries if 'FROM "registry_application"' in query['sql'])
+        self.assertNotIn('rejection_reason', select)
+
+    def test_lists_default_to_the_compact_representation(self):
+        listed = self.rows(self.client.get('/api/applications/'))[0]
+        detail = self.client.get(f'/api/applications/{self.application.pk}/').json()
+
+        self.assertLessEqual(set(listed), set(ApplicationSerializer.Meta.compact_fields))
+        self.assertIn('attachments', detail)
+        self.assertNotIn('attachments', listed)
+        self.assertIn('attachments', self.rows(self.client.get('/api/applications/', {'expand': 'attachments'}))[0])
+
+    def test_unknown_fields_are_a_400(self):
+        response = self.client.get('/api/applications/', {'fields': 'id,colour,size'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': ['Unknown field(s): colour, size.']})
+
+    def test_unknown_fields_are_a_400_on_the_async_views(self):
+        Notification.objects.create(user=self.user, title='Update', message='Status changed')
+        request = AsyncRequestFactory().get('/api/notifications/', {'fields': 'colour'}, headers={
+            'Authorization': f'Bearer {RegistryRefreshToken.for_user(self.user).access_token}',
+        })
+
+        response = async_to_sync(async_views.notifications)(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {'fields': ['Unknown field(s): colour.']})
+
+
+class ChangeFeedTests(RegistryTestCase):
+    """[user-033] The change feed returns what changed after a cursor, scoped to the user"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def feed(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get('/api/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def application(self, user=None):
+        return Application.objects.create(
+            user=user or self.user, document_type=self.document_type, branch=self.branch
+        )
+
+    def test_upserts_and_tombstones_after_the_cursor(self):
+        start = self.feed()
+        self.assertTrue(start['reset'])
+
+        mine, gone = self.application(), self.application()
+        other = User.objects.create(username='other', email='other@example.com', full_name='Other')
+        self.application(user=other)
+        gone_id = str(gone.pk)
+        gone.delete()
+
+        changes = self.feed(start['cursor'])
+        self.assertFalse(changes['reset'])
+        self.assertEqual([row['id'] for row in changes['applications']['upserted']], [str(mine.pk)])
+        self.assertEqual(changes['applications']['deleted'], [gone_id])
+        self.assertEqual(self.feed(changes['cursor'])['applications'], {'upserted': [], 'deleted': []})
+
+    def test_pages_follow_has_more(self):
+        cursor = self.feed()['cursor']
+        created = {str(self.application().pk) for _ in range(3)}
+
+        seen, pages, has_more = set(), 0, True
+        while has_more:
+            page = self.feed(cursor, limit=2)
+            seen.update(row['id'] for row in page['applications']['upserted'])
+            cursor, has_more, pages = page['cursor'], page['has_more'], pages + 1
+        self.assertGreater(pages, 1)
+        self.assertEqual(seen, created)
+
+    def test_malformed_cursor_is_a_400(self):
+        self.assertEqual(self.client.get('/api/changes/', {'cursor': 'not-a-cursor'}).status_code, 400)
+
+    def test_databases_without_the_change_log_are_a_501(self):
+        with mock.patch.object(changes, 'connections', {'default': mock.Mock(vendor='postgresql')}), \
+                self.assertLogs('django.request', 'ERROR'):
+            response = self.client.get('/api/changes/')
+        self.assertEqual(response.status_code, 501)
+
+
+class ConditionalRequestTests(RegistryTestCase):
+    """[user-032] ETags follow the representation: its variant, related rows and attachments"""
+
+    def setUp(self):
+        super().setUp()
+        self.application = Application.objects.create(
+            user=self.user, document_type=self.document_type, branch=self.branch
+        )
+        self.url = f'/api/applications/{self.application.pk}/'
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_sparse_fieldsets_get_their_own_tag(self):
+        self.assertNotEqual(self.etag(self.url), self.etag(f'{self.url}?fields=id,status'))
+        self.assertNotEqual(self.etag('/api/applications/'), self.etag('/api/applications/?fields=id,status'))
+
+    def test_if_match_accepts_the_tag_of_any_variant(self):
+        etag = self.etag(f'{self.url}?fields=id,status')
+        response = self.client.patch(self.url, {'rejection_reason': 'Unclear scan'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_related_changes_change_the_tag(self):
+        before = self.etag(self.url), self.etag('/api/applications/')
+        self.user.full_name = 'Citizen Renamed'
+        self.user.save()
+        after_rename = self.etag(self.url), self.etag('/api/applications/')
+        self.assertNotEqual(before[0], after_rename[0])
+        self.assertNotEqual(before[1], after_rename[1])
+
+        attachment = Attachment.objects.create(application=self.application, file=self.png())
+        self.assertEqual(self.client.delete(f'/api/attachments/{attachment.pk}/').status_code, 204)
+        self.assertNotEqual(self.etag(self.url), after_rename[0])
+
+    def test_list_is_validated_by_its_own_query(self):
+        etag = self.etag('/api/applications/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/applications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql'].upper()])
+
+        Application.objects.create(user=self.user, document_type=self.document_type, branch=self.branch)
+        self.assertEqual(self.client.get('/api/applications/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AdminRightsTests(RegistryTestCase):
+    """[user-026] Admin rights follow the user's current flags, whatever the token claims"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create(username='admin', email='admin@example.com', full_name='Admin', is_admin=True)
+        self.refresh = RegistryRefreshToken.for_user(self.admin)
+
+    def sms_status(self, access):
+        return self.client.get('/api/sms/status/', headers={'Authorization': f'Bearer {access}'}).status_code
+
+    def refreshed_access(self):
+        response = self.client.post('/api/token/refresh/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['access']
+
+    def test_demoted_admin_loses_access_after_refresh(self):
+        self.assertEqual(self.sms_status(self.refresh.access_token), 200)
+
+        self.admin.is_admin = False
+        self.admin.save()
+        access = self.refreshed_access()
+
+        self.assertEqual(self.sms_status(access), 403)
+
+    def test_queryset_update_invalidates_the_cached_user(self):
+        access = self.refreshed_access()
+        self.assertEqual(self.sms_status(access), 200)
+
+        User.objects.filter(pk=self.admin.pk).update(is_admin=False)
+
+        self.assertEqual(self.sms_status(access), 403)
+
+    def test_async_lookup_stays_off_the_event_loop(self):
+        request = AsyncRequestFactory().get('/', headers={'Authorization': f'Bearer {self.refresh.access_token}'})
+        authentication = CachedJWTAuthentication()
+
+        # A miss, then a hit; a database query on the event loop would raise SynchronousOnlyOperation
+        for _ in range(2):
+            user, _token = async_to_sync(authentication.aauthenticate)(request)
+            self.assertEqual(user.pk, self.admin.pk)
+
+
+class PrimaryPinningTests(RegistryTestCase):
+    """[user-027] A write pins its user (or anonymous browser) to the primary across tokens and processes"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(db_routers, 'replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def bearer(self, user):
+        return {'Authorization': f'Bearer {RegistryRefreshToken.for_user(user).access_token}'}
+
+    def write(self, request, user=None):
+        def view(request):
+            db_routers._wrote_to_primary.set(True)
+            if user is not None:
+                db_routers.pin_user(request, user)
+            return HttpResponse()
+        return PrimaryPinningMiddleware(view)(request)
+
+    def pinned(self, request):
+        seen = []
+
+        def view(request):
+            seen.append(db_routers._pinned_to_primary.get())
+            return HttpResponse()
+        PrimaryPinningMiddleware(view)(request)
+        return seen[0]
+
+    def test_write_pins_the_user_whatever_token_comes_next(self):
+        self.write(self.factory.post('/api/applications/', headers=self.bearer(self.user)))
+        # A token minted for another device of the same user
+        self.assertTrue(self.pinned(self.factory.get('/api/applications/', headers=self.bearer(self.user))))
+
+        other = User.objects.create(username='other', email='other@example.com', full_name='Other')
+        self.assertFalse(self.pinned(self.factory.get('/api/applications/', headers=self.bearer(other))))
+
+    def test_sign_up_pins_the_new_user_before_they_hold_a_token(self):
+        self.write(self.factory.post('/api/register/'), user=self.user)
+        self.assertTrue(self.pinned(self.factory.get('/api/profile/', headers=self.bearer(self.user))))
+
+    def test_anonymous_write_sets_a_signed_pin_cookie(self):
+        response = self.write(self.factory.post('/api/applications/submit/'))
+        cookie = response.cookies[PrimaryPinningMiddleware.PIN_COOKIE]
+
+        request = self.factory.get('/api/track-by-reference/')
+        request.COOKIES[cookie.key] = cookie.value
+        self.assertTrue(self.pinned(request))
+
+        request = self.factory.get('/api/track-by-reference/')
+        request.COOKIES[cookie.key] = 'forged'
+        self.assertFalse(self.pinned(request))
+
+
+class CompressionTests(TestCase):
+    """[user-031] Token responses are never compressed; gzip output length is randomized"""
+
+    def compress(self, path, content=b'{"detail": "' + b'x' * 4096 + b'"}'):
+        request = RequestFactory().post(path, headers={'Accept-Encoding': 'gzip'})
+        return CompressionMiddleware(lambda request: HttpResponse(content, content_type='application/json'))(request)
+
+    def test_token_responses_are_not_compressed(self):
+        for path in ('/api/login/', '/api/token/', '/api/token/refresh/', '/api/register/'):
+            with self.subTest(path=path):
+                self.assertFalse(self.compress(path).has_header('Content-Encoding'))
+
+    def test_gzip_length_varies(self):
+        responses = [self.compress('/api/applications/') for _ in range(20)]
+        self.assertEqual(responses[0]['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(responses[0].content), b'{"detail": "' + b'x' * 4096 + b'"}')
+        self.assertGreater(len({len(response.content) for response in responses}), 1)
+
+
+class SubmitOffloadTests(RegistryTestCase):
+    """[user-047] A refused or timed-out QR render is a 503 that leaves no row or file behind"""
+
+    def submit(self):
+        return self.client.post(
+            '/api/applications/submit/',
+            {'document_type': str(self.document_type.pk), 'branch': str(self.branch.pk), 'files': [self.png()]},
+            format='multipart',
+        )
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.media_root) for name in names]
+
+    def test_busy_or_timed_out_render_leaves_nothing_behind(self):
+        for error in (OffloadBusy, OffloadTimeout):
+            with self.subTest(error=error.__name__):
+                files_before = self.stored_files()
+                with mock.patch.object(offload_service, 'run', side_effect=error()), \
+                        self.assertLogs('django.request', 'ERROR'):
+                    response = self.submit()
+
+                self.assertEqual(response.status_code, 503)
+                self.assertFalse(Application.objects.exists())
+                self.assertEqual(self.stored_files(), files_before)
+
+    def test_qr_is_rendered_before_the_transaction(self):
+        # The test case's own transactions are open throughout; the view must not add one around the render
+        outer_blocks = len(connection.atomic_blocks)
+        blocks_during_render = []
+
+        def run(fn, *args):
+            blocks_during_render.append(len(connection.atomic_blocks))
+            return fn(*args)
+
+        with mock.patch.object(offload_service, 'run', side_effect=run), \
+                mock.patch('registry.views.sms_service.send_application_submission_sms',
+                           return_value={'success': True, 'message': 'sent'}):
+            response = self.submit()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(blocks_during_render, [outer_blocks])
+        self.assertTrue(Application.objects.get().qr_code)
+
+
+class RegisterOffloadTests(RegistryTestCase):
+    """[user-047] A saturated pool during registration is a 503 without internals, and creates no user"""
+
+    def test_busy_password_hashing_is_a_503(self):
+        payload = {
+            'username': 'newcomer', 'email': 'newcomer@example.com', 'full_name': 'New Comer',
+            'phone_number': '+263771000002', 'password': 'a-long-Passw0rd!',
+        }
+        with mock.patch.object(offload_service, 'run', side_effect=OffloadBusy()), \
+                self.assertLogs('django.request', 'ERROR'):
+            response = self.client.post('/api/register/', payload, format='json')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'detail': OffloadBusy.default_detail})
+        self.assertFalse(User.objects.filter(email='newcomer@example.com').exists())
+
+
+class SubmissionSMSTests(RegistryTestCase):
+    """[user-038] The async submission view sends its SMS before responding, under WSGI and ASGI alike"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User.objects.create(username='clerk', email='clerk@example.com', full_name='Clerk One')
+        # Signed in as whichever user the anonymous fallback would not pick
+        cls.applicant = User.objects.order_by('-pk').first()
+
+    def setUp(self):
+        super().setUp()
+        self.delivered = []
+
+        async def deliver(user, application):
+            # A gateway round trip: a send left running after the response would not get past it
+            await asyncio.sleep(0.05)
+            self.delivered.append(application.pk)
+            return {'success': True, 'message': 'sent'}
+
+        patcher = mock.patch.object(async_views.sms_service, 'asend_application_submission_sms', side_effect=deliver)
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.token = str(RegistryRefreshToken.for_user(self.applicant).access_token)
+
+    def request(self, factory):
+        return factory.post(
+            '/api/applications/',
+            json.dumps({'document_type': str(self.document_type.pk), 'branch': str(self.branch.pk)}),
+            content_type='application/json', headers={'Authorization': f'Bearer {self.token}'},
+        )
+
+    def assert_sent(self, response):
+        self.assertEqual(response.status_code, 201)
+        application = Application.objects.get()
+        self.assertEqual(application.user, self.applicant)
+        self.assertEqual(self.delivered, [application.pk])
+
+    def test_sms_is_sent_under_wsgi(self):
+        # runserver and WSGI servers run async views through async_to_sync
+        response = async_to_sync(async_views.applications)(self.request(RequestFactory()))
+        self.assert_sent(response)
+
+    async def test_sms_is_sent_under_asgi(self):
+        response = await async_views.applications(self.request(AsyncRequestFactory()))
+        await sync_to_async(self.assert_sent)(response)
+
+    def test_sync_create_assigns_the_signed_in_user(self):
+        self.client.force_authenticate(self.applicant)
+        with mock.patch('registry.views.sms_service.send_application_submission_sms',
+                        return_value={'success': True, 'message': 'sent'}):
+            response = self.client.post('/api/applications/', {
+                'document_type': str(self.document_type.pk), 'branch': str(self.branch.pk),
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Application.objects.get().user, self.applicant)
+
+
+class StatusSMSTests(RegistryTestCase):
+    """[user-042] Status SMS coalescing and delivery by send_due_status_sms"""
+
+    def setUp(self):
+        super().setUp()
+        self.application = Application.objects.create(
+            user=self.user, document_type=self.document_type, branch=self.branch
+        )
+        patcher = mock.patch.object(
+            status_sms.sms_service, 'send_application_status_sms', return_value={'success': True, 'message': 'sent'}
+        )
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sent_immediately_by_default(self):
+        status_sms.queue_status_sms(self.application, 'submitted', 'review')
+        self.send.assert_called_once_with(self.user, self.application, 'submitted', 'review')
+        self.assertFalse(PendingStatusSMS.objects.exists())
+
+    @override_settings(STATUS_SMS_COALESCE_SECONDS=60)
+    def test_changes_inside_the_window_send_one_sms_with_the_latest_status(self):
+        status_sms.queue_status_sms(self.application, 'review', 'approved')
+        status_sms.queue_status_sms(self.application, 'approved', 'printed')
+        status_sms.queue_status_sms(self.application, 'printed', 'ready')
+
+        pending = PendingStatusSMS.objects.get()
+        self.assertEqual((pending.from_status, pending.status, pending.changes), ('review', 'ready', 3))
+        self.send.assert_not_called()
+
+        self.assertEqual(status_sms.send_due_status_sms(), (0, 0, 0))
+        self.assertEqual(status_sms.send_due_status_sms(now=pending.send_after), (1, 0, 0))
+        self.send.assert_called_once_with(
+            self.user, mock.ANY, 'review', 'ready', retries=status_sms.sms_service.max_retries
+        )
+        self.assertFalse(PendingStatusSMS.objects.exists())
+
+    @override_settings(STATUS_SMS_COALESCE_SECONDS=60)
+    def test_change_undone_inside_the_window_is_not_sent(self):
+        status_sms.queue_status_sms(self.application, 'review', 'rejected')
+        status_sms.queue_status_sms(self.application, 'rejected', 'review')
+
+        pending = PendingStatusSMS.objects.get()
+        self.assertEqual(status_sms.send_due_status_sms(now=pending.send_after), (0, 1, 0))
+        self.send.assert_not_called()
+
+    @override_settings(STATUS_SMS_COALESCE_SECONDS=60, STATUS_SMS_RETRY_SECONDS=60, STATUS_SMS_MAX_ATTEMPTS=2)
+    def test_failed_send_stays_queued_until_the_last_attempt(self):
+        self.send.return_value = {'success': False, 'message': 'provider down'}
+        status_sms.queue_status_sms(self.application, 'review', 'approved')
+        due = PendingStatusSMS.objects.get().send_after
+
+        with self.assertLogs('registry.status_sms', 'WARNING'):
+            self.assertEqual(status_sms.send_due_status_sms(now=due), (0, 0, 1))
+        retry = PendingStatusSMS.objects.get()
+        self.assertEqual((retry.from_status, retry.status, retry.attempts), ('review', 'approved', 1))
+        self.assertEqual(retry.send_after, due + timedelta(seconds=60))
+
+        with self.assertLogs('registry.status_sms', 'ERROR'):
+            self.assertEqual(status_sms.send_due_status_sms(now=retry.send_after), (0, 0, 1))
+        self.assertFalse(PendingStatusSMS.objects.exists())
+
+    @override_settings(STATUS_SMS_COALESCE_SECONDS=60)
+    def test_failed_send_merges_into_a_newer_change(self):
+        status_sms.queue_status_sms(self.application, 'review', 'approved')
+        due = PendingStatusSMS.objects.get().send_after
+
+        def send_while_the_status_moves_on(*args, **kwargs):
+            status_sms.queue_status_sms(self.application, 'approved', 'printed')
+            return {'success': False, 'message': 'provider down'}
+        self.send.side_effect = send_while_the_status_moves_on
+
+        with self.assertLogs('registry.status_sms', 'WARNING'):
+            status_sms.send_due_status_sms(now=due)
+        pending = PendingStatusSMS.objects.get()
+        self.assertEqual((pending.from_status, pending.status, pending.changes), ('review', 'printed', 2))
+
+    @override_settings(STATUS_SMS_COALESCE_SECONDS=60, STATUS_SMS_OVERDUE_SECONDS=300)
+    def test_backlog_left_by_a_stopped_worker_is_logged(self):
+        status_sms.queue_status_sms(self.application, 'review', 'approved')
+        PendingStatusSMS.objects.update(send_after=F('send_after') - timedelta(hours=1))
+        other = Application.objects.create(user=self.user, document_type=self.document_type, branch=self.branch)
+
+        with self.assertLogs('registry.status_sms', 'ERROR'):
+            status_sms.queue_status_sms(other, 'review', 'approved')
+
+
+class PruneNotificationsTests(RegistryTestCase):
+    """[user-035] Batched pruning, and --summarize summaries that survive later runs"""
+
+    def notify(self, count, is_read, days_old):
+        Notification.objects.bulk_create([
+            Notification(user=self.user, title='Update', message='Status changed', is_read=is_read)
+            for _ in range(count)
+        ])
+        Notification.objects.filter(created_at__gte=timezone.now() - timedelta(minutes=1)).update(
+            created_at=timezone.now() - timedelta(days=days_old)
+        )
+
+    def prune(self, *args):
+        call_command('prune_notifications', '--days=30', '--max-unread=3', '--batch-size=2', *args, stdout=io.StringIO())
+
+    def test_prunes_in_batches_and_keeps_one_summary(self):
+        self.notify(5, is_read=True, days_old=60)
+        self.notify(4, is_read=False, days_old=1)
+        self.notify(1, is_read=True, days_old=1)
+
+        self.prune('--summarize')
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 3)
+        summary = Notification.objects.get(type='cleanup_summary')
+        self.assertIn('5 read notifications', summary.message)
+        self.assertEqual(Notification.objects.count(), 3 + 1 + 1)
+
+        # Long after: the old summary is neither pruned nor counted, just replaced
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=90))
+        self.prune('--summarize')
+        summary = Notification.objects.get(type='cleanup_summary')
+        self.assertIn('1 read notification ', summary.message)
+
+
+class StatusAnalyticsTests(RegistryTestCase):
+    """[user-036] Status analytics on a database without a dwell-time expression answer 501, not 500"""
+
+    def test_unsupported_database_is_a_501(self):
+        admin = User.objects.create(username='admin', email='admin@example.com', full_name='Admin', is_admin=True)
+        self.client.force_authenticate(admin)
+        with mock.patch.dict(analytics.DWELL_SECONDS, clear=True), self.assertLogs('django.request', 'ERROR'):
+            response = self.client.get('/api/analytics/status-durations/')
+        self.assertEqual(response.status_code, 501)
+        self.assertIn('not available', response.json()['detail'])
+
+    def test_databases_without_status_history_triggers_are_a_501(self):
+        postgres = mock.Mock(vendor='postgresql')
+        with mock.patch.object(analytics, 'connections', {'default': postgres}):
+            with self.assertRaises(analytics.AnalyticsUnavailable):
+                analytics.status_dwell_times(timezone.now() - timedelta(days=1), timezone.now())
+        postgres.cursor.assert_not_called()
+
+
+class SlowQueryTests(TestCase):
+    """[user-050] Queries at or over SLOW_QUERY_MS are logged on every connection, whatever its backend"""
+
+    def test_only_queries_over_the_threshold_are_logged(self):
+        def execute(sql, params, many, context):
+            clock.return_value += 0.25
+
+        with mock.patch('registry.slow_queries.time.perf_counter', return_value=0.0) as clock:
+            with self.assertLogs('registry.slow_queries', 'WARNING') as logs:
+                slow_queries.SlowQueryRecorder('default', 250)(execute, 'SELECT %s', [1], False, {})
+            with self.assertNoLogs('registry.slow_queries'):
+                slow_queries.SlowQueryRecorder('default', 251)(execute, 'SELECT %s', [1], False, {})
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['alias'], entry['ms'], entry['sql']), ('default', 250.0, 'SELECT %s'))
+
+    @override_settings(SLOW_QUERY_MS=200)
+    def test_every_alias_and_backend_gets_the_recorder(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        other = DatabaseWrapper({**connection.settings_dict, 'NAME': ':memory:'}, alias='replica')
+        self.addCleanup(other.close)
+        other.ensure_connection()
+        other.ensure_connection()
+
+        recorders = [
+            wrapper for wrapper in other.execute_wrappers if isinstance(wrapper, slow_queries.SlowQueryRecorder)
+        ]
+        self.assertEqual([recorder.alias for recorder in recorders], ['replica'])
+
+        slow_queries.uninstall(other)
+        other.close()
+        other.ensure_connection()
+        self.assertFalse(any(isinstance(wrapper, slow_queries.SlowQueryRecorder) for wrapper in other.execute_wrappers))
+
+
+@override_settings(SMS_COST_PER_SEGMENT='0.0500')
+class SMSTemplateTests(TestCase):
+    """[user-041] SMS encoding, segment and cost accounting, and segment budgets"""
+
+    def test_encoding_and_segments(self):
+        cases = [
+            ('a' * 160, 'GSM-7', 160, 1),
+            ('a' * 161, 'GSM-7', 161, 2),
+            ('€' * 80, 'GSM-7', 160, 1),
+            ('a' * 152 + '€' + 'a' * 10, 'GSM-7', 164, 2),
+            ('ó' * 70, 'UCS-2', 70, 1),
+            ('ó' * 71, 'UCS-2', 71, 2),
+            ('🎉' * 35, 'UCS-2', 70, 1),
+        ]
+        for text, encoding, units, segments in cases:
+            with self.subTest(text=text[:12], units=units):
+                message = sms_templates.RenderedSMS(text)
+                self.assertEqual((message.encoding, message.units, message.segments), (encoding, units, segments))
+        self.assertEqual(sms_templates.RenderedSMS('a' * 161).cost, Decimal('0.1000'))
+
+    def test_values_are_rewritten_into_gsm7(self):
+        self.assertEqual(sms_templates.to_gsm7('“Zoë” – Ólafsdóttir 🎉'), '"Zoe" - Olafsdottir ')
+
+        message = sms_templates.get_template('welcome', 'gsm7').render(name='Ólafur 🎉')
+        self.assertEqual(message.encoding, 'GSM-7')
+        self.assertIn('Olafur', message.text)
+
+    def test_optional_fields_are_dropped_to_stay_within_budget(self):
+        template = sms_templates.SMSTemplate('test', '{body}{extra}{more}', max_segments=1, optional=('more', 'extra'))
+
+        message = template.render(body='a' * 100, extra='b' * 50, more='c' * 50)
+        self.assertEqual(message.dropped, ('more',))
+        self.assertEqual(message.segments, 1)
+
+        with self.assertRaises(sms_templates.SegmentBudgetExceeded):
+            template.render(body='a' * 200, extra='', more='')
+
+    def test_templates_are_checked_when_defined(self):
+        with self.assertRaises(ValueError):
+            sms_templates.SMSTemplate('test', '🎉 {name}', max_segments=1)
+        with self.assertRaises(ValueError):
+            sms_templates.SMSTemplate('test', '{amount:.2f}', max_segments=1)
+
+
+class DeferredImportTests(TestCase):
+    """[user-048] twilio, libmagic, qrcode and Pillow are not imported until first use"""
+
+    def test_worker_boot_leaves_heavy_packages_unimported(self):
+        report = (
+            "import json, sys; "
+            f"print(json.dumps(sorted({{name.split('.')[0] for name in sys.modules}} & set({DEFERRED_PACKAGES!r}))))"
+        )
+        completed = subprocess.run(
+            [sys.executable, '-c', f'{WORKER_BOOT}; {report}'], cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr[-2000:])
+        self.assertEqual(json.loads(completed.stdout.splitlines()[-1]), [])
+
+    def test_importtime_parsing(self):
+        rows = parse_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     qrcode.constants\n'
+            'import time:       300 |        420 |   qrcode\n'
+            'import time:        80 |        500 | registry.utils\n'
+        )
+        self.assertEqual(rows, [
+            (120, 120, 2, 'qrcode.constants'), (300, 420, 1, 'qrcode'), (80, 500, 0, 'registry.utils'),
+        ])
+        self.assertEqual(importer_chain(rows, 0), ['qrcode.constants', 'qrcode', 'registry.utils'])
+
+
+class SMSRetryTests(TestCase):
+    """[user-044] Sends on the request path make one attempt; background senders retry"""
+
+    def setUp(self):
+        from .sms_service import SMSProviderError, SMSService
+
+        self.service = SMSService()
+        self.service.from_number = '+15005550006'
+        self.service.backoff_base = 0
+        self.create = mock.Mock(side_effect=SMSProviderError(503, 'Service Unavailable'))
+        self.service.client = mock.Mock(messages=mock.Mock(create=self.create))
+
+    def test_request_path_send_is_not_retried(self):
+        with self.assertLogs('registry.sms_service', 'ERROR'):
+            result = self.service.send_sms('+263771000001', 'Hello')
+        self.assertFalse(result['success'])
+        self.assertEqual(self.create.call_count, 1)
+
+    def test_background_send_retries_transient_failures(self):
+        with self.assertLogs('registry.sms_service', 'ERROR'):
+            result = self.service.send_sms('+263771000001', 'Hello', retries=2)
+        self.assertFalse(result['success'])
+        self.assertEqual(self.create.call_count, 3)
@@ -0,0 +1,87 @@
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from .filetypes import HEAD_SIZE, StructureCheck
+from .security import SecurityValidator
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """
+    Validate attachments while a multipart request streams in.
+
+    Runs ahead of Django's memory/temporary-file handlers and passes every
+    chunk on unchanged. The type is checked as soon as the first
+    HEAD_SIZE bytes of a file arrive and the size on every chunk, so a bad
+    upload stops the parse there instead of after the whole body has been
+    buffered; the file's structure (registry.filetypes.StructureCheck) is
+    checked once it ends. Problems are collected in `errors`, keyed by the
+    file's position in the request.
+    """
+    MAX_FILES = 10
+
+    def __init__(self, request=None, field_name='files'):
+        super().__init__(request)
+        self.watched_field = field_name
+        self.errors = {}
+        self.count = 0
+        self.head = None
+        self.mime_type = None
+        self.structure = None
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.mime_type = None
+        if field_name != self.watched_field:
+            self.head = None
+            self.structure = None
+            return
+        self.count += 1
+        self.head = b''
+        self.structure = StructureCheck()
+        if self.count > self.MAX_FILES:
+            self._reject(f'At most {self.MAX_FILES} files can be attached to one application.')
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.structure is None:
+            return raw_data
+        self.structure.feed(raw_data)
+        if start + len(raw_data) > SecurityValidator.MAX_FILE_SIZE:
+            self._reject(
+                f'File too large. Maximum size: {SecurityValidator.MAX_FILE_SIZE / (1024*1024):.1f}MB'
+            )
+        if len(self.head) < HEAD_SIZE:
+            self.head += raw_data[:HEAD_SIZE - len(self.head)]
+            if len(self.head) >= HEAD_SIZE:
+                self._check_head()
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.head is not None and len(self.head) < HEAD_SIZE:
+            # Files shorter than HEAD_SIZE are checked once they end
+            if not self.head:
+                self.errors[self.count - 1] = 'The submitted file is empty.'
+            else:
+                try:
+                    self.mime_type = SecurityValidator.check_file_header(self.file_name, self.head)
+                except ValidationError as e:
+                    self.errors[self.count - 1] = e.messages[0]
+        if self.structure is not None and self.mime_type:
+            problem = self.structure.problem(self.mime_type)
+            if problem:
+                self.errors[self.count - 1] = problem
+        self.head = None
+        self.structure = None
+        return None
+
+    def _check_head(self):
+        try:
+            self.mime_type = SecurityValidator.check_file_header(self.file_name, self.head)
+        except ValidationError as e:
+            self._reject(e.messages[0])
+
+    def _reject(self, message):
+        self.errors[self.count - 1] = message
+        self.head = None
+        self.structure = None
+        # Read and discard the rest of the body so the client still gets the 400
+        raise StopUpload(connection_reset=False)
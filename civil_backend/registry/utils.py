@@ -1,7 +1,7 @@
-import qrcode
 from io import BytesIO
 from django.core.files import File
 import math, random
+from .offload import offload_service
 
 def generate_reference_number(reference_name):
     prefix = (reference_name[:2] if reference_name and len(reference_name) >= 2 else "NA")
@@ -10,9 +10,16 @@ def generate_reference_number(reference_name):
         reference_number += random.choice('1234567890ABCDEFGHIJKLMNOPQRSTUVWXYZ')
     return reference_number.upper()
 
-def generate_qr_code(reference_number):
+def render_qr_png(reference_number):
+    # qrcode pulls in PIL; imported here so loading the models does not pay for it
+    import qrcode
+
     qr = qrcode.make(str(reference_number))
     buffer = BytesIO()
     qr.save(buffer, format='PNG')
-    buffer.seek(0)
-    return File(buffer, name=f'{reference_number}.png')
\ No newline at end of file
+    return buffer.getvalue()
+
+def generate_qr_code(reference_number):
+    # Rendering is pure Python and holds the GIL, so it runs in the shared process pool
+    buffer = BytesIO(offload_service.run(render_qr_png, reference_number))
+    return File(buffer, name=f'{reference_number}.png')
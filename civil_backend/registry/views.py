@@ -2,29 +2,208 @@ from rest_framework import viewsets, generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import RegistryBranch
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
+from rest_framework.serializers import ListSerializer
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import RegistryRefreshToken
 from .models import User, DocumentType, Application, Attachment, RegistryBranch, Notification
 from .serializers import UserSerializer, DocumentTypeSerializer, ApplicationSerializer, AttachmentSerializer, RegistryBranchSerializer, NotificationSerializer
 from .sms_service import sms_service
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework import status as drf_status
 from .serializers import ApplicationStatusSerializer
+from .models import ArchivedApplication, ApplicationStatusEvent
+from .serializers import ArchivedApplicationSerializer, ArchivedApplicationStatusSerializer
+from .serializers import ApplicationStatusEventSerializer
+from .analytics import GROUP_COLUMNS, status_dwell_times
+from .queue import queue_details, queue_positions
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+from datetime import datetime, time as dt_time, timedelta
+import uuid
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
 from .security import SecurityValidator
+from .permissions import IsRegistryAdmin
+from .search import search_application_ids
+from .changes import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, changes_since, cursor_expired, decode_cursor, encode_cursor,
+    ensure_change_log, latest_seq,
+)
+from .conditional import (
+    collection_etag, evaluate_preconditions, representation_variant, resource_etag, set_validators, version_digest,
+)
+from .idempotency import idempotent
+from .status_sms import queue_status_sms
+from .phone import to_e164
+from .uploads import AttachmentUploadHandler
+from .labels import application_labels, stream_label_sheet
+from .offload import OffloadUnavailable
+from . import db_routers
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.core.files.storage import default_storage
+from django.db import transaction
+from rest_framework.parsers import MultiPartParser
+from django.db.models import F
 import logging
 
 # Security logger
 security_logger = logging.getLogger('django.security')
 
-class UserViewSet(viewsets.ModelViewSet):
+
+def fallback_applicant():
+    """The user anonymous submissions are filed under until submissions require sign-in"""
+    return User.objects.order_by('pk').first() or User.objects.create(
+        username='default_user', email='default@example.com', full_name='Default User'
+    )
+
+
+def submitting_user(request):
+    return request.user if request.user.is_authenticated else fallback_applicant()
+
+
+class SparseFieldsetViewMixin:
+    """Pass ?fields= / ?expand= to the serializer and load only the columns it renders"""
+
+    # Actions rendered with the serializer's compact list representation
+    compact_actions = ('list',)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None and self.request.method in SAFE_METHODS:
+            params = self.request.query_params
+            context['fields'] = [name for name in params.get('fields', '').split(',') if name]
+            context['expand'] = [name for name in params.get('expand', '').split(',') if name]
+            context['compact'] = self.action in self.compact_actions
+        return context
+
+    def get_sparse_queryset(self, queryset):
+        # Writes validate and save whole rows, so only trim reads
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return queryset
+
+        serializer = self.get_serializer()
+        columns = serializer.get_queryset_columns()
+        related = sorted({column.split('__')[0] for column in columns if '__' in column})
+        prefetch = [field.source for field in serializer.fields.values() if isinstance(field, ListSerializer)]
+
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset.only(*columns)
+
+
+class ConditionalViewMixin:
+    """
+    ETag / Last-Modified validators built from `version_field`.
+
+    A single row is validated with a one-row query before anything is
+    serialized, so unchanged resources answer 304 and stale If-Match writes
+    412. Lists carry the same version columns in their own query and answer
+    304 before serializing. `version_related_fields` lists related columns
+    the representation renders, so edits to those rows change the tag too,
+    and the ?fields= / ?expand= variant is part of every tag.
+    """
+    version_field = 'updated_at'
+    version_related_fields = ()
+
+    def get_object_version(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        row = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values_list(
+            'pk', self.version_field, *self.version_related_fields
+        ).first()
+        if row is None:
+            return None
+        pk, updated_at, *related = row
+        etag = resource_etag(
+            pk, updated_at, version_digest(related) if related else '',
+            representation_variant(self.request.query_params),
+        )
+        return etag, updated_at
+
+    def _version_columns(self):
+        columns = (self.version_field, *self.version_related_fields)
+        return {f'etag_version_{index}': F(column) for index, column in enumerate(columns)}
+
+    def annotate_versions(self, queryset):
+        """Select the version columns in the list's own query"""
+        return queryset.annotate(**self._version_columns())
+
+    def get_rows_version(self, rows):
+        names = list(self._version_columns())
+        row_versions = [(row.pk, *(getattr(row, name) for name in names)) for row in rows]
+        last_updated = max((version[1] for version in row_versions if version[1]), default=None)
+        return collection_etag(row_versions, representation_variant(self.request.query_params)), last_updated
+
+    def use_collection_validators(self):
+        """Lists that render values derived from other rows cannot be validated by their own rows"""
+        return True
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_collection_validators():
+            return super().list(request, *args, **kwargs)
+        queryset = self.annotate_versions(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        # A paged list is validated by the rows of its page; the paginator has counted the rest already
+        rows = list(queryset) if page is None else page
+        version = self.get_rows_version(rows)
+        precondition = evaluate_preconditions(request, *version)
+        if precondition is not None:
+            return precondition
+
+        serializer = self.get_serializer(rows, many=True)
+        if page is not None:
+            return set_validators(self.get_paginated_response(serializer.data), *version)
+        return set_validators(Response(serializer.data), *version)
+
+    def retrieve(self, request, *args, **kwargs):
+        version = self.get_object_version()
+        if version is None:
+            return super().retrieve(request, *args, **kwargs)
+        precondition = evaluate_preconditions(request, *version)
+        if precondition is not None:
+            return precondition
+        return set_validators(super().retrieve(request, *args, **kwargs), *version)
+
+    def update(self, request, *args, **kwargs):
+        version = self.get_object_version()
+        if version is not None:
+            precondition = evaluate_preconditions(request, *version)
+            if precondition is not None:
+                return precondition
+
+        response = super().update(request, *args, **kwargs)
+        version = self.get_object_version()
+        if version is not None and status.is_success(response.status_code):
+            set_validators(response, *version)
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        version = self.get_object_version()
+        if version is not None:
+            precondition = evaluate_preconditions(request, *version)
+            if precondition is not None:
+                return precondition
+        return super().destroy(request, *args, **kwargs)
+
+
+class UserViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('username')
     serializer_class = UserSerializer
     permission_classes = [AllowAny]  # Temporarily allow access for testing
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        phone = self.request.query_params.get('phone') if self.request is not None else None
+        if phone:
+            # Any spelling of the number matches through the indexed E.164 column
+            queryset = queryset.filter(phone_e164=to_e164(phone)) if to_e164(phone) else queryset.none()
+        return self.get_sparse_queryset(queryset)
+
 class DocumentTypeViewSet(viewsets.ModelViewSet):
     queryset = DocumentType.objects.all().order_by('name')
     serializer_class = DocumentTypeSerializer
@@ -35,31 +214,55 @@ class RegistryBranchViewSet(viewsets.ModelViewSet):
     serializer_class = RegistryBranchSerializer
     permission_classes = [AllowAny]  # Temporarily allow access for testing
 
-class ApplicationViewSet(viewsets.ModelViewSet):
+class ApplicationViewSet(ConditionalViewMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Application.objects.all().order_by('-created_at')
     serializer_class = ApplicationSerializer
     permission_classes = [AllowAny]  # Temporarily allow access for testing
+    compact_actions = ('list', 'search')
+    # Related columns the representation renders: the applicant (summary or ?expand=user), document type and branch
+    version_related_fields = (
+        'user__username', 'user__full_name', 'user__first_name', 'user__last_name', 'user__email',
+        'user__phone_number', 'user__is_admin', 'user__date_of_birth', 'user__gender', 'user__address',
+        'user__sms_notifications_enabled', 'document_type__updated_at', 'branch__updated_at',
+    )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.wants_own_applications():
+            if not self.request.user.is_authenticated:
+                return queryset.none()
+            queryset = queryset.filter(user=self.request.user)
+        return self.get_sparse_queryset(queryset)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'submit':
+            # Installed before anything reads the body so attachments are checked as they stream in
+            self.upload_validator = AttachmentUploadHandler(request)
+            request.upload_handlers.insert(0, self.upload_validator)
+        return request
+
+    def wants_own_applications(self):
+        # ?mine=1: the citizen's own applications, with queue position and estimated ready date
+        return self.action == 'list' and self.request.query_params.get('mine') in ('1', 'true')
+
+    def use_collection_validators(self):
+        # Queue positions move when other applicants' rows change
+        return not self.wants_own_applications()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.wants_own_applications() and args:
+            applications = list(args[0])
+            kwargs.setdefault('context', self.get_serializer_context())
+            kwargs['context']['queue_positions'] = queue_positions(applications)
+            args = (applications, *args[1:])
+        return super().get_serializer(*args, **kwargs)
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         try:
-            # For now, we'll create a default user or get the first user
-            # In a real app, this should come from authentication
-            try:
-                user = User.objects.first()
-                if not user:
-                    # Create a default user if none exists
-                    user = User.objects.create(
-                        username='default_user',
-                        email='default@example.com',
-                        full_name='Default User'
-                    )
-            except Exception as e:
-                print(f"Error getting user: {str(e)}")
-                return Response(
-                    {'error': 'No user available for application creation'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
+            user = submitting_user(request)
+
             # Create the application manually with the user
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
@@ -75,21 +278,13 @@ class ApplicationViewSet(viewsets.ModelViewSet):
             response_serializer = self.get_serializer(application)
             
             # Send SMS when application is submitted
-            try:
-                sms_result = sms_service.send_application_submission_sms(
-                    application.user, 
-                    application
-                )
-                if sms_result['success']:
-                    print(f"Submission SMS sent successfully to {application.user.phone_number}")
-                else:
-                    print(f"Submission SMS failed: {sms_result['message']}")
-            except Exception as e:
-                print(f"Error sending submission SMS: {str(e)}")
-                # Don't fail the application creation if SMS fails
+            self.send_submission_sms(application)
             
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
             
+        except OffloadUnavailable:
+            # Pool saturated or QR render timed out: a retryable 503, not a server error
+            raise
         except Exception as e:
             print(f"Error creating application: {str(e)}")
             return Response(
@@ -97,18 +292,181 @@ class ApplicationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    def update(self, request, *args, **kwargs):
-        instance = self.get_object()
-        old_status = instance.status
-        
-        response = super().update(request, *args, **kwargs)
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    @idempotent
+    def submit(self, request):
+        """
+        Create an application and all its attachments from one multipart request.
+
+        Fields: document_type, branch, one or more `files` and optional
+        `descriptions` in the same order. Files are validated while they
+        upload; nothing is saved unless every file passes.
+        """
+        request.data  # parse the body, running AttachmentUploadHandler over each file
+        if self.upload_validator.errors:
+            return Response({'files': self._indexed_errors(self.upload_validator.errors)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        files = request.FILES.getlist('files')
+        descriptions = request.data.getlist('descriptions')
+        if not files:
+            return Response({'files': ['At least one file is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        if len(descriptions) > len(files):
+            return Response({'descriptions': ['There are more descriptions than files.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        description_limit = Attachment._meta.get_field('description').max_length
+        too_long = {index: f'Ensure this field has no more than {description_limit} characters.'
+                    for index, description in enumerate(descriptions) if len(description) > description_limit}
+        if too_long:
+            return Response({'descriptions': self._indexed_errors(too_long)}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = submitting_user(request)
+
+        application = Application(
+            user=user,
+            document_type=serializer.validated_data['document_type'],
+            branch=serializer.validated_data['branch'],
+        )
+        # The render can wait on the offload pool; do it before BEGIN IMMEDIATE takes the write lock
+        application.render_qr_code()
+
+        stored = []
+        try:
+            with transaction.atomic():
+                application.save(force_insert=True)
+                if application.qr_code:
+                    stored.append(application.qr_code.name)
+                attachments = []
+                for index, upload in enumerate(files):
+                    attachment = Attachment(
+                        application=application,
+                        description=descriptions[index] if index < len(descriptions) else '',
+                    )
+                    attachment.file.save(SecurityValidator.generate_secure_filename(upload.name), upload, save=False)
+                    stored.append(attachment.file.name)
+                    attachments.append(attachment)
+                Attachment.objects.bulk_create(attachments)
+        except Exception:
+            # The rows were rolled back; do not leave their files behind
+            for name in stored:
+                default_storage.delete(name)
+            raise
+
+        self.send_submission_sms(application)
+        application = Application.objects.select_related(
+            'user', 'document_type', 'branch'
+        ).prefetch_related('attachments').get(pk=application.pk)
+        return Response(self.get_serializer(application).data, status=status.HTTP_201_CREATED)
+
+    def _indexed_errors(self, errors):
+        return {str(index): [message] for index, message in sorted(errors.items())}
+
+    def send_submission_sms(self, application):
+        try:
+            sms_result = sms_service.send_application_submission_sms(
+                application.user, 
+                application
+            )
+            if sms_result['success']:
+                print(f"Submission SMS sent successfully to {application.user.phone_number}")
+            else:
+                print(f"Submission SMS failed: {sms_result['message']}")
+        except Exception as e:
+            print(f"Error sending submission SMS: {str(e)}")
+            # Don't fail the application creation if SMS fails
+
+    @idempotent
+    def partial_update(self, request, *args, **kwargs):
+        # Status changes notify the citizen, so a retried PATCH must not run twice
+        return super().partial_update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        # The serializer holds the instance DRF actually saves; compare against it
+        old_status = serializer.instance.status
+        application = serializer.save()
         
         # Create notification if status changed
-        if old_status != instance.status:
-            self.create_status_notification(instance, old_status, instance.status)
-        
-        return response
+        if old_status != application.status:
+            self.create_status_notification(application, old_status, application.status)
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Status transitions of one application, oldest first"""
+        application = self.get_object()
+        events = ApplicationStatusEvent.objects.filter(application_id=application.pk).order_by('id')
+        return Response(ApplicationStatusEventSerializer(events, many=True).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsRegistryAdmin])
+    def search(self, request):
+        """Ranked full-text search by applicant, national ID, phone, reference, document type or branch"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'detail': 'Search query "q" is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', 20)), 1), 100)
+        except ValueError:
+            return Response({'detail': 'page and page_size must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids, has_next = search_application_ids(query, page_size, (page - 1) * page_size)
+        applications = self.get_sparse_queryset(Application.objects.filter(id__in=ids))
+        # Keep the index ranking, which the IN lookup does not preserve
+        by_id = {application.id: application for application in applications}
+        ranked = [by_id[application_id] for application_id in ids if application_id in by_id]
+
+        serializer = self.get_serializer(ranked, many=True)
+        return Response({
+            'query': query,
+            'page': page,
+            'page_size': page_size,
+            'has_next': has_next,
+            'results': serializer.data,
+        })
     
+    @action(detail=False, methods=['post'], url_path='qr-labels', permission_classes=[IsRegistryAdmin])
+    def qr_labels(self, request):
+        """
+        Printable PDF sheet of QR labels, streamed page by page.
+
+        Takes `ids` (application ids) or `status` with an optional `branch`;
+        labels are ordered by branch and reference number.
+        """
+        applications = Application.objects.select_related('user', 'document_type', 'branch')
+        ids = request.data.get('ids')
+        if ids:
+            try:
+                applications = applications.filter(id__in=[uuid.UUID(str(value)) for value in ids])
+            except (TypeError, ValueError):
+                return Response({'detail': 'ids must be a list of application ids.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        elif request.data.get('status') in dict(Application.STATUS_CHOICES):
+            applications = applications.filter(status=request.data['status'])
+            if request.data.get('branch'):
+                try:
+                    applications = applications.filter(branch_id=uuid.UUID(str(request.data['branch'])))
+                except ValueError:
+                    return Response({'detail': 'Invalid branch id.'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            return Response({'detail': 'Provide application "ids", or a valid "status" and optional "branch".'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        limit = settings.QR_LABEL_MAX_BATCH
+        applications = list(applications.order_by('branch__name', 'reference_number')[:limit + 1])
+        if not applications:
+            return Response({'detail': 'No applications match.'}, status=status.HTTP_404_NOT_FOUND)
+        if len(applications) > limit:
+            return Response({'detail': f'At most {limit} labels per sheet; narrow the selection.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        sheet = stream_label_sheet(application_labels(applications))
+        response = StreamingHttpResponse(sheet, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="qr-labels-{timezone.now():%Y%m%d-%H%M%S}.pdf"'
+        return response
+
     def create_status_notification(self, application, old_status, new_status):
         notification_type = 'status_update'
         title = f"Application Status Updated"
@@ -134,15 +492,12 @@ class ApplicationViewSet(viewsets.ModelViewSet):
             message=message
         )
         
-        # Send SMS notification
+        # Queue the SMS; further changes within the coalescing window are merged into it
         try:
-            sms_result = sms_service.send_application_status_sms(
-                application.user, 
-                application, 
-                old_status, 
-                new_status
-            )
-            if sms_result['success']:
+            sms_result = queue_status_sms(application, old_status, new_status)
+            if sms_result is None:
+                print(f"Status SMS queued for {application.user.phone_number}")
+            elif sms_result['success']:
                 print(f"SMS sent successfully to {application.user.phone_number}")
             else:
                 print(f"SMS failed: {sms_result['message']}")
@@ -154,7 +509,23 @@ class AttachmentViewSet(viewsets.ModelViewSet):
     serializer_class = AttachmentSerializer
     permission_classes = [AllowAny]  # Allow access for file uploads
 
-class NotificationViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        # Applications render their attachments, so each change is a new version of its application
+        serializer.save().application.touch()
+
+    def perform_update(self, serializer):
+        previous = serializer.instance.application
+        attachment = serializer.save()
+        previous.touch()
+        if attachment.application_id != previous.pk:
+            attachment.application.touch()
+
+    def perform_destroy(self, instance):
+        application = instance.application
+        instance.delete()
+        application.touch()
+
+class NotificationViewSet(ConditionalViewMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [AllowAny]  # Temporarily allow access for testing
@@ -163,7 +534,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
         # For anonymous users, return empty queryset
         if not self.request.user.is_authenticated:
             return Notification.objects.none()
-        return Notification.objects.filter(user=self.request.user)
+        return self.get_sparse_queryset(Notification.objects.filter(user=self.request.user))
     
     def perform_create(self, serializer):
         # Only allow creation for authenticated users
@@ -174,6 +545,97 @@ class NotificationViewSet(viewsets.ModelViewSet):
             pass
 
 
+class ArchivedApplicationViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only access to applications moved out by `archive_applications`.
+
+    Citizens see their own; registry staff see all. Filter with ?reference=
+    and ?status=, page with ?page= and ?page_size=.
+    """
+    queryset = ArchivedApplication.objects.all().order_by('-created_at')
+    serializer_class = ArchivedApplicationSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not IsRegistryAdmin().has_permission(self.request, self):
+            queryset = queryset.filter(user=self.request.user)
+
+        params = self.request.query_params
+        if params.get('reference'):
+            queryset = queryset.filter(reference_number=params['reference'])
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        return self.get_sparse_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', 50)), 1), 200)
+        except ValueError:
+            return Response({'detail': 'page and page_size must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        offset = (page - 1) * page_size
+        applications = list(self.get_queryset()[offset:offset + page_size + 1])
+        serializer = self.get_serializer(applications[:page_size], many=True)
+        return Response({
+            'page': page,
+            'page_size': page_size,
+            'has_next': len(applications) > page_size,
+            'results': serializer.data,
+        })
+
+
+class StatusDurationAnalyticsView(APIView):
+    """
+    Time spent in each status, from the application status history.
+
+    ?since= / ?until= (ISO date or datetime, default the last 90 days) bound
+    when the status was entered; ?branch= and ?document_type= filter by id;
+    ?group_by=branch|document_type splits the figures. Durations are seconds.
+    """
+    permission_classes = [IsRegistryAdmin]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            until = self._parse_moment(params.get('until'), timezone.now())
+            since = self._parse_moment(params.get('since'), until - timedelta(days=90))
+            branch = uuid.UUID(params['branch']) if params.get('branch') else None
+            document_type = uuid.UUID(params['document_type']) if params.get('document_type') else None
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        group_by = params.get('group_by') or None
+        if group_by and group_by not in GROUP_COLUMNS:
+            return Response({'detail': f'group_by must be one of: {", ".join(GROUP_COLUMNS)}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = status_dwell_times(since, until, branch, document_type, group_by)
+        return Response({'since': since, 'until': until, 'group_by': group_by, 'results': results})
+
+    def _parse_moment(self, value, default):
+        if not value:
+            return default
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f'Invalid date: {value}')
+            moment = datetime.combine(day, dt_time.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+
+class SMSStatusView(APIView):
+    """SMS provider circuit breaker state and send totals for this process"""
+    permission_classes = [IsRegistryAdmin]
+
+    def get(self, request):
+        return Response(sms_service.status())
+
+
 class RegisterView(generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
@@ -184,6 +646,8 @@ class RegisterView(generics.CreateAPIView):
             serializer = self.get_serializer(data=request.data)
             if serializer.is_valid():
                 user = serializer.save()
+                # The new user's first requests must not read from a replica that has not caught up
+                db_routers.pin_user(request, user)
                 
                 # Send welcome SMS (non-blocking)
                 try:
@@ -197,7 +661,7 @@ class RegisterView(generics.CreateAPIView):
                     # Don't fail registration if SMS fails
                 
                 # Generate JWT token
-                refresh = RefreshToken.for_user(user)
+                refresh = RegistryRefreshToken.for_user(user)
                 access_token = refresh.access_token
                 
                 return Response({
@@ -216,6 +680,9 @@ class RegisterView(generics.CreateAPIView):
                 # Return validation errors with 400 status
                 print(f"Validation errors: {serializer.errors}")
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except OffloadUnavailable:
+            # Password hashing found the offload pool saturated; DRF answers 503
+            raise
         except Exception as e:
             print(f"Registration error: {str(e)}")
             return Response({
@@ -252,7 +719,7 @@ class LoginView(APIView):
 
         user = authenticate(request, username=email, password=password)
         if user is not None:
-            refresh = RefreshToken.for_user(user)
+            refresh = RegistryRefreshToken.for_user(user)
             security_logger.info(f"Login successful for user: {user.email} from IP {client_ip}")
             return Response({
                 'refresh': str(refresh),
@@ -283,6 +750,79 @@ class RegistryBranchList(APIView):
         serializer = RegistryBranchSerializer(branches, many=True)
         return Response(serializer.data)
     
+class ChangeFeedView(APIView):
+    """
+    Delta sync: everything that changed since the client's cursor.
+
+    Call without a cursor after a full load to get a starting cursor, then
+    poll with ?cursor= and follow has_more. reset=true means the cursor is
+    too old (or missing) and the client should reload from the list endpoints.
+    Databases without the change log triggers answer 501.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        ensure_change_log()
+        cursor = request.query_params.get('cursor')
+        if not cursor:
+            return Response(self._payload(latest_seq(), has_more=False, reset=True))
+
+        try:
+            seq = decode_cursor(cursor)
+        except InvalidCursor as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if cursor_expired(seq):
+            return Response(self._payload(latest_seq(), has_more=False, reset=True))
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            limit = DEFAULT_PAGE_SIZE
+
+        all_applications = IsRegistryAdmin().has_permission(request, self)
+        changes = changes_since(request.user, seq, limit, all_applications=all_applications)
+
+        context = {
+            'request': request,
+            'compact': True,
+            'expand': [name for name in request.query_params.get('expand', '').split(',') if name],
+        }
+        applications = changes['applications'].select_related('user', 'document_type', 'branch')
+        if 'attachments' in context['expand']:
+            applications = applications.prefetch_related('attachments')
+        applications = ApplicationSerializer(applications, many=True, context=context).data
+        notifications = changes['notifications'].select_related('application')
+        notifications = NotificationSerializer(notifications, many=True, context=context).data
+
+        return Response(self._payload(
+            changes['seq'],
+            has_more=changes['has_more'],
+            reset=False,
+            applications=applications,
+            application_ids=changes['application_ids'],
+            notifications=notifications,
+            notification_ids=changes['notification_ids'],
+        ))
+
+    def _payload(self, seq, has_more, reset, applications=(), application_ids=(), notifications=(),
+                 notification_ids=()):
+        def section(upserted, changed_ids):
+            present = {str(item['id']) for item in upserted}
+            return {
+                'upserted': upserted,
+                # Rows that changed but are gone, or no longer visible to this user
+                'deleted': [str(pk) for pk in changed_ids if str(pk) not in present],
+            }
+
+        return {
+            'cursor': encode_cursor(seq),
+            'has_more': has_more,
+            'reset': reset,
+            'applications': section(list(applications), application_ids),
+            'notifications': section(list(notifications), notification_ids),
+        }
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def track_by_reference(request):
@@ -291,10 +831,46 @@ def track_by_reference(request):
         return Response({"detail": "Reference number is required."},
                         status=drf_status.HTTP_400_BAD_REQUEST)
 
-    try:
-        application = Application.objects.get(reference_number=ref)
-        serializer = ApplicationStatusSerializer(application)
-        return Response(serializer.data)
-    except Application.DoesNotExist:
+    # Check validators against a narrow read before building the full payload
+    row = Application.objects.filter(reference_number=ref).only("id", "status", "created_at", "updated_at").first()
+    if row is None:
+        return track_archived_by_reference(request, ref)
+
+    # Queue position and estimate depend on other applications, so they are part of the validator
+    positions = queue_positions([row])
+    queue = queue_details(row, positions)
+    version = (
+        resource_etag(row.pk, row.updated_at, queue["queue_position"], queue["estimated_ready_date"]),
+        row.updated_at if queue["queue_position"] is None else None,
+    )
+    precondition = evaluate_preconditions(request, *version)
+    if precondition is not None:
+        return precondition
+
+    application = Application.objects.select_related(
+        "user", "document_type", "branch"
+    ).prefetch_related("attachments").get(pk=row.pk)
+    serializer = ApplicationStatusSerializer(application, context={"queue_positions": positions})
+    return set_validators(Response(serializer.data), *version)
+
+
+def track_archived_by_reference(request, ref):
+    # Finished applications move to the archive; keep their references trackable
+    row = ArchivedApplication.objects.filter(reference_number=ref).order_by("-archived_at").values_list(
+        "pk", "updated_at"
+    ).first()
+    if row is None:
         return Response({"detail": "Application not found."},
                         status=drf_status.HTTP_404_NOT_FOUND)
+
+    pk, updated_at = row
+    version = (resource_etag(pk, updated_at), updated_at)
+    precondition = evaluate_preconditions(request, *version)
+    if precondition is not None:
+        return precondition
+
+    application = ArchivedApplication.objects.select_related(
+        "user", "document_type", "branch"
+    ).prefetch_related("attachments").get(pk=pk)
+    serializer = ArchivedApplicationStatusSerializer(application)
+    return set_validators(Response(serializer.data), *version)